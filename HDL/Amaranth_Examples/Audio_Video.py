@@ -13,9 +13,11 @@ class AVExample(Elaboratable):
     def __init__(self,
                  timing: VGATiming,  # VGATiming class
                  xadjustf=0,  # adjust -3..3 if no picture
-                 yadjustf=0):  # or to fine-tune f
+                 yadjustf=0,  # or to fine-tune f
+                 driver=VGADriver):  # or PipelinedVGADriver above 100 MHz
         # Configuration
         self.timing = timing
+        self.driver = driver
         self.xadjustf = xadjustf
         self.yadjustf = yadjustf
 
@@ -26,15 +28,16 @@ class AVExample(Elaboratable):
         m.domains.sync = cd_sync = ClockDomain("sync")
         m.d.comb += ClockSignal().eq(clk_in)
         # Create a Pll to generate the pixel clock
-        m.submodules.pll = pll = PLL(freq_in_mhz=int(platform.default_clk_frequency / 1000000),
-                                     freq_out_mhz=int(self.timing.pixel_freq / 1000000),
+        m.submodules.pll = pll = PLL(freq_in_mhz=platform.default_clk_frequency / 1000000,
+                                     freq_out_mhz=self.timing.pixel_freq / 1000000,
                                      domain_name="pixel")
         # Add the pixel clock domain to the module, and connect input clock
         m.domains.pixel = cd_pixel = pll.domain
         m.d.comb += pll.clk_pin.eq(clk_in)
-        platform.add_clock_constraint(cd_pixel.clk, self.timing.pixel_freq)
+        # Constrain to the frequency the PLL actually generates
+        platform.add_clock_constraint(cd_pixel.clk, pll.result.f_out * 1000000)
         # Create VGA instance with chosen timings
-        m.submodules.vga = vga = VGADriver(
+        m.submodules.vga = vga = self.driver(
             self.timing,
             bits_x=16,  # Play around with the sizes because sometimes
             bits_y=16  # a smaller/larger value will make it pass timing.
@@ -0,0 +1,342 @@
+import argparse
+import sys
+import time
+from typing import List, NamedTuple, Tuple
+
+from amaranth import *
+from amaranth.utils import log2_int
+
+from .client import QspiClient
+from .interconnect import BusTarget
+
+__all__ = ["LogicAnalyzer", "Capture", "arm", "read_capture", "write_vcd", "vcd_code"]
+
+
+# Trigger and capture core: records probe signals into block RAM at the
+# sync clock rate, for reading back over the QSPI bus.
+#
+# Each memory entry holds a sample of every probe plus a run length, the
+# number of further cycles the sample stayed the same, so idle periods
+# take one entry per 2**count_bits cycles. Pre and post trigger depths
+# therefore count entries, not cycles.
+#
+# The core triggers on the first sample with (sample & mask) == value,
+# mask 0 triggering as soon as it is armed. It then keeps `pre` entries
+# from before the trigger and captures depth - pre from the trigger on.
+#
+# The window's lower half holds registers, 16-bit ones high byte first:
+#   0       write: bit 0 arm, bit 1 stop; read: bit 0 armed, 1 triggered, 2 done
+#   2-3     pre trigger entries
+#   4-5     write pointer, one past the last entry
+#   6-7     entries captured, up to depth
+#   8-9     entry of the trigger sample
+#   10-11   total probe bits, 12 count_bits, 13 log2(depth)
+#   16-     mask, then value, high byte first
+# and the upper half the capture memory, one entry per `stride` bytes.
+class LogicAnalyzer(Elaboratable):
+    ARM  = 0b01
+    STOP = 0b10
+
+    def __init__(self, probes, depth=512, count_bits=8, data_bits=8, name=None):
+        # probes: list of (name, Signal) or Signals, packed LSB first
+        self.probes = [p if isinstance(p, tuple) else (p.name, p) for p in probes]
+        self.layout = [(probe_name, len(signal)) for probe_name, signal in self.probes]
+        self.depth = depth
+        self.count_bits = count_bits
+        self.sample_bits = sum(width for _, width in self.layout)
+        self.entry_bits = self.sample_bits + count_bits
+
+        words = -(-self.entry_bits // data_bits)
+        self.stride = 1 << (words - 1).bit_length()
+        self.mask_bytes = -(-self.sample_bits // data_bits)
+        mem_addr_bits = log2_int(depth * self.stride)
+        assert 16 + 2 * self.mask_bytes <= 1 << mem_addr_bits, "too many probe bits for the register space"
+
+        self.bus = BusTarget(mem_addr_bits + 1, data_bits, latency=1, name=name)
+        self.mem = Memory(width=self.entry_bits, depth=depth)
+
+        # outputs
+        self.armed     = Signal()
+        self.triggered = Signal()
+        self.done      = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+        data_bits = self.bus.data_bits
+        count_max = (1 << self.count_bits) - 1
+
+        sample = Signal(self.sample_bits)
+        m.d.comb += sample.eq(Cat(*(signal for _, signal in self.probes)))
+
+        r_pre     = Signal(16)
+        r_mask    = Signal(self.mask_bytes * data_bits)
+        r_value   = Signal(self.mask_bytes * data_bits)
+        r_sample  = Signal(self.sample_bits)
+        r_count   = Signal(self.count_bits)
+        r_wptr    = Signal(16)
+        r_filled  = Signal(16)
+        r_trigger = Signal(16)
+        r_post    = Signal(16)
+
+        m.submodules.w = w = self.mem.write_port()
+        m.submodules.r = r = self.mem.read_port()
+
+        # Bus writes
+        ctrl = self.bus.wr & (self.bus.addr == 0)
+        arm = ctrl & self.bus.dout[0]
+        stop = ctrl & self.bus.dout[1]
+        regs = self.bus.addr[:-1]
+        with m.If(self.bus.wr & ~self.bus.addr[-1]):
+            with m.Switch(regs):
+                with m.Case(2):
+                    m.d.sync += r_pre[8:].eq(self.bus.dout)
+                with m.Case(3):
+                    m.d.sync += r_pre[:8].eq(self.bus.dout)
+                for i in range(self.mask_bytes):
+                    with m.Case(16 + i):
+                        m.d.sync += r_mask.word_select(self.mask_bytes - 1 - i, data_bits).eq(self.bus.dout)
+                    with m.Case(16 + self.mask_bytes + i):
+                        m.d.sync += r_value.word_select(self.mask_bytes - 1 - i, data_bits).eq(self.bus.dout)
+
+        # Capture
+        match = (sample & r_mask) == (r_value & r_mask)
+        flush = Signal()
+        m.d.comb += [
+            w.addr.eq(r_wptr),
+            w.data.eq(Cat(r_sample, r_count)),
+            w.en.eq(flush),
+        ]
+        with m.If(flush):
+            m.d.sync += [
+                r_wptr.eq(Mux(r_wptr == self.depth - 1, 0, r_wptr + 1)),
+                r_sample.eq(sample),
+                r_count.eq(0),
+            ]
+            with m.If(r_filled != self.depth):
+                m.d.sync += r_filled.eq(r_filled + 1)
+        with m.Elif(self.armed | self.triggered):
+            m.d.sync += r_count.eq(r_count + 1)
+
+        with m.FSM():
+            with m.State("IDLE"):
+                with m.If(arm):
+                    m.d.sync += [
+                        r_sample.eq(sample),
+                        r_count.eq(0),
+                        r_filled.eq(0),
+                        self.done.eq(0),
+                    ]
+                    m.next = "ARMED"
+            with m.State("ARMED"):
+                m.d.comb += self.armed.eq(1)
+                m.d.comb += flush.eq((sample != r_sample) | (r_count == count_max) | match | stop)
+                with m.If(match):
+                    m.d.sync += [
+                        r_trigger.eq(Mux(r_wptr == self.depth - 1, 0, r_wptr + 1)),
+                        r_post.eq(0),
+                    ]
+                    m.next = "TRIGGERED"
+                with m.If(stop):
+                    m.d.sync += self.done.eq(1)
+                    m.next = "IDLE"
+            with m.State("TRIGGERED"):
+                m.d.comb += self.triggered.eq(1)
+                m.d.comb += flush.eq((sample != r_sample) | (r_count == count_max) | stop)
+                with m.If(flush):
+                    m.d.sync += r_post.eq(r_post + 1)
+                    with m.If((r_post == self.depth - r_pre - 1) | stop):
+                        m.d.sync += self.done.eq(1)
+                        m.next = "IDLE"
+
+        # Bus reads, registered to match the memory's latency
+        r_din = Signal(data_bits)
+        r_mem = Signal()
+        r_byte = Signal(log2_int(self.stride) if self.stride > 1 else 1)
+        m.d.comb += r.addr.eq(self.bus.addr[log2_int(self.stride):-1])
+        m.d.sync += [
+            r_mem.eq(self.bus.addr[-1]),
+            r_byte.eq(self.bus.addr[:log2_int(self.stride)] if self.stride > 1 else 0),
+        ]
+        entry = Cat(r.data, C(0, self.stride * data_bits - self.entry_bits))
+        registers = {
+            0: Cat(self.armed, self.triggered, self.done),
+            2: r_pre[8:], 3: r_pre[:8],
+            4: r_wptr[8:], 5: r_wptr[:8],
+            6: r_filled[8:], 7: r_filled[:8],
+            8: r_trigger[8:], 9: r_trigger[:8],
+            10: C(self.sample_bits >> 8, 8), 11: C(self.sample_bits & 0xff, 8),
+            12: C(self.count_bits, 8), 13: C(log2_int(self.depth), 8),
+        }
+        for i in range(self.mask_bytes):
+            registers[16 + i] = r_mask.word_select(self.mask_bytes - 1 - i, data_bits)
+            registers[16 + self.mask_bytes + i] = r_value.word_select(self.mask_bytes - 1 - i, data_bits)
+        m.d.sync += r_din.eq(0)
+        with m.Switch(regs):
+            for offset, value in registers.items():
+                with m.Case(offset):
+                    m.d.sync += r_din.eq(value)
+        m.d.comb += self.bus.din.eq(Mux(r_mem, entry.word_select(self.stride - 1 - r_byte, data_bits), r_din))
+
+        return m
+
+
+# Host side
+
+class Capture(NamedTuple):
+    layout: List[Tuple[str, int]]
+    # (cycle, sample) at each change, cycle 0 being the trigger
+    changes: List[Tuple[int, int]]
+    end: int
+
+
+def arm(client, base, layout, pre=0, mask=0, value=0):
+    """Program the trigger of the analyzer at `base` and arm it."""
+    mask_bytes = -(-sum(width for _, width in layout) // 8)
+    with client.batch() as batch:
+        batch.write(base + 2, pre.to_bytes(2, "big"))
+        batch.write(base + 16, mask.to_bytes(mask_bytes, "big") + value.to_bytes(mask_bytes, "big"))
+        batch.write(base, bytes([LogicAnalyzer.ARM]))
+
+
+def read_capture(client, base, layout, timeout=10.0) -> Capture:
+    """Wait for an armed analyzer at `base` to finish, then read back and decode its capture."""
+    deadline = time.monotonic() + timeout
+    while not client.read(base, 1)[0] & 0b100:
+        if time.monotonic() > deadline:
+            raise TimeoutError("analyzer at {:#x} did not finish capturing".format(base))
+        time.sleep(0.01)
+
+    regs = client.read(base, 14)
+    wptr = int.from_bytes(regs[4:6], "big")
+    filled = int.from_bytes(regs[6:8], "big")
+    trigger = int.from_bytes(regs[8:10], "big")
+    sample_bits = int.from_bytes(regs[10:12], "big")
+    count_bits = regs[12]
+    depth = 1 << regs[13]
+    assert sample_bits == sum(width for _, width in layout), "layout does not match the analyzer"
+
+    entry_bytes = -(-(sample_bits + count_bits) // 8)
+    stride = 1 << (entry_bytes - 1).bit_length()
+    mem_base = base + depth * stride
+    with client.batch() as batch:
+        raw = batch.read(mem_base, depth * stride)
+
+    start = (wptr - filled) % depth
+    changes = []
+    cycle = 0
+    trigger_cycle = 0
+    previous = None
+    for i in range(filled):
+        index = (start + i) % depth
+        entry = int.from_bytes(raw[index * stride:(index + 1) * stride], "big")
+        value = entry & ((1 << sample_bits) - 1)
+        count = entry >> sample_bits
+        if index == trigger:
+            trigger_cycle = cycle
+        if value != previous:
+            changes.append((cycle, value))
+            previous = value
+        cycle += count + 1
+    return Capture(layout, [(c - trigger_cycle, v) for c, v in changes], cycle - trigger_cycle)
+
+
+# Identifier characters for VCD variables: printable ASCII without '#' and
+# '$', which readers take for a timestamp or a keyword at the start of a line
+VCD_CODE_CHARS = [chr(c) for c in range(33, 127) if chr(c) not in "#$"]
+
+
+def vcd_code(index: int) -> str:
+    """The VCD identifier of variable `index`, several characters past the first 92."""
+    code = VCD_CODE_CHARS[index % len(VCD_CODE_CHARS)]
+    index //= len(VCD_CODE_CHARS)
+    while index:
+        index -= 1
+        code += VCD_CODE_CHARS[index % len(VCD_CODE_CHARS)]
+        index //= len(VCD_CODE_CHARS)
+    return code
+
+
+def write_vcd(f, capture: Capture, timescale="10 ns"):
+    """
+    Write a capture as a VCD, one variable per probe plus `trigger`, which
+    rises at the trigger. Times are sync clock cycles from the first sample.
+    """
+    # vcd_code(0), "!", is the trigger
+    codes = [vcd_code(1 + i) for i in range(len(capture.layout))]
+    f.write("$timescale {} $end\n$scope module analyzer $end\n".format(timescale))
+    f.write("$var wire 1 ! trigger $end\n")
+    for (name, width), code in zip(capture.layout, codes):
+        f.write("$var wire {} {} {} $end\n".format(width, code, name))
+    f.write("$upscope $end\n$enddefinitions $end\n")
+
+    # None marks the trigger
+    events = sorted(capture.changes + [(0, None)], key=lambda event: (event[0], event[1] is not None))
+    origin = events[0][0]
+    previous = [None] * len(capture.layout)
+    now = None
+    for cycle, value in events:
+        if cycle != now:
+            f.write("#{}\n".format(cycle - origin))
+            if now is None and value is not None:
+                f.write("0!\n")
+            now = cycle
+        if value is None:
+            f.write("1!\n")
+            continue
+        offset = 0
+        for i, ((name, width), code) in enumerate(zip(capture.layout, codes)):
+            probe = (value >> offset) & ((1 << width) - 1)
+            offset += width
+            if probe == previous[i]:
+                continue
+            previous[i] = probe
+            if width == 1:
+                f.write("{}{}\n".format(probe, code))
+            else:
+                f.write("b{:b} {}\n".format(probe, code))
+    f.write("#{}\n".format(capture.end - origin))
+
+
+# The probes of the analyzer in QbusTest, at 0x30000
+QBUS_PROBES = "qss:1,qck:1,qd_i:4,qd_o:4,qd_oe:1,rd:1,wr:1"
+
+
+def parse_layout(text: str) -> List[Tuple[str, int]]:
+    # "name:width,..." -> [(name, width), ...]
+    layout = []
+    for probe in text.split(","):
+        name, _, width = probe.partition(":")
+        layout.append((name.strip(), int(width or 1)))
+    return layout
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Arm a LogicAnalyzer over QSPI and dump its capture as a VCD")
+    parser.add_argument("--device", default=None, help="bridge device node (default: DEVICE, or /dev/ttyACM1)")
+    parser.add_argument("--read-cmd", type=lambda text: int(text, 0), default=None,
+                        help="the bridge's read command byte (default: QSPI_READ_CMD)")
+    parser.add_argument("--base", type=lambda text: int(text, 0), default=0x30000,
+                        help="address of the analyzer's window (default: 0x30000, as in QbusTest)")
+    parser.add_argument("--probes", default=QBUS_PROBES,
+                        help="probe names and widths, LSB first (default: QbusTest's, {})".format(QBUS_PROBES))
+    parser.add_argument("--pre", type=int, default=0, help="entries to keep from before the trigger")
+    parser.add_argument("--mask", type=lambda text: int(text, 0), default=0,
+                        help="trigger mask over the packed probes; 0 triggers at once")
+    parser.add_argument("--value", type=lambda text: int(text, 0), default=0, help="trigger value")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds to wait for the capture")
+    parser.add_argument("-o", "--output", default="-", help="VCD file, - for stdout")
+    args = parser.parse_args()
+
+    layout = parse_layout(args.probes)
+    with QspiClient(args.device, read_cmd=args.read_cmd) as client:
+        arm(client, args.base, layout, args.pre, args.mask, args.value)
+        capture = read_capture(client, args.base, layout, args.timeout)
+    if args.output == "-":
+        write_vcd(sys.stdout, capture)
+    else:
+        with open(args.output, "w") as f:
+            write_vcd(f, capture)
+
+
+if __name__ == "__main__":
+    main()
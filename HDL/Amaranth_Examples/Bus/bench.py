@@ -0,0 +1,286 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+from amaranth import *
+from amaranth.sim import Simulator
+
+from HDL.Amaranth_Examples.Bus.qspimem import QspiMem
+from HDL.Amaranth_Examples.Bus.interconnect import QspiInterconnect, MemoryTarget
+
+# Throughput and latency of QspiMem in the simulator, driven by a host
+# model through the same interconnect and BRAM target as QbusTest.
+#
+# For each mode, transfer size and qck half period (in sysclk cycles) the
+# host writes random data, reads it back and checks it. Half periods below
+# one cycle, with qck faster than the sync clock, are timed by a faster
+# host clock. Reported per run:
+#   write/read_bytes_per_clk  payload bytes per sysclk, qss low to qss high
+#   latency_clks              last address qck edge to the first data nibble
+#                             being sampled, including waiting for qdr
+#   errors                    mismatched bytes, underrun pulses, qdr timeouts
+# and per mode the smallest qck divider (2 * half period) with no errors.
+# The run fails if a mode misses its EXPECTED divider or throughput.
+
+MODES = {
+    "oversampled": dict(),
+    "prefetch":    dict(prefetch=8),
+    "ddr":         dict(ddr=True),
+    "ddr_prefetch": dict(ddr=True, prefetch=8),
+    "source_sync": dict(source_sync=True, prefetch=4),
+    "source_sync32": dict(source_sync=True, data_bits=32, prefetch=4),
+    "wide16":      dict(data_bits=16, lanes=8, prefetch=8),
+    "wide32":      dict(data_bits=32, lanes=8, prefetch=8),
+}
+
+# Per mode, the largest qck divider that must work, and the read bytes per
+# sysclk a 256 byte transfer must reach at it. Each is only checked when
+# the runs cover it.
+EXPECTED = {
+    "oversampled":   (4, 0.12),
+    "prefetch":      (4, 0.12),
+    "ddr":           (4, 0.24),
+    "ddr_prefetch":  (4, 0.24),
+    "source_sync":   (1, 0.45),
+    "source_sync32": (0.25, 1.8),
+    "wide16":        (4, 0.24),
+    "wide32":        (4, 0.24),
+}
+EXPECTED_SIZE = 256
+
+# sysclk cycles to wait for qdr before counting a timeout
+QDR_TIMEOUT = 1000
+# QspiMem ignores the bus for its first 1024 cycles
+POWER_ON = 1100
+
+
+class Host:
+    """
+    A QSPI host whose qck edges are `half` of its clock cycles apart, with
+    `ratio` of them to a sysclk cycle, and as many data lines as the
+    target's lanes. Data is driven while qck is low, and read data, which
+    the target launches on an edge, is sampled just before the next one.
+    Times it returns are in sysclk cycles.
+    """
+    def __init__(self, qspimem, half, ratio=1):
+        self.q = qspimem
+        self.half = half
+        self.ratio = ratio
+        self.clk = 0
+        self.timeouts = 0
+
+    def tick(self, n=1):
+        for _ in range(n):
+            yield
+            self.clk += 1
+
+    def nibble(self, value=0, ddr=False):
+        # One qck period, or in DDR one edge; returns the data launched on
+        # the previous edge and the cycle of this one. DDR data changes half
+        # way between edges, as there is no idle phase to change it in.
+        if ddr:
+            yield from self.tick(self.half // 2)
+            yield self.q.qd_i.eq(value)
+            yield from self.tick(self.half - self.half // 2)
+        else:
+            yield self.q.qd_i.eq(value)
+            yield from self.tick(self.half)
+        sample = yield self.q.qd_o
+        edge = self.clk
+        if ddr:
+            level = yield self.q.qck
+            yield self.q.qck.eq(~level)
+        else:
+            yield self.q.qck.eq(1)
+            yield from self.tick(self.half)
+            yield self.q.qck.eq(0)
+        return edge, sample
+
+    def beats(self, data):
+        # Nibbles of `data` on the bus, high first; with 8 lanes, its bytes
+        if self.q.lanes == 8:
+            return list(data)
+        return [n for byte in data for n in (byte >> 4, byte & 0xf)]
+
+    def wait_qdr(self):
+        for _ in range(QDR_TIMEOUT * self.ratio):
+            if (yield self.q.qdr):
+                return
+            yield from self.tick()
+        self.timeouts += 1
+
+    def transaction(self, read, addr, data=b"", count=0):
+        q = self.q
+        word_bytes = q.data_bits // 8
+        yield q.qss.eq(0)
+        yield from self.tick(self.half)
+        start = self.clk
+        header = bytes([read << 7 | addr >> 16, (addr >> 8) & 0xff, addr & 0xff])
+        for beat in self.beats(header):
+            last_address, _ = yield from self.nibble(beat)
+
+        latency = None
+        result = None
+        if read:
+            if q.prefetch or q.source_sync:
+                yield from self.wait_qdr()
+            if q.source_sync:
+                for _ in range(q.dummy_nibbles):
+                    yield from self.nibble()
+            samples = []
+            for _ in range(count * word_bytes * 8 // q.lanes):
+                _, sample = yield from self.nibble(ddr=q.ddr)
+                samples.append(sample)
+            # The last nibble is sampled half a period after its edge
+            yield from self.tick(self.half)
+            samples.append((yield q.qd_o))
+            nibbles = samples[1:]
+            # The first data nibble is sampled by the second data edge
+            edges = (len(nibbles) - 1) * self.half * (1 if q.ddr else 2)
+            latency = (self.clk - last_address - edges) / self.ratio
+            if q.lanes == 8:
+                result = bytes(nibbles)
+            else:
+                result = bytes(hi << 4 | lo for hi, lo in zip(nibbles[::2], nibbles[1::2]))
+        else:
+            for beat in self.beats(data):
+                yield from self.nibble(beat, ddr=q.ddr)
+            # Hold the last edge before deselecting
+            yield from self.tick(self.half)
+
+        yield q.qck.eq(0)
+        yield q.qss.eq(1)
+        clks = (self.clk - start) / self.ratio
+        # Deselect long enough for every front end to see it
+        yield from self.tick(8 * self.ratio)
+        return result, clks, latency
+
+
+def run(mode, size, half, seed=0):
+    # Host clock cycles per sysclk cycle, enough to time half a qck period
+    ratio = 1
+    while half * ratio != int(half * ratio):
+        ratio *= 2
+        assert ratio <= 16, "half period {} is not a multiple of 1/16 cycle".format(half)
+    qspimem = QspiMem(**MODES[mode])
+    word_bytes = qspimem.data_bits // 8
+    words = size // word_bytes
+
+    m = Module()
+    m.submodules.qspimem = qspimem
+    m.submodules.bus = bus = QspiInterconnect(data_bits=qspimem.data_bits)
+    # QbusTest has 4KB, but pysim cannot compile a memory that deep; only the
+    # depth differs, and it does not change the timing
+    depth = max(256, 1 << (0x10 + words).bit_length())
+    m.submodules.ram = ram = MemoryTarget(depth=depth, data_bits=qspimem.data_bits)
+    bus.add(ram.bus, 0)
+    m.d.comb += bus.connect(qspimem)
+
+    underruns = Signal(16)
+    with m.If(qspimem.underrun):
+        m.d.sync += underruns.eq(underruns + 1)
+
+    data = random.Random(seed).randbytes(words * word_bytes)
+    host = Host(qspimem, int(half * ratio), ratio)
+    result = {}
+
+    def process():
+        yield qspimem.qss.eq(1)
+        yield from host.tick(POWER_ON * ratio)
+        # A write at addr lands at addr + 1
+        _, write_clks, _ = yield from host.transaction(False, 0x10 - 1, data)
+        # A one word read leaves prefetched words behind, which the timed
+        # read must not return
+        yield from host.transaction(True, 0x10 + words // 2, count=1)
+        readback, read_clks, latency = yield from host.transaction(True, 0x10, count=words)
+        mismatches = sum(a != b for a, b in zip(data, readback))
+        result.update(
+            write_clks=write_clks,
+            read_clks=read_clks,
+            write_bytes_per_clk=len(data) / write_clks,
+            read_bytes_per_clk=len(data) / read_clks,
+            latency_clks=latency,
+            mismatches=mismatches,
+            underruns=(yield underruns),
+            qdr_timeouts=host.timeouts,
+        )
+        result["errors"] = mismatches + result["underruns"] + host.timeouts
+
+    if ratio > 1:
+        m.domains.host = ClockDomain("host")
+    sim = Simulator(m)
+    sim.add_clock(1e-8)
+    if ratio > 1:
+        sim.add_clock(1e-8 / ratio, domain="host")
+        sim.add_sync_process(process, domain="host")
+    else:
+        sim.add_sync_process(process)
+    sim.run()
+    return dict(mode=mode, size=len(data), half_period=half, divider=2 * half, **result)
+
+
+def check(runs) -> list:
+    """Misses of EXPECTED by `runs`, as messages."""
+    failures = []
+    for mode, (divider, read_bytes_per_clk) in EXPECTED.items():
+        at = [r for r in runs if r["mode"] == mode and r["divider"] == divider]
+        if any(r["errors"] for r in at):
+            failures.append("{}: errors at divider {:g}".format(mode, divider))
+        for r in at:
+            if r["size"] == EXPECTED_SIZE and r["read_bytes_per_clk"] < read_bytes_per_clk:
+                failures.append("{}: read {:.3f} B/clk at divider {:g}, expected at least {:.3f}"
+                                .format(mode, r["read_bytes_per_clk"], divider, read_bytes_per_clk))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark QspiMem in the Amaranth simulator")
+    parser.add_argument("--modes", nargs="*", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--sizes", nargs="*", type=int, default=[16, 64, 256],
+                        help="transfer sizes in bytes")
+    parser.add_argument("--half-periods", nargs="*", type=float, default=[0.125, 0.25, 0.5, 1, 2, 3, 4, 6, 8],
+                        help="qck high and low times in sysclk cycles, below 1 for qck faster than sysclk")
+    parser.add_argument("-o", "--output", default="-", help="JSON report file, - for stdout")
+    args = parser.parse_args()
+
+    runs = []
+    summary = {}
+    for mode in args.modes:
+        working = []
+        for half in args.half_periods:
+            for size in args.sizes:
+                start = time.perf_counter()
+                result = run(mode, size, half)
+                result["sim_seconds"] = round(time.perf_counter() - start, 3)
+                runs.append(result)
+                print("{:<13} half {:>4g} size {:>5}: write {:.3f} read {:.3f} B/clk, latency {}, errors {}"
+                      .format(mode, half, size, result["write_bytes_per_clk"],
+                              result["read_bytes_per_clk"], result["latency_clks"], result["errors"]),
+                      file=sys.stderr)
+            if all(r["errors"] == 0 for r in runs if r["mode"] == mode and r["half_period"] == half):
+                working.append(half)
+        best = [r for r in runs if r["mode"] == mode and r["half_period"] in working]
+        summary[mode] = dict(
+            min_divider=2 * min(working) if working else None,
+            max_read_bytes_per_clk=max((r["read_bytes_per_clk"] for r in best), default=None),
+            max_write_bytes_per_clk=max((r["write_bytes_per_clk"] for r in best), default=None),
+        )
+
+    report = dict(summary=summary, runs=runs)
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    failures = check(runs)
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    sys.exit(0 if summary and not failures and
+             all(s["min_divider"] is not None for s in summary.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import asyncio
+import os
+import struct
+import threading
+import tty
+from typing import List, NamedTuple, Optional, Union
+
+__all__ = ["QspiClient", "Batch", "CMD_WRITE", "write_frame"]
+
+# Transactions are framed for the deck's USB CDC bridge as a command byte,
+# a 32-bit address and a 32-bit word count, big endian, followed by the
+# data for a write. This is the frame IceLogicBusPlatform.bus_send sends:
+# e.g. b"\x03" b"\x00\x00\x00\x01" b"\x00\x00\x00\x01" b"\x42" sends one byte with address 1
+#
+# The bridge's read command is not documented. Reads use the same header
+# with the command byte given as read_cmd (or QSPI_READ_CMD), and expect
+# the data alone in reply; without one, they raise.
+CMD_WRITE = 0x03
+HEADER = struct.Struct(">BII")
+
+# Most iovecs passed to a single writev
+IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") else 1024
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+
+def write_frame(addr: int, data: bytes, addr_bits=23, data_bits=8) -> bytes:
+    """The frame QspiClient.write(addr, data) sends, e.g. for bus_send."""
+    count = len(data) // (data_bits // 8)
+    return HEADER.pack(CMD_WRITE, (addr - 1) & ((1 << addr_bits) - 1), count) + bytes(data)
+
+
+class _Read(NamedTuple):
+    addr: int
+    buf: memoryview
+
+
+class Batch:
+    """
+    Transactions queued on a QspiClient and sent together by flush(),
+    which a `with` block calls on exit.
+
+    Writes to consecutive addresses are coalesced into one burst. Reads
+    are filled in, in order, after the writes queued before them, into the
+    buffer returned by read() or passed to readinto(). Buffers are
+    referenced rather than copied, so they must not change until the
+    batch is flushed.
+    """
+    def __init__(self, client: "QspiClient"):
+        self.client = client
+        self._ops: List[Union[list, _Read]] = []
+        # Next address of the open write burst, if the last op was a write
+        self._next = None
+
+    def write(self, addr: int, buf: Buffer):
+        view = self.client._view(buf)
+        if not len(view):
+            return
+        count = len(view) // self.client.word_bytes
+        if self._next == addr:
+            burst = self._ops[-1]
+            burst[1] += count
+            burst.append(view)
+        else:
+            self._ops.append([addr, count, view])
+        self._next = (addr + count) & self.client.addr_mask
+
+    def readinto(self, addr: int, buf: Buffer) -> memoryview:
+        view = self.client._view(buf)
+        self._ops.append(_Read(addr, view))
+        self._next = None
+        return view
+
+    def read(self, addr: int, n: int) -> bytearray:
+        buf = bytearray(n * self.client.word_bytes)
+        self.readinto(addr, buf)
+        return buf
+
+    def flush(self):
+        ops, self._ops, self._next = self._ops, [], None
+        self.client._transact(ops)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+
+
+class QspiClient:
+    """
+    Host side client for QspiMem over the deck's USB CDC device node
+    (DEVICE, default /dev/ttyACM1), or any file, pipe or pty for testing.
+
+    Addresses count words of data_bits bits, and buffers hold whole words,
+    high byte first. Data is passed to the OS with writev/readv straight
+    from the caller's buffers, so a large transfer is never copied in
+    Python. QspiMem writes a burst starting one word past the address it
+    receives; write() sends addr - 1 so data lands at addr.
+    """
+    def __init__(self, device: Union[str, int, None] = None, addr_bits=23, data_bits=8,
+                 read_cmd: Optional[int] = None):
+        if device is None:
+            device = os.environ.get("DEVICE", "/dev/ttyACM1")
+        if read_cmd is None and os.environ.get("QSPI_READ_CMD"):
+            read_cmd = int(os.environ["QSPI_READ_CMD"], 0)
+        self.read_cmd = read_cmd
+        if isinstance(device, int):
+            self.fd = device
+            self._owned = False
+        else:
+            self.fd = os.open(device, os.O_RDWR | getattr(os, "O_NOCTTY", 0))
+            self._owned = True
+        if os.isatty(self.fd):
+            # No echo or newline translation on the CDC port
+            tty.setraw(self.fd)
+        self.addr_bits = addr_bits
+        self.addr_mask = (1 << addr_bits) - 1
+        self.word_bytes = data_bits // 8
+        self._lock = threading.Lock()
+
+    def close(self):
+        if self._owned:
+            os.close(self.fd)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _view(self, buf: Buffer) -> memoryview:
+        view = memoryview(buf).cast("B")
+        if len(view) % self.word_bytes:
+            raise ValueError("buffer length {} is not a whole number of {} byte words"
+                             .format(len(view), self.word_bytes))
+        return view
+
+    def _encode(self, ops, iov):
+        # Headers for the whole batch are packed into one buffer
+        headers = bytearray(HEADER.size * len(ops))
+        reads = []
+        for i, op in enumerate(ops):
+            offset = i * HEADER.size
+            if isinstance(op, _Read):
+                if self.read_cmd is None:
+                    raise RuntimeError("the bridge's read command is not documented; "
+                                       "pass read_cmd or set QSPI_READ_CMD")
+                HEADER.pack_into(headers, offset, self.read_cmd, op.addr & self.addr_mask,
+                                 len(op.buf) // self.word_bytes)
+                iov.append(memoryview(headers)[offset:offset + HEADER.size])
+                reads.append(op.buf)
+            else:
+                addr, count, *views = op
+                HEADER.pack_into(headers, offset, CMD_WRITE, (addr - 1) & self.addr_mask, count)
+                iov.append(memoryview(headers)[offset:offset + HEADER.size])
+                iov.extend(views)
+        return reads
+
+    def _writev(self, iov):
+        for start in range(0, len(iov), IOV_MAX):
+            chunk = iov[start:start + IOV_MAX]
+            while chunk:
+                written = os.writev(self.fd, chunk)
+                # Drop what was written, possibly part way through a buffer
+                while chunk and written >= len(chunk[0]):
+                    written -= len(chunk[0])
+                    chunk.pop(0)
+                if chunk and written:
+                    chunk[0] = chunk[0][written:]
+
+    def _readinto(self, view: memoryview):
+        while len(view):
+            n = os.readv(self.fd, [view])
+            if n == 0:
+                raise EOFError("device closed with {} bytes of a read outstanding".format(len(view)))
+            view = view[n:]
+
+    def _transact(self, ops):
+        if not ops:
+            return
+        iov = []
+        reads = self._encode(ops, iov)
+        with self._lock:
+            self._writev(iov)
+            for view in reads:
+                self._readinto(view)
+
+    def batch(self) -> Batch:
+        return Batch(self)
+
+    def write(self, addr: int, buf: Buffer):
+        with self.batch() as batch:
+            batch.write(addr, buf)
+
+    def readinto(self, addr: int, buf: Buffer) -> memoryview:
+        with self.batch() as batch:
+            return batch.readinto(addr, buf)
+
+    def read(self, addr: int, n: int) -> bytearray:
+        with self.batch() as batch:
+            return batch.read(addr, n)
+
+    # asyncio variants, run on the default executor; transactions from
+    # different tasks are serialised by the client's lock
+    async def write_async(self, addr: int, buf: Buffer):
+        await asyncio.get_running_loop().run_in_executor(None, self.write, addr, buf)
+
+    async def read_async(self, addr: int, n: int) -> bytearray:
+        return await asyncio.get_running_loop().run_in_executor(None, self.read, addr, n)
+
+    async def readinto_async(self, addr: int, buf: Buffer) -> memoryview:
+        return await asyncio.get_running_loop().run_in_executor(None, self.readinto, addr, buf)
+
+    async def flush_async(self, batch: Batch):
+        await asyncio.get_running_loop().run_in_executor(None, batch.flush)
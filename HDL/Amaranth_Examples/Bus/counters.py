@@ -0,0 +1,80 @@
+from amaranth import *
+from amaranth.lib.cdc import PulseSynchronizer
+
+from .interconnect import BusTarget
+
+__all__ = ["PerfCounters"]
+
+
+# Event counters readable over the QSPI bus, for profiling the design on
+# the board. Each counter counts the cycles its event input is high.
+#
+# The window is a control word followed by one counter_bits wide word per
+# counter, each `stride` bus words long and high byte first like the bus
+# data:
+#   offset 0                 write: bit 0 snapshot, bit 1 clear
+#   offsets 0 to stride - 1  read: the number of counters, so with 32-bit
+#                            counters on an 8-bit bus it is at offset 3
+#   offset n                 counter (n // stride) - 1, as of the last snapshot
+# Reads return the snapshot, so a counter read a byte at a time is
+# consistent, and writing 0b11 snapshots and clears in the same cycle
+# so no event is lost between the two.
+class PerfCounters(Elaboratable):
+    SNAPSHOT = 0b01
+    CLEAR    = 0b10
+
+    def __init__(self, max_counters=15, counter_bits=32, data_bits=8, name=None):
+        assert counter_bits % data_bits == 0
+        self.counter_bits = counter_bits
+        self.max_counters = max_counters
+        self.stride = counter_bits // data_bits
+        addr_bits = ((max_counters + 1) * self.stride - 1).bit_length()
+        self.bus = BusTarget(addr_bits, data_bits, latency=1, name=name)
+        self.counters = []
+
+    def counter(self, name, domain="sync") -> Signal:
+        """Add a counter and return its event input, in `domain`."""
+        assert len(self.counters) < self.max_counters, "no room for counter {}".format(name)
+        event = Signal(name=name)
+        self.counters.append((name, event, domain))
+        return event
+
+    def elaborate(self, platform):
+        m = Module()
+        data_bits = self.bus.data_bits
+
+        r_din = Signal(data_bits)
+        m.d.comb += self.bus.din.eq(r_din)
+
+        control = self.bus.wr & (self.bus.addr == 0)
+        snapshot = control & self.bus.dout[0]
+        clear = control & self.bus.dout[1]
+
+        words = [C(len(self.counters), self.counter_bits)]
+        for name, event, domain in self.counters:
+            if domain != "sync":
+                # Events from other clock domains arrive as one cycle pulses
+                sync = PulseSynchronizer(i_domain=domain, o_domain="sync")
+                m.submodules["{}_cdc".format(name)] = sync
+                m.d.comb += sync.i.eq(event)
+                event = sync.o
+
+            count = Signal(self.counter_bits, name="{}_count".format(name))
+            shadow = Signal(self.counter_bits, name="{}_shadow".format(name))
+            with m.If(clear):
+                m.d.sync += count.eq(event)
+            with m.Elif(event):
+                m.d.sync += count.eq(count + 1)
+            with m.If(snapshot):
+                m.d.sync += shadow.eq(count)
+            words.append(shadow)
+
+        with m.Switch(self.bus.addr):
+            for i, word in enumerate(words):
+                for j in range(self.stride):
+                    with m.Case(i * self.stride + j):
+                        m.d.sync += r_din.eq(word.word_select(self.stride - 1 - j, data_bits))
+            with m.Default():
+                m.d.sync += r_din.eq(0)
+
+        return m
@@ -0,0 +1,169 @@
+from typing import List
+
+from amaranth import *
+
+__all__ = ["BusTarget", "QspiInterconnect", "MemoryTarget", "CSRBank"]
+
+
+class BusTarget:
+    """
+    The port of one target behind a QspiInterconnect, seen from the target.
+
+    addr is the word address within the target's window. A read starts
+    with rd; the target's din is taken when ack is high, in the same or
+    any later cycle. With a fixed `latency` the interconnect generates
+    ack itself, rd delayed by that many cycles. With latency=None the
+    target drives ack, e.g. a FIFO that is not always ready.
+    wr is a one cycle strobe with the data on dout.
+    """
+    def __init__(self, addr_bits, data_bits=8, latency=0, name=None):
+        self.addr_bits = addr_bits
+        self.data_bits = data_bits
+        self.latency   = latency
+        self.name      = name
+
+        def port(suffix, width=1):
+            return Signal(width, name=suffix if name is None else "{}_{}".format(name, suffix))
+
+        # from the interconnect
+        self.addr = port("addr", addr_bits)
+        self.rd   = port("rd")
+        self.wr   = port("wr")
+        self.dout = port("dout", data_bits)
+
+        # to the interconnect
+        self.din  = port("din", data_bits)
+        self.ack  = port("ack")
+
+    @property
+    def size(self):
+        return 1 << self.addr_bits
+
+
+# Maps address windows in QspiMem's address space onto several targets,
+# so one host transaction stream can reach every peripheral on the deck.
+# Each window is the size of its target's address space and aligned to
+# it. Reads from unmapped addresses return 0 and are acked at once, so
+# a stray host access never stalls the bus.
+#
+# The target is decoded from the current address, which QspiMem holds
+# until the outstanding read is acked.
+class QspiInterconnect(Elaboratable):
+    def __init__(self, addr_bits=23, data_bits=8):
+        self.addr_bits = addr_bits
+        self.data_bits = data_bits
+        self.targets: List[tuple] = []
+
+        # initiator side, named as QspiMem's target side
+        self.addr = Signal(addr_bits)
+        self.rd   = Signal()
+        self.wr   = Signal()
+        self.dout = Signal(data_bits)
+        self.din  = Signal(data_bits)
+        self.ack  = Signal()
+
+    def add(self, target: BusTarget, base: int) -> BusTarget:
+        assert target.data_bits == self.data_bits, "target data width differs from the bus"
+        assert base % target.size == 0, "window at {:#x} is not aligned to its size {:#x}".format(
+            base, target.size)
+        assert base + target.size <= 1 << self.addr_bits, "window at {:#x} is outside the bus".format(base)
+        for other, other_base in self.targets:
+            assert base + target.size <= other_base or other_base + other.size <= base, \
+                "window at {:#x} overlaps {:#x}".format(base, other_base)
+        self.targets.append((target, base))
+        return target
+
+    def connect(self, qspimem):
+        return [
+            self.addr.eq(qspimem.addr),
+            self.rd.eq(qspimem.rd),
+            self.wr.eq(qspimem.wr),
+            self.dout.eq(qspimem.dout),
+            qspimem.din.eq(self.din),
+            qspimem.ack.eq(self.ack),
+        ]
+
+    def memory_map(self):
+        return sorted(((base, base + target.size - 1, target.name) for target, base in self.targets))
+
+    def elaborate(self, platform):
+        m = Module()
+
+        # Unmapped addresses
+        m.d.comb += self.ack.eq(self.rd)
+
+        with m.Switch(self.addr):
+            for target, base in self.targets:
+                pattern = "{:0{}b}".format(base >> target.addr_bits, self.addr_bits - target.addr_bits) + \
+                          "-" * target.addr_bits
+                m.d.comb += [
+                    target.addr.eq(self.addr),
+                    target.dout.eq(self.dout),
+                ]
+
+                if target.latency is not None:
+                    # rd delayed by the target's latency
+                    ack = target.rd
+                    for i in range(target.latency):
+                        r_ack = Signal(name="r_{}_ack_{}".format(target.name or "target", i))
+                        m.d.sync += r_ack.eq(ack)
+                        ack = r_ack
+                    m.d.comb += target.ack.eq(ack)
+
+                with m.Case(pattern):
+                    m.d.comb += [
+                        target.rd.eq(self.rd),
+                        target.wr.eq(self.wr),
+                        self.din.eq(target.din),
+                        self.ack.eq(target.ack),
+                    ]
+
+        return m
+
+
+class MemoryTarget(Elaboratable):
+    """A block RAM behind the interconnect, with the one cycle read latency of a BRAM read port."""
+    def __init__(self, depth, data_bits=8, init=None, name=None):
+        self.mem = Memory(width=data_bits, depth=depth, init=init)
+        self.bus = BusTarget((depth - 1).bit_length(), data_bits, latency=1, name=name)
+
+    def elaborate(self, platform):
+        m = Module()
+        m.submodules.r = r = self.mem.read_port()
+        m.submodules.w = w = self.mem.write_port()
+        m.d.comb += [
+            r.addr.eq(self.bus.addr),
+            self.bus.din.eq(r.data),
+            w.addr.eq(self.bus.addr),
+            w.data.eq(self.bus.dout),
+            w.en.eq(self.bus.wr),
+        ]
+        return m
+
+
+class CSRBank(Elaboratable):
+    """
+    A bank of registers behind the interconnect, read in the same cycle.
+    Registers added with read_only=True are driven by the design and
+    ignore host writes; the others hold the last value the host wrote.
+    """
+    def __init__(self, addr_bits=4, data_bits=8, name=None):
+        self.bus = BusTarget(addr_bits, data_bits, latency=0, name=name)
+        self.registers = []
+
+    def csr(self, name, reset=0, read_only=False) -> Signal:
+        assert len(self.registers) < self.bus.size, "CSR bank is full"
+        reg = Signal(self.bus.data_bits, name=name, reset=reset)
+        self.registers.append((reg, read_only))
+        return reg
+
+    def elaborate(self, platform):
+        m = Module()
+        with m.Switch(self.bus.addr):
+            for i, (reg, read_only) in enumerate(self.registers):
+                with m.Case(i):
+                    m.d.comb += self.bus.din.eq(reg)
+                    if not read_only:
+                        with m.If(self.bus.wr):
+                            m.d.sync += reg.eq(self.bus.dout)
+        return m
@@ -0,0 +1,107 @@
+from amaranth import *
+from amaranth.hdl.ast import Rose
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.utils import log2_int
+
+from .interconnect import BusTarget
+
+__all__ = ["PingPongTarget"]
+
+
+# Double buffered memory behind the interconnect. The host fills one bank
+# while the design streams out of the other, then the banks are swapped,
+# so host transfers overlap with processing instead of stalling it.
+#
+# The window is twice the bank size. The lower half is the host's bank,
+# which it can also read back. The first address of the upper half is the
+# control register: writing any value to it requests a swap, and reading
+# it returns the bank the host is filling. The rest of the upper half
+# reads as 0 and ignores writes. With swap_on_deselect, deselecting the
+# bus after writing to the bank also requests a swap, so a frame can be
+# sent as a single transaction.
+#
+# A requested swap happens in the first cycle with `ready` high, so a
+# consumer can hold it off until the end of a line or frame; `swapped`
+# pulses when it does. A host write in that cycle goes to the new host
+# bank. The consumer reads its bank through rd_addr, with rd_data valid
+# on the next cycle.
+class PingPongTarget(Elaboratable):
+    def __init__(self, depth, data_bits=8, swap_on_deselect=True, name=None):
+        self.depth = depth
+        self.swap_on_deselect = swap_on_deselect
+        self.addr_bits = log2_int(depth)
+
+        self.bus = BusTarget(self.addr_bits + 1, data_bits, latency=1, name=name)
+
+        # inputs
+        self.qss     = Signal(reset=1)
+        self.ready   = Signal(reset=1)
+        self.rd_addr = Signal(self.addr_bits)
+
+        # outputs
+        self.rd_data = Signal(data_bits)
+        self.bank    = Signal()
+        self.swapped = Signal()
+
+        self.mem = Memory(width=data_bits, depth=2 * depth)
+
+    def elaborate(self, platform):
+        m = Module()
+
+        r_host_bank = Signal()
+        r_pending   = Signal()
+        r_dirty     = Signal()
+        r_upper     = Signal()
+        r_ctrl      = Signal()
+        r_qss       = Signal()
+
+        m.submodules.host_r = host_r = self.mem.read_port()
+        m.submodules.host_w = host_w = self.mem.write_port()
+        m.submodules.user_r = user_r = self.mem.read_port()
+
+        upper = self.bus.addr[-1]
+        ctrl  = self.bus.addr == self.depth
+        swap  = r_pending & self.ready
+        # The host's bank from the end of this cycle, so a write during a
+        # swap lands in the bank the host fills next
+        host_bank = r_host_bank ^ swap
+
+        m.d.comb += [
+            host_r.addr.eq(Cat(self.bus.addr[:self.addr_bits], host_bank)),
+            host_w.addr.eq(Cat(self.bus.addr[:self.addr_bits], host_bank)),
+            host_w.data.eq(self.bus.dout),
+            host_w.en.eq(self.bus.wr & ~upper),
+            user_r.addr.eq(Cat(self.rd_addr, ~r_host_bank)),
+            self.rd_data.eq(user_r.data),
+            self.bank.eq(~r_host_bank),
+        ]
+
+        # Read data follows the address by a cycle, like the BRAM
+        m.d.sync += [
+            r_upper.eq(upper),
+            r_ctrl.eq(ctrl),
+        ]
+        m.d.comb += self.bus.din.eq(Mux(r_upper, Mux(r_ctrl, r_host_bank, 0), host_r.data))
+
+        # A swap in the same cycle serves the request
+        with m.If(self.bus.wr & ctrl):
+            m.d.sync += r_pending.eq(1)
+
+        if self.swap_on_deselect:
+            m.submodules += FFSynchronizer(self.qss, r_qss, reset=1)
+            with m.If(Rose(r_qss) & r_dirty):
+                m.d.sync += r_pending.eq(1)
+
+        m.d.sync += self.swapped.eq(swap)
+        with m.If(swap):
+            m.d.sync += [
+                r_host_bank.eq(~r_host_bank),
+                r_pending.eq(0),
+                r_dirty.eq(0),
+            ]
+
+        # After the swap, so a write in the same cycle marks the new bank dirty
+        with m.If(self.bus.wr & ~upper):
+            m.d.sync += r_dirty.eq(1)
+
+        return m
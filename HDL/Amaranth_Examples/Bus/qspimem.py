@@ -0,0 +1,483 @@
+from amaranth import *
+from amaranth.hdl.ast import Rose, Fell
+from amaranth.utils import log2_int
+from amaranth.lib.cdc import FFSynchronizer, PulseSynchronizer
+from amaranth.lib.fifo import AsyncFIFO, SyncFIFO
+
+__all__ = ["QspiMem"]
+
+
+# QSPI bus target. The host sends a command byte (bit 7 set for a read,
+# bits 0-6 the top of the address), 16 more address bits, then streams
+# data bytes, high nibble first, with the address incrementing per byte.
+#
+# wr is a one cycle strobe with the data on dout.
+#
+# With prefetch=0, rd is held while a byte is being read and din must be
+# valid within one qck nibble period.
+#
+# With prefetch=N, reads are bursts: as soon as the address phase ends,
+# bytes are fetched ahead into an N byte FIFO. Each fetch is a one cycle
+# rd strobe, and the target raises ack when din holds the data, in the
+# same or any later cycle (ack = rd delayed by one cycle for a BRAM read
+# port). qdr is high while the FIFO has data, so the host waits on qdr
+# rather than the target having to keep up with qck. underrun pulses if
+# the host clocks out a byte that was not ready.
+#
+# With source_sync=True, the shift registers are clocked by qck itself
+# instead of oversampling it at sysclk, so qck is not limited to a fraction
+# of the sync clock and may even run faster than it. Addresses and write
+# data cross into the sync domain through an async FIFO, and reads are
+# always prefetched (depth prefetch, at most 4, or 4) through another.
+# After the address, a read waits for qdr and then clocks dummy_nibbles
+# nibbles before the data, which lets the FIFO's pointers cross into the
+# qck domain. Words a read leaves in the FIFO are dropped on the qck edges
+# of the frames that follow, and qdr stays low until they have gone: the
+# 6 command and address edges drop up to 4. qss must stay high for a few
+# sync cycles between frames.
+#
+# data_bits may be 16 or 32 to move a whole word per rd/wr strobe; the
+# address then counts words. With lanes=8 (oversampled front end only) the
+# bus is 8 data lines wide, like the DQ0-DQ7 pins of the mezzanine, and a
+# "nibble" is a byte: the command takes one qck edge, the address two and
+# each data byte one, twice what 4 lanes move per edge.
+#
+# With ddr=True (oversampled front end only) data nibbles are transferred
+# on both qck edges; the command and address are still one nibble per
+# rising edge. A read nibble takes about 3 sysclk from the edge that
+# launches it to reach qd_o, so when qck is high for less than
+# DDR_LEAD_BELOW sysclk during the address, each read nibble is instead
+# launched by the edge before: the host samples it on the edge after that,
+# by when it has had two edges' time to arrive. The next word is then
+# fetched an edge early too, so that its first nibble is ready for the
+# last edge of the word before. DDR reads work with qck high and low for
+# 2 sysclk each, a divider of 4.
+#
+# For profiling, word_sent pulses for each word clocked out to the host,
+# stall is high while a fetch waits for the target's ack, and frame_error
+# pulses when qss is deasserted part way through the address or a data
+# word (oversampled front end only).
+class QspiMem(Elaboratable):
+    # qck high times (sysclk) below which DDR reads are launched an edge early
+    DDR_LEAD_BELOW = 4
+
+    def __init__(self, addr_bits=23, data_bits=8, prefetch=0, source_sync=False, dummy_nibbles=2,
+                 ddr=False, lanes=4):
+        assert data_bits in (8, 16, 32)
+        assert lanes in (4, 8)
+        assert not (ddr and source_sync), "DDR is only supported by the oversampled front end"
+        assert not (lanes != 4 and source_sync), "8 lanes are only supported by the oversampled front end"
+        assert not (ddr and data_bits == lanes), "DDR needs at least two nibbles per word"
+        assert not source_sync or prefetch <= 4, "the source synchronous read FIFO is at most 4 deep"
+        # parameters
+        self.addr_bits     = addr_bits
+        self.data_bits     = data_bits
+        self.lanes         = lanes
+        self.cmd_nibbles   = 8 // lanes
+        self.addr_nibbles  = 16 // lanes
+        self.data_nibbles  = data_bits // lanes
+        self.ddr           = ddr
+        self.prefetch      = prefetch
+        self.source_sync   = source_sync
+        self.dummy_nibbles = dummy_nibbles
+
+        # inputs
+        self.qd_i  = Signal(lanes)
+        self.qss   = Signal()
+        self.qck   = Signal()
+        self.din   = Signal(data_bits)
+        self.ack   = Signal()
+
+        # outputs
+        self.addr  = Signal(addr_bits)
+        self.qd_o  = Signal(lanes)
+        self.qd_oe = Signal(lanes)
+        self.qdr   = Signal()
+        self.dout  = Signal(data_bits)
+        self.rd    = Signal()
+        self.wr    = Signal()
+        self.underrun = Signal()
+        self.word_sent = Signal()
+        self.frame_error = Signal()
+        self.stall = Signal()
+
+    def _fetch(self, m, fifo, r_fetching, r_addr, flush, data=None):
+        # Fill fifo from the target while r_fetching. One fetch is outstanding
+        # at a time, and only issued when there is room for its data, which
+        # is din unless given.
+        r_pending = Signal()
+
+        m.d.comb += [
+            self.rd.eq(r_fetching & ~r_pending & fifo.w_rdy),
+            fifo.w_data.eq(self.din if data is None else data),
+            fifo.w_en.eq((self.rd | r_pending) & self.ack),
+            self.stall.eq((self.rd | r_pending) & ~self.ack),
+        ]
+        with m.If(fifo.w_en):
+            m.d.sync += [
+                r_pending.eq(0),
+                r_addr.eq(r_addr + 1)
+            ]
+        with m.Elif(self.rd):
+            m.d.sync += r_pending.eq(1)
+        with m.If(flush):
+            m.d.sync += r_pending.eq(0)
+
+    def elaborate(self, platform):
+        if self.source_sync:
+            return self._elaborate_source_sync(platform)
+
+        m = Module()
+
+        r_req_read     = Signal()
+        r_req_write    = Signal()
+        r_cmd          = Signal(8)
+        r_data         = Signal(self.data_bits)
+        r_data_phase   = Signal()
+        r_addr         = Signal(self.addr_bits)
+
+        r_nibble_count = Signal(5)
+
+        r_qd_i         = Signal(self.lanes)
+        r_qck          = Signal()
+        r_qss          = Signal()
+
+        # Ignore spurious QSPI data after programming
+        pwr_on_reset = Signal(10)
+        with m.If(~pwr_on_reset.all()):
+            m.d.sync += pwr_on_reset.eq(pwr_on_reset + 1)
+
+        qck_edge = Rose(r_qck)
+        if self.ddr:
+            qck_edge |= r_data_phase & Fell(r_qck)
+        new_nibble = ~r_qss & pwr_on_reset.all() & qck_edge
+
+        # Position of the nibble within a data word, high nibble first
+        word_nibble = Signal(log2_int(self.data_nibbles))
+        last_nibble = word_nibble == self.data_nibbles - 1
+        m.d.comb += word_nibble.eq(r_nibble_count - (self.cmd_nibbles + self.addr_nibbles))
+
+        # Puts the next nibble of data on qd_o. Normally that is the nibble an
+        # edge launches, held until the next edge. With r_lead, it is the one
+        # after, so it follows the count (and data, as the next word arrives)
+        # between edges instead.
+        r_lead = Signal()
+        lead_nibble = Signal.like(word_nibble)
+        m.d.comb += lead_nibble.eq(word_nibble + new_nibble)
+
+        # The edge on which the word after this one is fetched (or popped).
+        # Normally that is the last nibble's. With r_lead, the next word's
+        # first nibble is launched on that edge, so the fetch is an edge
+        # earlier and r_hold keeps the last nibble's word meanwhile.
+        advance = Signal()
+        r_hold = Signal(self.data_bits)
+        if self.ddr:
+            m.d.comb += advance.eq(new_nibble & Mux(r_lead, word_nibble == self.data_nibbles - 2,
+                                                    last_nibble))
+        else:
+            m.d.comb += advance.eq(new_nibble & last_nibble)
+
+        def launch(data):
+            if self.ddr:
+                with m.If(advance):
+                    m.d.sync += r_hold.eq(data)
+                held = r_lead & (lead_nibble == self.data_nibbles - 1) & ~advance
+                data = Mux(held, r_hold, data)
+                with m.If(r_lead):
+                    m.d.sync += self.qd_o.eq(data.word_select(~lead_nibble, self.lanes))
+                with m.Elif(new_nibble):
+                    m.d.sync += self.qd_o.eq(data.word_select(~word_nibble, self.lanes))
+            else:
+                with m.If(new_nibble):
+                    m.d.sync += self.qd_o.eq(data.word_select(~word_nibble, self.lanes))
+
+        # Drive outputs
+        m.d.comb += [
+            self.wr.eq(r_req_write),
+            self.dout.eq(r_data),
+            self.addr.eq(r_addr),
+        ]
+
+        # De-glitch
+        m.submodules += FFSynchronizer(self.qss, r_qss, reset=1)
+        m.submodules += FFSynchronizer(self.qck, r_qck, reset=1)
+        m.submodules += FFSynchronizer(self.qd_i, r_qd_i, reset=0)
+
+        if self.ddr:
+            # Time qck high on the command and address nibbles; falling edges
+            # from the data phase on are DDR data edges
+            r_qck_high = Signal(range(self.DDR_LEAD_BELOW + 1))
+            with m.If(~r_qck):
+                m.d.sync += r_qck_high.eq(0)
+            with m.Elif(r_qck_high != self.DDR_LEAD_BELOW):
+                m.d.sync += r_qck_high.eq(r_qck_high + 1)
+            with m.If(Fell(r_qck) & ~r_data_phase):
+                m.d.sync += r_lead.eq(r_qck_high < self.DDR_LEAD_BELOW)
+
+        if self.prefetch:
+            r_fetching = Signal()
+
+            # Emptied whenever the host deselects
+            m.submodules.prefetch = fifo = ResetInserter(r_qss)(
+                SyncFIFO(width=self.data_bits, depth=self.prefetch))
+            self._fetch(m, fifo, r_fetching, r_addr, flush=r_qss)
+
+            m.d.comb += self.qdr.eq(r_fetching & fifo.r_rdy)
+            with m.If(r_qss):
+                m.d.sync += r_fetching.eq(0)
+        else:
+            m.d.comb += [
+                self.rd.eq(r_req_read),
+                self.qdr.eq(1),
+            ]
+
+        # Reset signals when qss is high
+        with m.If(r_qss):
+            m.d.sync += [
+                r_req_read.eq(0),
+                r_req_write.eq(0),
+                r_nibble_count.eq(0),
+                r_data_phase.eq(0),
+                self.qd_oe.eq(0),
+            ]
+        with m.Else():  # qss == 0
+            with m.If(new_nibble):
+                m.d.sync += r_nibble_count.eq(r_nibble_count + 1)
+                # Falling edges carry data from the rising edge of the first data nibble on
+                with m.If(r_nibble_count == self.cmd_nibbles + self.addr_nibbles):
+                    m.d.sync += r_data_phase.eq(1)
+
+        # wr is a one cycle strobe, so targets like FIFOs see each write once
+        m.d.sync += r_req_write.eq(0)
+
+        with m.FSM() as fsm:
+            with m.State("COMMAND"):
+                with m.If(new_nibble):
+                    # Read in the byte with the command bit and the top 7 address bits
+                    m.d.sync += r_cmd.eq(Cat(r_qd_i, r_cmd[:-self.lanes]))
+                    with m.If(r_nibble_count == self.cmd_nibbles - 1):
+                        m.next = "ADDRESS"
+            with m.State("ADDRESS"):
+                with m.If(new_nibble):
+                    with m.If(r_nibble_count == self.cmd_nibbles + self.addr_nibbles - 1):
+                        m.d.sync += r_addr.eq(Cat(r_qd_i, r_addr[:16 - self.lanes], r_cmd[:7]))
+                        with m.If(r_cmd[7]):
+                            m.d.sync += [
+                                self.qd_oe.eq(Repl(0b1, self.lanes)),
+                                r_req_read.eq(1)
+                            ]
+                            if self.prefetch:
+                                m.d.sync += r_fetching.eq(1)
+                                m.next = "BURST_DATA"
+                            else:
+                                m.next = "READ_DATA"
+                        with m.Else():
+                            m.next = "WRITE_DATA"
+                    with m.Else():
+                        m.d.sync += r_addr.eq(Cat(r_qd_i, r_addr[:-self.lanes])),
+                with m.If(Rose(r_qss)):
+                    m.next = "COMMAND"
+            with m.State("WRITE_DATA"):
+                with m.If(new_nibble):
+                    # write data
+                    m.d.sync += r_data.eq(Cat(r_qd_i, r_data[:-self.lanes]))
+                    with m.If(last_nibble):
+                        m.d.sync += [
+                            r_req_write.eq(1),
+                            r_addr.eq(r_addr + 1)
+                        ]
+                with m.If(Rose(r_qss)):
+                    m.next = "COMMAND"
+            with m.State("READ_DATA"):
+                launch(self.din)
+                with m.If(new_nibble & last_nibble):
+                    m.d.comb += self.word_sent.eq(1)
+                with m.If(advance):
+                    m.d.sync += [
+                        r_req_read.eq(1),
+                        r_addr.eq(r_addr + 1),
+                    ]
+                with m.Elif(new_nibble):
+                    m.d.sync += r_req_read.eq(0)
+                with m.If(Rose(r_qss)):
+                    m.next = "COMMAND"
+            if self.prefetch:
+                with m.State("BURST_DATA"):
+                    launch(fifo.r_data)
+                    with m.If(new_nibble & last_nibble):
+                        m.d.comb += self.word_sent.eq(1)
+                    with m.If(advance):
+                        m.d.comb += fifo.r_en.eq(1)
+                    # The edge that launches a word's first nibble
+                    with m.If(new_nibble & Mux(r_lead, last_nibble, word_nibble == 0)):
+                        m.d.comb += self.underrun.eq(~fifo.r_rdy)
+                    with m.If(Rose(r_qss)):
+                        m.next = "COMMAND"
+
+        # Deselected part way through the command, address or a data word
+        in_header = fsm.ongoing("COMMAND") | fsm.ongoing("ADDRESS")
+        m.d.comb += self.frame_error.eq(Rose(r_qss) & pwr_on_reset.all() &
+                                        Mux(in_header, r_nibble_count != 0, word_nibble != 0))
+
+        return m
+
+    def _elaborate_source_sync(self, platform):
+        m = Module()
+
+        r_req_write    = Signal()
+        r_data         = Signal(self.data_bits)
+        r_addr         = Signal(self.addr_bits)
+        r_fetching     = Signal()
+        r_qss          = Signal()
+
+        # qck domain: the framing logic is held in reset while qss is high,
+        # the FIFO sides are not, so no received data is lost on deselect
+        m.domains.qspi = cd_qspi = ClockDomain("qspi", reset_less=True, local=True)
+        m.domains.qspi_frame = cd_frame = ClockDomain("qspi_frame", async_reset=True, local=True)
+
+        m.submodules += FFSynchronizer(self.qss, r_qss, reset=1)
+        m.d.comb += [
+            cd_qspi.clk.eq(self.qck),
+            cd_frame.clk.eq(self.qck),
+            cd_frame.rst.eq(self.qss),
+        ]
+
+        # Ignore spurious QSPI data after programming
+        pwr_on_reset = Signal(10)
+        with m.If(~pwr_on_reset.all()):
+            m.d.sync += pwr_on_reset.eq(pwr_on_reset + 1)
+
+        # Events from the qck domain: an address (with the read flag and the
+        # read's generation) or a write data word
+        payload_bits = max(self.addr_bits, self.data_bits)
+        m.submodules.events = events = AsyncFIFO(width=payload_bits + 3, depth=16,
+                                                 r_domain="sync", w_domain="qspi")
+        # Read data, each word tagged with the generation of the read it was
+        # fetched for. Neither side is ever reset, as resetting an async FIFO
+        # needs edges on both clocks: words a read left behind are dropped
+        # by the qck side instead, one per edge of the frames that follow.
+        m.submodules.rdata = rdata = AsyncFIFO(width=self.data_bits + 1, depth=self.prefetch or 4,
+                                               r_domain="qspi", w_domain="sync")
+
+        # qck domain
+        q_cmd    = Signal(8)
+        q_addr   = Signal(16)
+        q_data   = Signal(self.data_bits - 4)
+        q_word   = Signal(log2_int(self.data_nibbles))
+        q_count  = Signal(range(max(self.addr_nibbles, self.dummy_nibbles, 2)))
+        q_gen    = Signal()
+        q_active = Signal()
+        q_next   = Signal()
+
+        # Words left in the FIFO by an earlier read are stale
+        m.d.comb += rdata.r_en.eq(q_next | (rdata.r_rdy & ~(q_active & (rdata.r_data[-1] == q_gen))))
+
+        with m.FSM(domain="qspi_frame"):
+            with m.State("COMMAND"):
+                # Read in the byte with the command bit and the top 7 address bits
+                m.d.qspi_frame += [
+                    q_cmd.eq(Cat(self.qd_i, q_cmd[:-4])),
+                    q_count.eq(q_count + 1)
+                ]
+                with m.If(q_count == 1):
+                    m.d.qspi_frame += q_count.eq(0)
+                    m.next = "ADDRESS"
+            with m.State("ADDRESS"):
+                m.d.qspi_frame += [
+                    q_addr.eq(Cat(self.qd_i, q_addr[:-4])),
+                    q_count.eq(q_count + 1)
+                ]
+                with m.If(q_count == self.addr_nibbles - 1):
+                    m.d.comb += [
+                        events.w_data.eq(Cat(self.qd_i, q_addr[:12], q_cmd[:7],
+                                             C(0, payload_bits - self.addr_bits), ~q_gen, C(0, 1), q_cmd[7])),
+                        events.w_en.eq(1)
+                    ]
+                    m.d.qspi_frame += q_count.eq(0)
+                    with m.If(q_cmd[7]):
+                        m.d.qspi += q_gen.eq(~q_gen)
+                        m.d.qspi_frame += [
+                            q_active.eq(1),
+                            self.qd_oe.eq(Repl(0b1, 4))
+                        ]
+                        m.next = "DUMMY" if self.dummy_nibbles else "READ_DATA"
+                    with m.Else():
+                        m.next = "WRITE_DATA"
+            with m.State("WRITE_DATA"):
+                m.d.qspi_frame += [
+                    q_data.eq(Cat(self.qd_i, q_data[:-4])),
+                    q_word.eq(q_word + 1)
+                ]
+                with m.If(q_word == self.data_nibbles - 1):
+                    m.d.comb += [
+                        events.w_data.eq(Cat(self.qd_i, q_data,
+                                             C(0, payload_bits - self.data_bits), C(0, 1), C(1, 1), C(0, 1))),
+                        events.w_en.eq(1)
+                    ]
+            with m.State("DUMMY"):
+                m.d.qspi_frame += q_count.eq(q_count + 1)
+                with m.If(q_count == self.dummy_nibbles - 1):
+                    m.next = "READ_DATA"
+            with m.State("READ_DATA"):
+                m.d.qspi_frame += [
+                    self.qd_o.eq(rdata.r_data.word_select(~q_word, 4)),
+                    q_word.eq(q_word + 1)
+                ]
+                with m.If(q_word == self.data_nibbles - 1):
+                    m.d.comb += q_next.eq(1)
+
+        # sync domain
+        r_gen     = Signal()
+        r_written = Signal(range(rdata.depth + 1))
+        r_fresh   = Signal.like(r_written)
+
+        m.d.comb += [
+            self.wr.eq(r_req_write),
+            self.dout.eq(r_data),
+            self.addr.eq(r_addr),
+            events.r_en.eq(1),
+        ]
+        self._fetch(m, rdata, r_fetching, r_addr, flush=r_qss, data=Cat(self.din, r_gen))
+
+        # Words fetched for this read, saturating, as of w_level's cycle. The
+        # FIFO holds stale words until w_level falls to at most this, and
+        # qdr waits for that, so the host's dummy and data edges only ever
+        # meet this read's words.
+        with m.If(rdata.w_en & (r_written != rdata.depth)):
+            m.d.sync += r_written.eq(r_written + 1)
+        m.d.sync += r_fresh.eq(r_written)
+        m.d.comb += self.qdr.eq(r_fetching & (rdata.w_level != 0) & (rdata.w_level <= r_fresh))
+
+        # Pulses from the qck domain are lost if they come closer together
+        # than a couple of sync cycles, so at a qck well above the sync clock
+        # with 8 bit words these undercount
+        m.submodules.word_sent = word_sent = PulseSynchronizer(i_domain="qspi", o_domain="sync")
+        m.submodules.underrun = underrun = PulseSynchronizer(i_domain="qspi", o_domain="sync")
+        m.d.comb += [
+            word_sent.i.eq(q_next),
+            self.word_sent.eq(word_sent.o),
+            underrun.i.eq(q_next & ~rdata.r_rdy),
+            self.underrun.eq(underrun.o),
+        ]
+
+        with m.If(r_qss):
+            m.d.sync += r_fetching.eq(0)
+
+        m.d.sync += r_req_write.eq(0)
+        with m.If(events.r_rdy & pwr_on_reset.all()):
+            with m.If(events.r_data[-2]):
+                # Same addressing as the oversampled front end: increment, then write
+                m.d.sync += [
+                    r_data.eq(events.r_data[:self.data_bits]),
+                    r_addr.eq(r_addr + 1),
+                    r_req_write.eq(1)
+                ]
+            with m.Else():
+                m.d.sync += [
+                    r_addr.eq(events.r_data[:self.addr_bits]),
+                    r_fetching.eq(events.r_data[-1]),
+                    r_gen.eq(events.r_data[-3]),
+                    r_written.eq(0)
+                ]
+
+        return m
@@ -0,0 +1,138 @@
+from amaranth import *
+from amaranth.lib.cdc import FFSynchronizer
+
+from .interconnect import BusTarget
+
+__all__ = ["Warmboot", "UartBootSelect", "WarmbootImage"]
+
+
+# Switches the FPGA to another image of a multi-image bitstream (see
+# Toolchain.multiboot), through the iCE40's SB_WARMBOOT primitive. The
+# FPGA reloads the selected image from the configuration flash, which
+# takes milliseconds and needs nothing from the host.
+#
+# The window has two registers:
+#   0   write: n boots image n, ignored unless n < images; read: this image
+#   1   read: number of images
+# select and boot do the same from inside the design, booting image
+# `select` when boot is high.
+class Warmboot(Elaboratable):
+    def __init__(self, image=0, images=4, name=None):
+        assert 0 <= image < images <= 4
+        self.image = image
+        self.images = images
+        self.bus = BusTarget(1, latency=1, name=name)
+
+        # inputs
+        self.select = Signal(2)
+        self.boot   = Signal()
+
+    def elaborate(self, platform):
+        m = Module()
+
+        r_din = Signal(8)
+        m.d.comb += self.bus.din.eq(r_din)
+        m.d.sync += r_din.eq(Mux(self.bus.addr, self.images, self.image))
+
+        # BOOT and the selection are held once set, until the FPGA reloads
+        r_boot   = Signal()
+        r_select = Signal(2)
+        with m.If(~r_boot):
+            with m.If(self.bus.wr & (self.bus.addr == 0) & (self.bus.dout < self.images)):
+                m.d.sync += [
+                    r_boot.eq(1),
+                    r_select.eq(self.bus.dout),
+                ]
+            with m.Elif(self.boot & (self.select < self.images)):
+                m.d.sync += [
+                    r_boot.eq(1),
+                    r_select.eq(self.select),
+                ]
+
+        if platform is not None:
+            m.submodules.warmboot = Instance("SB_WARMBOOT",
+                                             i_BOOT=r_boot,
+                                             i_S1=r_select[1],
+                                             i_S0=r_select[0])
+
+        return m
+
+
+# Boots image n of a Warmboot when the ASCII digit n arrives on a UART
+# receive pin, 8N1 at clk_freq / divisor baud.
+class UartBootSelect(Elaboratable):
+    def __init__(self, warmboot: Warmboot, divisor):
+        assert divisor >= 4
+        self.warmboot = warmboot
+        self.divisor = divisor
+
+        # inputs
+        self.rx = Signal(reset=1)
+
+    def elaborate(self, platform):
+        m = Module()
+        divisor = self.divisor
+
+        r_rx = Signal()
+        m.submodules += FFSynchronizer(self.rx, r_rx, reset=1)
+
+        # From the start bit's falling edge, sample each bit in its middle:
+        # r_bit counts data bits 0-7 then the stop bit
+        r_busy  = Signal()
+        r_count = Signal(range(divisor * 3 // 2))
+        r_bit   = Signal(range(9))
+        r_shift = Signal(8)
+        received = Signal()
+
+        with m.If(~r_busy):
+            with m.If(~r_rx):
+                m.d.sync += [
+                    r_busy.eq(1),
+                    r_count.eq(divisor * 3 // 2 - 1),
+                    r_bit.eq(0),
+                ]
+        with m.Elif(r_count == 0):
+            m.d.sync += [
+                r_count.eq(divisor - 1),
+                r_bit.eq(r_bit + 1),
+            ]
+            with m.If(r_bit == 8):
+                m.d.sync += r_busy.eq(0)
+                m.d.comb += received.eq(r_rx)
+            with m.Else():
+                m.d.sync += r_shift.eq(Cat(r_shift[1:], r_rx))
+        with m.Else():
+            m.d.sync += r_count.eq(r_count - 1)
+
+        m.d.comb += [
+            self.warmboot.select.eq(r_shift - ord("0")),
+            self.warmboot.boot.eq(received & (r_shift >= ord("0")) & (r_shift < ord("0") + 4)),
+        ]
+
+        return m
+
+
+# Wraps a design as image `image` of `images`, adding a Warmboot that the
+# deck's UART switches with the digits 0-3, for building into one
+# bitstream with IceLogicDeckPlatform.build_multiboot. The UART runs in
+# the sync domain, at clk_freq (default: the platform's default clock);
+# pass the design's sync frequency if it makes its own. A design with a
+# QSPI bus can add its own Warmboot to the bus map instead.
+class WarmbootImage(Elaboratable):
+    def __init__(self, design, image, images, clk_freq=None, baud=115200):
+        self.design = design
+        self.image = image
+        self.images = images
+        self.clk_freq = clk_freq
+        self.baud = baud
+
+    def elaborate(self, platform):
+        m = Module()
+        clk_freq = platform.default_clk_frequency if self.clk_freq is None else self.clk_freq
+
+        m.submodules.design = self.design
+        m.submodules.warmboot = warmboot = Warmboot(self.image, self.images)
+        m.submodules.uart_boot = uart_boot = UartBootSelect(warmboot, int(clk_freq // self.baud))
+        m.d.comb += uart_boot.rx.eq(platform.request("uart").rx.i)
+
+        return m
@@ -0,0 +1,29 @@
+from IceLogicDeck import *
+from HDL.Amaranth_Examples.Bus.warmboot import WarmbootImage
+from Tiles import AAVC_tile, seven_seg_tile
+from Tiles.vga import vga_timings
+from Blinky import Blink
+from Seven_Segment import SevenSegExample
+from Audio_Video import AVExample
+
+TILE = 1
+
+
+# Blink, SevenSegExample and AVExample in one multi-image bitstream, to
+# be written to the deck's configuration flash. Blink starts at power on,
+# and sending the digit 0, 1 or 2 on the deck's UART (115200 8N1) switches
+# to that image in milliseconds, with no bitstream sent from the host.
+#
+# Put the deck in advanced mode (press the mode button) and select the
+# flash sub-command before running this: in development mode the image
+# only reaches configuration RAM, and switching images does not work.
+def designs():
+    examples = [Blink(), SevenSegExample(), AVExample(timing=vga_timings['640x480@60Hz'])]
+    return [WarmbootImage(design, i, len(examples)) for i, design in enumerate(examples)]
+
+
+if __name__ == "__main__":
+    platform = IceLogicDeckPlatform()
+    platform.add_resources(seven_seg_tile.tile_resources(TILE))
+    platform.add_resources(AAVC_tile.tile_resources(TILE))
+    platform.build_multiboot(designs(), build_dir="build/multiboot", do_program=True)
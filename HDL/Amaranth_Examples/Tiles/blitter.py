@@ -0,0 +1,222 @@
+from amaranth import *
+from amaranth.build import *
+
+from HDL.Amaranth_Examples.Bus.interconnect import BusTarget
+from .framebuffer import Framebuffer
+
+__all__ = ["Blitter"]
+
+
+# Fills and copies rectangles inside a Framebuffer in the sync domain,
+# programmed over the QSPI bus, so the host can clear or scroll an area,
+# or move an object, without sending its pixels.
+#
+# Rectangles are in framebuffer bytes: `width` bytes (8 / bpp pixels each)
+# by `height` rows, from a byte offset into the framebuffer. A copy may
+# overlap its source, and a move is a copy followed by a fill of the part
+# of the source the destination does not cover, so an object can be moved
+# over a plain background with one command. Registers, 16-bit ones high
+# byte first:
+#   0      write: 1 fill, 2 copy, 3 move, starting the operation;
+#          read: bit 0 busy
+#   2-3    source offset
+#   4-5    destination offset
+#   6-7    width in bytes
+#   8-9    height in rows
+#   10     fill value
+# Writing 0 to the control register while busy stops the operation.
+#
+# It fills a byte per cycle and copies one per three cycles, in cycles the
+# fetcher and host are not using the framebuffer's ports. A move's fill
+# walks the source forwards, skipping the bytes in the destination, which
+# costs a cycle per covered byte and per destination row passed.
+class Blitter(Elaboratable):
+    FILL = 1
+    COPY = 2
+    MOVE = 3
+
+    def __init__(self, fb: Framebuffer, name=None):
+        self.fb = fb
+        self.bus = BusTarget(4, latency=1, name=name)
+
+        # outputs
+        self.busy = Signal()
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        fb = self.fb
+
+        r_src    = Signal(16)
+        r_dst    = Signal(16)
+        r_width  = Signal(16)
+        r_height = Signal(16)
+        r_value  = Signal(8)
+
+        # Bus
+        r_din = Signal(8)
+        m.d.comb += self.bus.din.eq(r_din)
+        registers = {
+            0: self.busy,
+            2: r_src[8:], 3: r_src[:8],
+            4: r_dst[8:], 5: r_dst[:8],
+            6: r_width[8:], 7: r_width[:8],
+            8: r_height[8:], 9: r_height[:8],
+            10: r_value,
+        }
+        m.d.sync += r_din.eq(0)
+        with m.Switch(self.bus.addr):
+            for offset, value in registers.items():
+                with m.Case(offset):
+                    m.d.sync += r_din.eq(value)
+                    if offset:
+                        with m.If(self.bus.wr):
+                            m.d.sync += value.eq(self.bus.dout)
+        ctrl = self.bus.wr & (self.bus.addr == 0)
+        stop = ctrl & (self.bus.dout == 0)
+
+        # Current position, where it started in the row, and counts,
+        # stepping backwards when a copy's destination is after its source
+        r_back    = Signal()
+        r_sp      = Signal(16)
+        r_dp      = Signal(16)
+        r_src_row = Signal(16)
+        r_dst_row = Signal(16)
+        r_col     = Signal(16)
+        r_row     = Signal(16)
+        r_data    = Signal(8)
+        # Whether a copy is a move, and in the move's fill the number of
+        # destination rows passed, r_dst_row being the start of the next
+        r_move    = Signal()
+        r_cover   = Signal(16)
+
+        last = (r_height - 1) * fb.stride
+        step = Mux(r_back, -1, 1)
+        row_step = Mux(r_back, -fb.stride, fb.stride)
+
+        def finish():
+            m.next = "IDLE"
+
+        def uncover():
+            with m.If(r_move):
+                m.next = "UNCOVER"
+                m.d.sync += [
+                    r_back.eq(0),
+                    r_col.eq(0),
+                    r_row.eq(0),
+                    r_src_row.eq(r_src),
+                    r_sp.eq(r_src),
+                    r_dst_row.eq(r_dst),
+                    r_cover.eq(0),
+                ]
+            with m.Else():
+                m.next = "IDLE"
+
+        def advance(done=finish, dst=True):
+            with m.If(r_col == r_width - 1):
+                m.d.sync += [
+                    r_col.eq(0),
+                    r_row.eq(r_row + 1),
+                    r_src_row.eq(r_src_row + row_step),
+                    r_sp.eq(r_src_row + row_step),
+                ]
+                if dst:
+                    m.d.sync += [
+                        r_dst_row.eq(r_dst_row + row_step),
+                        r_dp.eq(r_dst_row + row_step),
+                    ]
+                with m.If(r_row == r_height - 1):
+                    done()
+            with m.Else():
+                m.d.sync += [
+                    r_col.eq(r_col + 1),
+                    r_sp.eq(r_sp + step),
+                ]
+                if dst:
+                    m.d.sync += r_dp.eq(r_dp + step)
+
+        m.d.comb += fb.blit_wdata.eq(r_value)
+        with m.FSM():
+            with m.State("IDLE"):
+                copy = (self.bus.dout == self.COPY) | (self.bus.dout == self.MOVE)
+                back = copy & (r_dst > r_src)
+                src = Mux(back, r_src + last + r_width - 1, r_src)
+                dst = Mux(back, r_dst + last + r_width - 1, r_dst)
+                with m.If(ctrl & (r_width != 0) & (r_height != 0)):
+                    m.d.sync += [
+                        r_back.eq(back),
+                        r_col.eq(0),
+                        r_row.eq(0),
+                        r_src_row.eq(src),
+                        r_dst_row.eq(dst),
+                        r_sp.eq(src),
+                        r_dp.eq(dst),
+                        r_move.eq(self.bus.dout == self.MOVE),
+                    ]
+                    with m.Switch(self.bus.dout):
+                        with m.Case(self.FILL):
+                            m.next = "FILL"
+                        with m.Case(self.COPY, self.MOVE):
+                            m.next = "READ"
+            with m.State("FILL"):
+                m.d.comb += [
+                    self.busy.eq(1),
+                    fb.blit_addr.eq(r_dp),
+                    fb.blit_we.eq(fb.blit_write_ok),
+                ]
+                with m.If(fb.blit_write_ok):
+                    advance()
+                with m.If(stop):
+                    m.next = "IDLE"
+            with m.State("READ"):
+                m.d.comb += [
+                    self.busy.eq(1),
+                    fb.blit_addr.eq(r_sp),
+                ]
+                with m.If(fb.blit_read_ok):
+                    m.next = "DATA"
+                with m.If(stop):
+                    m.next = "IDLE"
+            with m.State("DATA"):
+                m.d.comb += self.busy.eq(1)
+                m.d.sync += r_data.eq(fb.blit_rdata)
+                m.next = "WRITE"
+                with m.If(stop):
+                    m.next = "IDLE"
+            with m.State("WRITE"):
+                m.d.comb += [
+                    self.busy.eq(1),
+                    fb.blit_addr.eq(r_dp),
+                    fb.blit_wdata.eq(r_data),
+                    fb.blit_we.eq(fb.blit_write_ok),
+                ]
+                with m.If(fb.blit_write_ok):
+                    m.next = "READ"
+                    advance(done=uncover)
+                with m.If(stop):
+                    m.next = "IDLE"
+            with m.State("UNCOVER"):
+                # Destination rows are disjoint and in address order, as
+                # are the fill positions, so the row at or after the fill
+                # position only moves forwards
+                rows_left = r_cover != r_height
+                passed = rows_left & (r_dst_row + r_width <= r_sp)
+                covered = rows_left & (r_dst_row <= r_sp)
+                m.d.comb += self.busy.eq(1)
+                with m.If(passed):
+                    m.d.sync += [
+                        r_cover.eq(r_cover + 1),
+                        r_dst_row.eq(r_dst_row + fb.stride),
+                    ]
+                with m.Elif(covered):
+                    advance(dst=False)
+                with m.Else():
+                    m.d.comb += [
+                        fb.blit_addr.eq(r_sp),
+                        fb.blit_we.eq(fb.blit_write_ok),
+                    ]
+                    with m.If(fb.blit_write_ok):
+                        advance(dst=False)
+                with m.If(stop):
+                    m.next = "IDLE"
+
+        return m
@@ -0,0 +1,260 @@
+from amaranth import *
+from amaranth.build import *
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.lib.fifo import AsyncFIFO
+
+from HDL.Amaranth_Examples.Bus.interconnect import BusTarget
+from .vga import VGADriver
+
+__all__ = ["Framebuffer", "rgb332", "expand_rgb332", "pack"]
+
+
+def rgb332(r, g, b):
+    """Pack 8-bit red, green and blue into an RGB332 colour."""
+    return (r & 0xe0) | (g & 0xe0) >> 3 | b >> 6
+
+
+def expand_rgb332(colour):
+    """8-bit red, green and blue Values from an RGB332 Value, repeating the bits of each."""
+    return (Cat(colour[6:8], colour[5:8], colour[5:8]),
+            Cat(colour[3:5], colour[2:5], colour[2:5]),
+            Repl(colour[0:2], 4))
+
+
+def pack(pixels, bpp) -> bytes:
+    """Pack pixel values, `bpp` bits each, into framebuffer bytes, leftmost pixel in the high bits."""
+    per_byte = 8 // bpp
+    data = bytearray(-(-len(pixels) // per_byte))
+    for i, pixel in enumerate(pixels):
+        data[i // per_byte] |= (pixel & ((1 << bpp) - 1)) << (8 - bpp * (i % per_byte + 1))
+    return bytes(data)
+
+
+# Supplies VGADriver's pixels from a block RAM framebuffer written over
+# the QSPI bus.
+#
+# Pixels are `bpp` bits (1, 2, 4 or 8), packed leftmost pixel first from
+# the high bits of each byte, rows one after the other from address 0, so
+# a host can send a whole frame as a single burst. With a palette, each
+# pixel indexes a table of 2**bpp RGB332 colours (red in bits 7-5, green
+# 4-2, blue 1-0), which is how the AV tile's 3/3/2 bit DAC is driven;
+# without one, 8 bpp pixels are RGB332 colours themselves. The palette
+# defaults to a grey ramp, or to the identity for 8 bpp.
+#
+# The image is scaled up by whole numbers, each pixel repeated scale_x
+# times and each row fetched scale_y times, and shown at the top left of
+# the screen with black around it. The iCE40 HX4K has 10KB of block RAM,
+# so e.g. 4 bpp at 128x96 scaled by 5 fills 640x480 in 6KB.
+#
+# With a palette the bus window's lower half is the framebuffer and the
+# upper half the palette, at palette_base. Writes go straight to the RAM,
+# and reads return 0, as a second read port would double the RAM used.
+#
+# A fetcher in the sync domain reads out every visible pixel in raster
+# order, black outside the image, into an async FIFO that VGADriver pops
+# from the pixel domain with o_fetch_next. The sync clock must be at least
+# as fast as the pixel clock. During vertical blanking the fetcher and the
+# FIFO are held in reset, so each frame starts from the first pixel even
+# after an underrun; they are released a line before the first visible
+# line, which leaves time to fill the FIFO.
+#
+# The fetcher reads the RAM once for every visible screen pixel, black and
+# repeated ones included, so each source row is read again for each of its
+# scale_y lines, and each byte for each pixel it covers: a frame costs
+# x * y reads (307200 at 640x480) whatever the scale. A line buffer would
+# cut the row repeats, but needs a 512 byte block RAM of the HX4K's 20,
+# and only the blitter would gain: it has the read port in the cycles the
+# fetcher leaves, about half of them on visible lines with the sync clock
+# at twice the pixel clock, and all of them in vertical blanking.
+#
+# colour is the RGB332 colour of the pixel on screen, 0 when blanked.
+# underrun pulses in the pixel domain for each pixel that was needed
+# before the FIFO had it; the pixel is shown black.
+#
+# A Blitter uses the blit_* port, in the sync domain: blit_addr is read
+# while blit_read_ok, with the data in blit_rdata on the next cycle, and
+# written with blit_we while blit_write_ok. The fetcher and host writes come first.
+class Framebuffer(Elaboratable):
+    def __init__(self, vga: VGADriver, width=128, height=64, bpp=8, scale_x=1, scale_y=1,
+                 palette=None, fifo_depth=16, name=None):
+        assert bpp in (1, 2, 4, 8)
+        assert width * bpp % 8 == 0, "rows must be whole bytes"
+        assert width * scale_x <= vga.timing.x and height * scale_y <= vga.timing.y, \
+            "framebuffer larger than the screen"
+        self.vga = vga
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.fifo_depth = fifo_depth
+        self.stride = width * bpp // 8
+
+        self.mem = Memory(width=8, depth=self.stride * height)
+        addr_bits = (self.mem.depth - 1).bit_length()
+        if palette is None:
+            palette = bpp < 8
+        if palette:
+            if bpp == 8:
+                init = list(range(256))
+            else:
+                levels = [i * 255 // ((1 << bpp) - 1) for i in range(1 << bpp)]
+                init = [rgb332(level, level, level) for level in levels]
+            self.palette = Memory(width=8, depth=1 << bpp, init=init)
+            addr_bits = max(addr_bits, bpp)
+            self.palette_base = 1 << addr_bits
+            addr_bits += 1
+        else:
+            self.palette = None
+            self.palette_base = None
+        self.bus = BusTarget(addr_bits, latency=0, name=name)
+
+        # outputs
+        self.colour   = Signal(8)
+        self.underrun = Signal()
+        # Cleared by a layer, such as SpriteLayer, that drives the VGADriver instead
+        self.drive_vga = True
+
+        # blitter port
+        self.blit_addr     = Signal(range(self.mem.depth))
+        self.blit_we       = Signal()
+        self.blit_wdata    = Signal(8)
+        self.blit_rdata    = Signal(8)
+        self.blit_read_ok  = Signal()
+        self.blit_write_ok = Signal()
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        timing = self.vga.timing
+        frame_y = timing.y + timing.v_front_porch + timing.v_sync_pulse + timing.v_back_porch
+        per_byte = 8 // self.bpp
+
+        # Host and blitter writes
+        in_palette = self.bus.addr[-1] if self.palette is not None else C(0)
+        host_we = self.bus.wr & ~in_palette & (self.bus.addr < self.mem.depth)
+        m.submodules.w = w = self.mem.write_port()
+        m.d.comb += [
+            w.addr.eq(Mux(host_we, self.bus.addr, self.blit_addr)),
+            w.data.eq(Mux(host_we, self.bus.dout, self.blit_wdata)),
+            w.en.eq(host_we | self.blit_we),
+            self.blit_write_ok.eq(~host_we),
+            self.bus.din.eq(0),
+        ]
+        if self.palette is not None:
+            m.submodules.palette_w = palette_w = self.palette.write_port()
+            m.d.comb += [
+                palette_w.addr.eq(self.bus.addr),
+                palette_w.data.eq(self.bus.dout),
+                palette_w.en.eq(self.bus.wr & in_palette),
+            ]
+
+        # Hold the fetcher in reset from the end of the last visible line
+        # to the start of the last line of the frame
+        R_vblank = Signal()
+        r_vblank = Signal()
+        m.d.pixel += R_vblank.eq((self.vga.o_beam_y >= timing.y) & (self.vga.o_beam_y < frame_y - 1))
+        m.submodules += FFSynchronizer(R_vblank, r_vblank, reset=1)
+
+        m.domains.fb_fetch = cd_fetch = ClockDomain("fb_fetch", local=True)
+        m.d.comb += [
+            cd_fetch.clk.eq(ClockSignal()),
+            cd_fetch.rst.eq(r_vblank | ResetSignal()),
+        ]
+
+        m.submodules.fifo = fifo = AsyncFIFO(width=8, depth=self.fifo_depth,
+                                             r_domain="pixel", w_domain="fb_fetch")
+
+        # Fetch. r_x and r_y count screen pixels, r_rep_x and r_rep_y the
+        # repeats of the current image pixel and row
+        r_x     = Signal(range(timing.x))
+        r_y     = Signal(range(timing.y + 1))
+        r_rep_x = Signal(range(self.scale_x))
+        r_rep_y = Signal(range(self.scale_y))
+        r_pixel = Signal(range(per_byte))
+        r_addr  = Signal(range(self.mem.depth + self.stride))
+        r_row   = Signal(range(self.mem.depth + self.stride))
+
+        # Pipeline: the byte is read, then the pixel's colour looked up
+        latency = 1 if self.palette is None else 2
+        in_image = (r_x < self.width * self.scale_x) & (r_y < self.height * self.scale_y)
+        # w_level lags writes by two cycles, and `latency` more pixels are in flight
+        issue = (r_y != timing.y) & (fifo.w_level < fifo.depth - latency - 1)
+
+        with m.If(issue):
+            with m.If(in_image):
+                m.d.fb_fetch += r_rep_x.eq(r_rep_x + 1)
+                with m.If(r_rep_x == self.scale_x - 1):
+                    m.d.fb_fetch += [
+                        r_rep_x.eq(0),
+                        r_pixel.eq(r_pixel + 1),
+                    ]
+                    with m.If(r_pixel == per_byte - 1):
+                        m.d.fb_fetch += [
+                            r_pixel.eq(0),
+                            r_addr.eq(r_addr + 1),
+                        ]
+            with m.If(r_x == timing.x - 1):
+                m.d.fb_fetch += [
+                    r_x.eq(0),
+                    r_y.eq(r_y + 1),
+                    r_rep_x.eq(0),
+                    r_pixel.eq(0),
+                    r_addr.eq(r_row),
+                ]
+                with m.If(r_y < self.height * self.scale_y):
+                    m.d.fb_fetch += r_rep_y.eq(r_rep_y + 1)
+                    with m.If(r_rep_y == self.scale_y - 1):
+                        m.d.fb_fetch += [
+                            r_rep_y.eq(0),
+                            r_row.eq(r_row + self.stride),
+                            r_addr.eq(r_row + self.stride),
+                        ]
+            with m.Else():
+                m.d.fb_fetch += r_x.eq(r_x + 1)
+
+        m.submodules.r = r = self.mem.read_port()
+        m.d.comb += [
+            r.addr.eq(Mux(issue, r_addr, self.blit_addr)),
+            self.blit_read_ok.eq(~issue),
+            self.blit_rdata.eq(r.data),
+        ]
+
+        p1_valid = Signal()
+        p1_black = Signal()
+        p1_pixel = Signal.like(r_pixel)
+        m.d.fb_fetch += [
+            p1_valid.eq(issue),
+            p1_black.eq(~in_image),
+            p1_pixel.eq(r_pixel),
+        ]
+        index = r.data if per_byte == 1 else r.data.word_select(~p1_pixel, self.bpp)
+
+        if self.palette is None:
+            valid, black, colour = p1_valid, p1_black, index
+        else:
+            m.submodules.palette_r = palette_r = self.palette.read_port()
+            m.d.comb += palette_r.addr.eq(index)
+            valid = Signal()
+            black = Signal()
+            m.d.fb_fetch += [
+                valid.eq(p1_valid),
+                black.eq(p1_black),
+            ]
+            colour = palette_r.data
+
+        m.d.comb += [
+            fifo.w_data.eq(Mux(black, 0, colour)),
+            fifo.w_en.eq(valid),
+        ]
+
+        # Display
+        m.d.comb += [
+            fifo.r_en.eq(self.vga.o_fetch_next),
+            self.underrun.eq(self.vga.o_fetch_next & ~fifo.r_rdy),
+        ]
+        with m.If(self.vga.o_fetch_next & fifo.r_rdy):
+            m.d.comb += self.colour.eq(fifo.r_data)
+        if self.drive_vga:
+            m.d.comb += Cat(self.vga.i_r, self.vga.i_g, self.vga.i_b).eq(Cat(*expand_rgb332(self.colour)))
+
+        return m
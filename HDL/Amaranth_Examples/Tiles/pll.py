@@ -1,4 +1,7 @@
 from collections import namedtuple
+from typing import NamedTuple
+import functools
+import math
 import warnings
 
 from amaranth import *
@@ -6,6 +9,60 @@ from amaranth.lib.cdc import ResetSynchronizer
 from amaranth.cli import main
 
 
+coefficients = namedtuple('coefficients', 'divr divf divq')
+
+
+class PLLCandidate(NamedTuple):
+    divr: int
+    divf: int
+    divq: int
+    filter_range: int
+    f_pfd: float
+    f_vco: float
+    f_out: float
+    error_ppm: float
+
+
+def filter_range(f_pfd):
+    # Loop filter setting for the phase detector frequency, from icepll
+    for filt_range, f_max in enumerate((17, 26, 44, 66, 101), start=1):
+        if f_pfd < f_max:
+            return filt_range
+    return 6
+
+
+@functools.lru_cache(maxsize=None)
+def pll_candidates(f_in, f_req):
+    """
+    Return every usable DIVR/DIVQ combination with its closest DIVF for
+    an output of `f_req` MHz from `f_in` MHz, best first: smallest
+    absolute error, then highest phase detector frequency (least jitter).
+    Frequencies may be fractional, e.g. pll_candidates(16, 25.175).
+    """
+    # cribbed from Icestorm's icepll.
+    assert 16 <= f_in <= 100
+    assert 16 <= f_req <= 275
+    candidates = []
+    for divr in range(16):
+        pfd = f_in / (divr + 1)
+        if not 10 <= pfd <= 133:
+            continue
+        for divq in range(1, 7):
+            # fout = pfd * (divf + 1) / 2**divq, so only the two DIVF values
+            # either side of the exact solution can be closest
+            exact = f_req * 2 ** divq / pfd - 1
+            for divf in {math.floor(exact), math.ceil(exact)}:
+                vco = pfd * (divf + 1)
+                if not (0 <= divf < 128 and 533 <= vco <= 1066):  # see comments in icepll.cc
+                    continue
+                fout = vco * 2 ** -divq
+                candidates.append(PLLCandidate(
+                    divr, divf, divq, filter_range(pfd), pfd, vco, fout,
+                    (fout - f_req) / f_req * 1e6))
+    assert candidates, f'PLL: no coefficients for {f_req} MHz from {f_in} MHz'
+    return tuple(sorted(candidates, key=lambda c: (abs(c.error_ppm), -c.f_pfd)))
+
+
 class PLL(Elaboratable):
     """
     Instantiate the iCE40's phase-locked loop (PLL).
@@ -21,13 +78,22 @@ class PLL(Elaboratable):
     This module also has a reset synchronizer -- the domain's reset line
     is not released until a few clocks after the PLL lock signal is
     good.
+    The chosen coefficients are in `result` (a PLLCandidate, including
+    the exact output frequency and its error in ppm) and the ranked
+    alternatives in `candidates`.
     """
 
     def __init__(self, freq_in_mhz, freq_out_mhz, domain_name='sync'):
         self.freq_in = freq_in_mhz
         self.freq_out = freq_out_mhz
-        self.coeff = self._calc_freq_coefficients()
-        print(self.coeff)
+        self.candidates = pll_candidates(freq_in_mhz, freq_out_mhz)
+        self.result = self.candidates[0]
+        if self.result.error_ppm != 0:
+            warnings.warn(
+                f'PLL: requested {freq_out_mhz} MHz, got {self.result.f_out} MHz '
+                f'({self.result.error_ppm:+.1f} ppm)',
+                stacklevel=2)
+        self.coeff = coefficients(self.result.divr, self.result.divf, self.result.divq)
         self.clk_pin = Signal()
         self.rst_pin = Signal()
         self.domain_name = domain_name
@@ -39,58 +105,16 @@ class PLL(Elaboratable):
         ]
         self.locked = Signal()
 
-    def _calc_freq_coefficients(self):
-        # cribbed from Icestorm's icepll.
-        f_in, f_req = self.freq_in, self.freq_out
-        assert 16 <= f_in <= 100
-        assert 16 <= f_req <= 275
-        coefficients = namedtuple('coefficients', 'divr divf divq')
-        divf_range = 128  # see comments in icepll.cc
-        best_fout = float('inf')
-        for divr in range(16):
-            pfd = f_in / (divr + 1)
-            if 10 <= pfd <= 133:
-                for divf in range(divf_range):
-                    vco = pfd * (divf + 1)
-                    if 533 <= vco <= 1066:
-                        for divq in range(1, 7):
-                            fout = vco * 2 ** -divq
-                            if abs(fout - f_req) < abs(best_fout - f_req):
-                                best_fout = fout
-                                best = coefficients(divr, divf, divq)
-        if best_fout != f_req:
-            warnings.warn(
-                f'PLL: requested {f_req} MHz, got {best_fout} MHz)',
-                stacklevel=3)
-        return best
-
     def elaborate(self, platform):
 
         pll_lock = Signal()
 
-        f_pfd = self.freq_in / (self.coeff.divr + 1);
-
-        if f_pfd < 17:
-            filt_range = 1
-        elif f_pfd < 26:
-            filt_range = 2
-        elif f_pfd < 44:
-            filt_range = 3
-        elif f_pfd < 66:
-            filt_range = 4
-        elif f_pfd < 101:
-            filt_range = 5
-        else:
-            filt_range = 6
-
-        print("filter range", filt_range)
-
         pll = Instance("SB_PLL40_CORE",  # "SB_PLL40_PAD" for up5k
                        p_FEEDBACK_PATH='SIMPLE',
                        p_DIVR=self.coeff.divr,
                        p_DIVF=self.coeff.divf,
                        p_DIVQ=self.coeff.divq,
-                       p_FILTER_RANGE=filt_range,
+                       p_FILTER_RANGE=self.result.filter_range,
 
                        ##i_PACKAGEPIN=self.clk_pin, for up5k
                        i_REFERENCECLK=self.clk_pin,
@@ -109,6 +133,115 @@ class PLL(Elaboratable):
         return m
 
 
+class DualPLLCandidate(NamedTuple):
+    pll: PLLCandidate
+    portb: str
+    f_out_a: float
+    error_ppm_a: float
+    f_out_b: float
+    error_ppm_b: float
+
+    @property
+    def error_ppm(self):
+        # Worst of the two outputs
+        return max(abs(self.error_ppm_a), abs(self.error_ppm_b))
+
+
+# Port B output selections available with simple feedback, and their frequency
+# relative to port A
+PORTB_RATIOS = {'GENCLK': 1, 'GENCLK_HALF': 0.5}
+
+
+@functools.lru_cache(maxsize=None)
+def dual_pll_candidates(f_in, f_req_a, f_req_b):
+    """
+    Return coefficients for SB_PLL40_2F_CORE giving `f_req_a` MHz on port A
+    and `f_req_b` MHz on port B, best first by the worse of the two errors.
+    Port B is port A's clock or half of it, so the two requests should be
+    equal or 2:1; other ratios get the closest such pair.
+    """
+    candidates = set()
+    for portb, ratio in PORTB_RATIOS.items():
+        targets = {f_req_a, f_req_b / ratio}
+        for target in targets:
+            if not 16 <= target <= 275:
+                continue
+            for pll in pll_candidates(f_in, target):
+                f_out_b = pll.f_out * ratio
+                candidates.add(DualPLLCandidate(
+                    pll, portb,
+                    pll.f_out, (pll.f_out - f_req_a) / f_req_a * 1e6,
+                    f_out_b, (f_out_b - f_req_b) / f_req_b * 1e6))
+    assert candidates, f'PLL: no coefficients for {f_req_a}/{f_req_b} MHz from {f_in} MHz'
+    return tuple(sorted(candidates, key=lambda c: (c.error_ppm, -c.pll.f_pfd, c.portb)))
+
+
+class DualPLL(Elaboratable):
+    """
+    Instantiate the iCE40's two-output PLL (SB_PLL40_2F_CORE) in simple
+    feedback mode, driving two clock domains from one PLL.
+    Port B runs at the same frequency as port A or at half of it, and its
+    edges are aligned with port A's, so signals can pass from one domain
+    to the other with ordinary registers instead of a synchronizer.
+    Each domain has its own reset synchronizer, released after lock.
+    The chosen coefficients are in `result` (a DualPLLCandidate).
+    """
+
+    def __init__(self, freq_in_mhz, freq_a_mhz, freq_b_mhz, domain_a='sync', domain_b='pixel'):
+        self.freq_in = freq_in_mhz
+        self.freq_a = freq_a_mhz
+        self.freq_b = freq_b_mhz
+        self.candidates = dual_pll_candidates(freq_in_mhz, freq_a_mhz, freq_b_mhz)
+        self.result = self.candidates[0]
+        if self.result.error_ppm != 0:
+            warnings.warn(
+                f'PLL: requested {freq_a_mhz}/{freq_b_mhz} MHz, got '
+                f'{self.result.f_out_a}/{self.result.f_out_b} MHz',
+                stacklevel=2)
+        self.clk_pin = Signal()
+        self.rst_pin = Signal()
+        self.domain_a = ClockDomain(domain_a)
+        self.domain_b = ClockDomain(domain_b)
+        self.ports = [
+            self.clk_pin,
+            self.domain_a.clk,
+            self.domain_a.rst,
+            self.domain_b.clk,
+            self.domain_b.rst,
+        ]
+        self.locked = Signal()
+
+    def elaborate(self, platform):
+
+        pll_lock = Signal()
+
+        pll = Instance("SB_PLL40_2F_CORE",
+                       p_FEEDBACK_PATH='SIMPLE',
+                       p_PLLOUT_SELECT_PORTA='GENCLK',
+                       p_PLLOUT_SELECT_PORTB=self.result.portb,
+                       p_DIVR=self.result.pll.divr,
+                       p_DIVF=self.result.pll.divf,
+                       p_DIVQ=self.result.pll.divq,
+                       p_FILTER_RANGE=self.result.pll.filter_range,
+
+                       i_REFERENCECLK=self.clk_pin,
+                       i_RESETB=Const(1),
+                       i_BYPASS=Const(0),
+
+                       o_PLLOUTGLOBALA=ClockSignal(self.domain_a.name),
+                       o_PLLOUTGLOBALB=ClockSignal(self.domain_b.name),
+                       o_LOCK=pll_lock)
+        rs_a = ResetSynchronizer(~pll_lock | self.rst_pin, domain=self.domain_a.name)
+        rs_b = ResetSynchronizer(~pll_lock | self.rst_pin, domain=self.domain_b.name)
+
+        m = Module()
+        m.submodules += [pll, rs_a, rs_b]
+
+        m.d.comb += self.locked.eq(pll_lock)
+
+        return m
+
+
 # There is no point in simulating this, but you can generate Verilog.
 
 if __name__ == '__main__':
@@ -0,0 +1,131 @@
+from amaranth import *
+from amaranth.build import *
+from amaranth.hdl.ast import Rose
+from amaranth.lib.cdc import FFSynchronizer
+from amaranth.utils import log2_int
+
+from HDL.Amaranth_Examples.Bus.interconnect import BusTarget
+from .vga import VGADriver
+from .framebuffer import expand_rgb332
+
+__all__ = ["SpriteLayer"]
+
+
+# Hardware sprites drawn over a Framebuffer or TextMode, so an object is
+# moved by writing its position rather than redrawing the background.
+#
+# Each of `count` sprites is a size x size image of RGB332 pixels, size a
+# power of two, in its own block RAM, and the layer takes over driving the
+# VGADriver from the background. Where sprites overlap the lowest
+# numbered is on top, and pixels equal to a sprite's key colour are
+# transparent.
+#
+# The bus window's lower half holds the images, sprite n's rows from
+# n * size * size, and the upper half, from regs_base, eight registers per
+# sprite, 16-bit ones high byte first:
+#   0-1   x of the left edge, on screen from 0, wrapping at 65536 so
+#         negative values are partly off the left
+#   2-3   y of the top edge, likewise
+#   4     bit 0 enable
+#   5     key colour, default 0xe3 (magenta)
+#   6-7   reserved, writes are ignored
+# Registers read as 0, and take effect at the start of the next vertical blanking, so a
+# sprite never tears.
+class SpriteLayer(Elaboratable):
+    def __init__(self, vga: VGADriver, background, count=4, size=16, name=None):
+        self.vga = vga
+        self.background = background
+        background.drive_vga = False
+        self.count = count
+        self.size = size
+        self.size_bits = log2_int(size)
+
+        self.images = [Memory(width=8, depth=size * size) for _ in range(count)]
+        image_bits = (count * size * size - 1).bit_length()
+        assert 8 * count <= 1 << image_bits
+        self.regs_base = 1 << image_bits
+        self.bus = BusTarget(image_bits + 1, latency=0, name=name)
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        timing = self.vga.timing
+        frame_y = timing.y + timing.v_front_porch + timing.v_sync_pulse + timing.v_back_porch
+        pixels = self.size * self.size
+
+        in_regs = self.bus.addr[-1]
+        m.d.comb += self.bus.din.eq(0)
+
+        # Registers are written into staging copies, and loaded into the
+        # ones the pixel domain uses as vertical blanking starts, when it
+        # is not looking at them
+        R_vblank = Signal()
+        r_vblank = Signal()
+        m.d.pixel += R_vblank.eq((self.vga.o_beam_y >= timing.y) & (self.vga.o_beam_y < frame_y - 1))
+        m.submodules += FFSynchronizer(R_vblank, r_vblank)
+        load = Rose(r_vblank)
+
+        hits = []
+        for i, image in enumerate(self.images):
+            x       = Signal(16, name="sprite{}_x".format(i))
+            y       = Signal(16, name="sprite{}_y".format(i))
+            enable  = Signal(name="sprite{}_enable".format(i))
+            key     = Signal(8, name="sprite{}_key".format(i), reset=0xe3)
+            s_x      = Signal.like(x, name="sprite{}_staged_x".format(i))
+            s_y      = Signal.like(y, name="sprite{}_staged_y".format(i))
+            s_enable = Signal.like(enable, name="sprite{}_staged_enable".format(i))
+            s_key    = Signal.like(key, name="sprite{}_staged_key".format(i))
+
+            with m.If(self.bus.wr & in_regs):
+                with m.Switch(self.bus.addr[:-1]):
+                    with m.Case(8 * i + 0):
+                        m.d.sync += s_x[8:].eq(self.bus.dout)
+                    with m.Case(8 * i + 1):
+                        m.d.sync += s_x[:8].eq(self.bus.dout)
+                    with m.Case(8 * i + 2):
+                        m.d.sync += s_y[8:].eq(self.bus.dout)
+                    with m.Case(8 * i + 3):
+                        m.d.sync += s_y[:8].eq(self.bus.dout)
+                    with m.Case(8 * i + 4):
+                        m.d.sync += s_enable.eq(self.bus.dout[0])
+                    with m.Case(8 * i + 5):
+                        m.d.sync += s_key.eq(self.bus.dout)
+            with m.If(load):
+                m.d.sync += [
+                    x.eq(s_x),
+                    y.eq(s_y),
+                    enable.eq(s_enable),
+                    key.eq(s_key),
+                ]
+
+            w = image.write_port()
+            m.submodules["image{}_w".format(i)] = w
+            m.d.comb += [
+                w.addr.eq(self.bus.addr),
+                w.data.eq(self.bus.dout),
+                w.en.eq(self.bus.wr & ~in_regs & (self.bus.addr[self.size_bits * 2:-1] == i)),
+            ]
+
+            # Pixel x on screen is shown while the beam is at x + 1, so
+            # reading at the beam's position has the pixel a cycle later
+            dx = Signal(16, name="sprite{}_dx".format(i))
+            dy = Signal(16, name="sprite{}_dy".format(i))
+            r_hit = Signal(name="sprite{}_hit".format(i))
+            r = image.read_port(domain="pixel")
+            m.submodules["image{}_r".format(i)] = r
+            m.d.comb += [
+                dx.eq(self.vga.o_beam_x - x),
+                dy.eq(self.vga.o_beam_y - y),
+                r.addr.eq(Cat(dx[:self.size_bits], dy[:self.size_bits])),
+            ]
+            m.d.pixel += r_hit.eq(enable & (dx < self.size) & (dy < self.size))
+            hits.append((r_hit & (r.data != key), r.data))
+
+        # Lowest numbered on top
+        colour = Signal(8)
+        m.d.comb += colour.eq(self.background.colour)
+        for hit, data in reversed(hits):
+            with m.If(hit & self.vga.o_fetch_next):
+                m.d.comb += colour.eq(data)
+        m.d.comb += Cat(self.vga.i_r, self.vga.i_g, self.vga.i_b).eq(Cat(*expand_rgb332(colour)))
+
+        return m
@@ -0,0 +1,218 @@
+from amaranth import *
+from amaranth.build import *
+from amaranth.lib.fifo import SyncFIFO
+
+from HDL.Amaranth_Examples.Bus.interconnect import BusTarget
+from .vga import VGADriver
+from .framebuffer import rgb332, expand_rgb332
+from .font8x8 import FONT_8X8, font_rom
+
+__all__ = ["TextMode", "CGA_PALETTE", "cells"]
+
+
+# The 16 colours of the IBM CGA, as RGB332
+CGA_PALETTE = [rgb332(r, g, b) for r, g, b in [
+    (0x00, 0x00, 0x00), (0x00, 0x00, 0xaa), (0x00, 0xaa, 0x00), (0x00, 0xaa, 0xaa),
+    (0xaa, 0x00, 0x00), (0xaa, 0x00, 0xaa), (0xaa, 0x55, 0x00), (0xaa, 0xaa, 0xaa),
+    (0x55, 0x55, 0x55), (0x55, 0x55, 0xff), (0x55, 0xff, 0x55), (0x55, 0xff, 0xff),
+    (0xff, 0x55, 0x55), (0xff, 0x55, 0xff), (0xff, 0xff, 0x55), (0xff, 0xff, 0xff)]]
+
+
+def cells(text, fg=7, bg=0) -> bytes:
+    """Character and attribute bytes for a run of TextMode cells."""
+    attribute = bg << 4 | fg
+    return bytes(byte for char in text.encode("ascii") for byte in (char, attribute))
+
+
+# Character cell display for VGADriver, with the characters and their
+# colours written over the QSPI bus, so updating a character is a two byte
+# write rather than redrawing its pixels.
+#
+# The screen is `columns` by `rows` cells of 8x8 pixels, from the top
+# left, with each pixel repeated scale_x times across and scale_y down
+# (e.g. scale_y=2 for VGA-like 8x16 cells). Cell n is at bus offset 2n, its character code, and 2n + 1, its
+# attribute: the foreground colour in bits 0-3 and the background in bits
+# 4-7, indexing a palette of 16 RGB332 colours (CGA colours by default)
+# in the upper half of the window, at palette_base. Codes 0x20 to 0x7e
+# are ASCII from the font ROM, and setting bit 7 swaps the foreground and
+# background, for a cursor or highlighting. Writes go straight to the
+# RAMs, and reads return 0.
+#
+# Pixels are rendered in the pixel domain, a few cycles ahead of the beam,
+# into a FIFO that VGADriver pops with o_fetch_next. Like Framebuffer the
+# renderer is held in reset during vertical blanking, colour is the RGB332
+# colour of the pixel on screen, and underrun pulses for each pixel that
+# was not ready in time.
+class TextMode(Elaboratable):
+    def __init__(self, vga: VGADriver, columns=None, rows=None, scale_x=1, scale_y=1, font=FONT_8X8,
+                 fifo_depth=8, name=None):
+        self.vga = vga
+        self.scale_x = scale_x
+        self.scale_y = scale_y
+        self.columns = vga.timing.x // (8 * scale_x) if columns is None else columns
+        self.rows = vga.timing.y // (8 * scale_y) if rows is None else rows
+        assert self.columns * 8 * scale_x <= vga.timing.x and self.rows * 8 * scale_y <= vga.timing.y, \
+            "text larger than the screen"
+        self.fifo_depth = fifo_depth
+
+        count = self.columns * self.rows
+        self.chars = Memory(width=8, depth=count)
+        self.attributes = Memory(width=8, depth=count)
+        self.font = Memory(width=8, depth=128 * 8, init=font_rom(font))
+        self.palette = Memory(width=8, depth=16, init=CGA_PALETTE)
+
+        cell_bits = (2 * count - 1).bit_length()
+        self.palette_base = 1 << cell_bits
+        self.bus = BusTarget(cell_bits + 1, latency=0, name=name)
+
+        # outputs
+        self.colour   = Signal(8)
+        self.underrun = Signal()
+        # Cleared by a layer, such as SpriteLayer, that drives the VGADriver instead
+        self.drive_vga = True
+
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        timing = self.vga.timing
+        frame_y = timing.y + timing.v_front_porch + timing.v_sync_pulse + timing.v_back_porch
+
+        # Host writes
+        cell = self.bus.addr[1:-1]
+        in_cells = ~self.bus.addr[-1] & (cell < self.chars.depth)
+        in_palette = self.bus.addr[-1]
+        m.submodules.chars_w = chars_w = self.chars.write_port()
+        m.submodules.attributes_w = attributes_w = self.attributes.write_port()
+        m.submodules.palette_w = palette_w = self.palette.write_port()
+        m.d.comb += [
+            chars_w.addr.eq(cell),
+            chars_w.data.eq(self.bus.dout),
+            chars_w.en.eq(self.bus.wr & in_cells & ~self.bus.addr[0]),
+            attributes_w.addr.eq(cell),
+            attributes_w.data.eq(self.bus.dout),
+            attributes_w.en.eq(self.bus.wr & in_cells & self.bus.addr[0]),
+            palette_w.addr.eq(self.bus.addr),
+            palette_w.data.eq(self.bus.dout),
+            palette_w.en.eq(self.bus.wr & in_palette),
+            self.bus.din.eq(0),
+        ]
+
+        # Hold the renderer in reset from the end of the last visible line
+        # to the start of the last line of the frame
+        R_vblank = Signal()
+        m.d.pixel += R_vblank.eq((self.vga.o_beam_y >= timing.y) & (self.vga.o_beam_y < frame_y - 1))
+        m.domains.text = cd_text = ClockDomain("text", local=True)
+        m.d.comb += [
+            cd_text.clk.eq(ClockSignal("pixel")),
+            cd_text.rst.eq(R_vblank | ResetSignal("pixel")),
+        ]
+
+        m.submodules.fifo = fifo = DomainRenamer("text")(SyncFIFO(width=8, depth=self.fifo_depth))
+
+        # Render. r_x and r_y count screen pixels, r_gx and r_gy the pixel
+        # within the glyph, and r_rep_x and r_rep_y its repeats
+        r_x     = Signal(range(timing.x))
+        r_y     = Signal(range(timing.y + 1))
+        r_rep_x = Signal(range(self.scale_x))
+        r_rep_y = Signal(range(self.scale_y))
+        r_gx    = Signal(3)
+        r_gy    = Signal(3)
+        r_cell = Signal(range(self.chars.depth + self.columns))
+        r_row  = Signal(range(self.chars.depth + self.columns))
+
+        # Pipeline: the cell is read, then its glyph row, then the colour
+        latency = 3
+        in_text = (r_x < self.columns * 8 * self.scale_x) & (r_y < self.rows * 8 * self.scale_y)
+        issue = (r_y != timing.y) & (fifo.level < fifo.depth - latency)
+
+        with m.If(issue):
+            with m.If(in_text):
+                m.d.text += r_rep_x.eq(r_rep_x + 1)
+                with m.If(r_rep_x == self.scale_x - 1):
+                    m.d.text += [
+                        r_rep_x.eq(0),
+                        r_gx.eq(r_gx + 1),
+                    ]
+                    with m.If(r_gx == 7):
+                        m.d.text += r_cell.eq(r_cell + 1)
+            with m.If(r_x == timing.x - 1):
+                m.d.text += [
+                    r_x.eq(0),
+                    r_y.eq(r_y + 1),
+                    r_rep_x.eq(0),
+                    r_gx.eq(0),
+                    r_cell.eq(r_row),
+                ]
+                with m.If(r_y < self.rows * 8 * self.scale_y):
+                    m.d.text += r_rep_y.eq(r_rep_y + 1)
+                    with m.If(r_rep_y == self.scale_y - 1):
+                        m.d.text += [
+                            r_rep_y.eq(0),
+                            r_gy.eq(r_gy + 1),
+                        ]
+                        with m.If(r_gy == 7):
+                            m.d.text += [
+                                r_row.eq(r_row + self.columns),
+                                r_cell.eq(r_row + self.columns),
+                            ]
+            with m.Else():
+                m.d.text += r_x.eq(r_x + 1)
+
+        m.submodules.chars_r = chars_r = self.chars.read_port(domain="pixel")
+        m.submodules.attributes_r = attributes_r = self.attributes.read_port(domain="pixel")
+        m.submodules.font_r = font_r = self.font.read_port(domain="pixel")
+        m.submodules.palette_r = palette_r = self.palette.read_port(domain="pixel")
+
+        p1_valid = Signal()
+        p1_blank = Signal()
+        p1_gx    = Signal(3)
+        p1_gy    = Signal(3)
+        m.d.comb += [
+            chars_r.addr.eq(r_cell),
+            attributes_r.addr.eq(r_cell),
+        ]
+        m.d.text += [
+            p1_valid.eq(issue),
+            p1_blank.eq(~in_text),
+            p1_gx.eq(r_gx),
+            p1_gy.eq(r_gy),
+        ]
+
+        p2_valid   = Signal()
+        p2_blank   = Signal()
+        p2_gx      = Signal(3)
+        p2_inverse = Signal()
+        p2_attr    = Signal(8)
+        m.d.comb += font_r.addr.eq(Cat(p1_gy, chars_r.data[:7]))
+        m.d.text += [
+            p2_valid.eq(p1_valid),
+            p2_blank.eq(p1_blank),
+            p2_gx.eq(p1_gx),
+            p2_inverse.eq(chars_r.data[7]),
+            p2_attr.eq(attributes_r.data),
+        ]
+
+        p3_valid = Signal()
+        p3_blank = Signal()
+        lit = font_r.data.bit_select(p2_gx, 1) ^ p2_inverse
+        m.d.comb += palette_r.addr.eq(Mux(lit, p2_attr[:4], p2_attr[4:]))
+        m.d.text += [
+            p3_valid.eq(p2_valid),
+            p3_blank.eq(p2_blank),
+        ]
+
+        m.d.comb += [
+            fifo.w_data.eq(Mux(p3_blank, 0, palette_r.data)),
+            fifo.w_en.eq(p3_valid),
+        ]
+
+        # Display
+        m.d.comb += [
+            fifo.r_en.eq(self.vga.o_fetch_next),
+            self.underrun.eq(self.vga.o_fetch_next & ~fifo.r_rdy),
+        ]
+        with m.If(self.vga.o_fetch_next & fifo.r_rdy):
+            m.d.comb += self.colour.eq(fifo.r_data)
+        if self.drive_vga:
+            m.d.comb += Cat(self.vga.i_r, self.vga.i_g, self.vga.i_b).eq(Cat(*expand_rgb332(self.colour)))
+
+        return m
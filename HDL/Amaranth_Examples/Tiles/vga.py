@@ -156,6 +156,121 @@ class VGADriver(Elaboratable):
 
         return m
 
+
+# VGADriver with the same outputs, cycle for cycle, for pixel clocks of
+# 100 MHz and more.
+#
+# VGADriver compares CounterX and CounterY, bits_x and bits_y wide, with
+# eight constants every cycle. Here each line and each frame is split
+# into its display, front porch, sync and back porch segments, the
+# current one held one-hot, and a down counter per direction counts out
+# the current segment from its length minus 2, so its sign bit marks the
+# segment's last pixel (or line) without a comparator. The beam
+# coordinates are plain counters cleared at the end of the line and frame.
+class PipelinedVGADriver(VGADriver):
+    def elaborate(self, platform: Platform) -> Module:
+        m = Module()
+        t = self.timing
+        h_segments = [t.x, t.h_front_porch, t.h_sync_pulse, t.h_back_porch]
+        v_segments = [t.y, t.v_front_porch, t.v_sync_pulse, t.v_back_porch]
+        assert all(length > 0 for length in h_segments + v_segments), "empty timing segment"
+
+        # Segment counters and their last pixel/line flags, in segment order
+        def segments(m, lengths, advance, name):
+            count = Signal(range(-1, max(lengths) - 1), reset=lengths[0] - 2, name=name + "_count")
+            segment = Signal(4, reset=1, name=name + "_segment")
+            last = count[-1]
+            with m.If(advance):
+                m.d.pixel += count.eq(count - 1)
+                with m.If(last):
+                    m.d.pixel += segment.eq(segment.rotate_left(1))
+                    for i, length in enumerate(lengths):
+                        with m.If(segment[i]):
+                            m.d.pixel += count.eq(lengths[(i + 1) % 4] - 2)
+            return [segment[i] & last for i in range(4)]
+
+        h_disp_end, h_fp_end, h_sync_end, h_line_end = segments(m, h_segments, self.i_clk_en, "h")
+        line_end = self.i_clk_en & h_line_end
+        v_disp_end, v_fp_end, v_sync_end, v_frame_end = segments(m, v_segments, line_end, "v")
+
+        # Internal signals, as in VGADriver
+        R_hsync = Signal()
+        R_vsync = Signal()
+        R_disp = Signal()
+        R_disp_early = Signal()
+        R_vdisp = Signal()
+        R_blank_early = Signal()
+        R_vblank = Signal()
+        R_fetch_next = Signal()
+        CounterX = Signal(self.bits_x)
+        CounterY = Signal(self.bits_y)
+        R_blank = Signal()
+
+        with m.If(self.i_clk_en):
+            with m.If(h_line_end):
+                m.d.pixel += CounterX.eq(0)
+                with m.If(v_frame_end):
+                    m.d.pixel += CounterY.eq(0)
+                with m.Else():
+                    m.d.pixel += CounterY.eq(CounterY + 1)
+            with m.Else():
+                m.d.pixel += CounterX.eq(CounterX + 1)
+            m.d.pixel += R_fetch_next.eq(R_disp_early)
+        with m.Else():
+            m.d.pixel += R_fetch_next.eq(0)
+
+        m.d.comb += [
+            self.o_beam_x.eq(CounterX),
+            self.o_beam_y.eq(CounterY),
+            self.o_fetch_next.eq(R_fetch_next),
+        ]
+
+        # Generate sync and blank.
+        with m.If(h_disp_end):
+            m.d.pixel += [
+                R_blank_early.eq(1),
+                R_disp_early.eq(0)
+            ]
+        with m.Elif(h_line_end):
+            m.d.pixel += [
+                R_blank_early.eq(R_vblank),
+                R_disp_early.eq(R_vdisp)
+            ]
+        with m.If(h_fp_end):
+            m.d.pixel += R_hsync.eq(1)
+        with m.Elif(h_sync_end):
+            m.d.pixel += R_hsync.eq(0)
+
+        with m.If(v_disp_end):
+            m.d.pixel += [
+                R_vblank.eq(1),
+                R_vdisp.eq(0)
+            ]
+        with m.Elif(v_frame_end):
+            m.d.pixel += [
+                R_vblank.eq(0),
+                R_vdisp.eq(1)
+            ]
+        with m.If(v_fp_end):
+            m.d.pixel += R_vsync.eq(1)
+        with m.Elif(v_sync_end):
+            m.d.pixel += R_vsync.eq(0)
+
+        m.d.pixel += R_blank.eq(R_blank_early)
+        m.d.pixel += R_disp.eq(R_disp_early)
+
+        m.d.comb += [
+            self.o_vga_r.eq(self.i_r),
+            self.o_vga_g.eq(self.i_g),
+            self.o_vga_b.eq(self.i_b),
+            self.o_vga_hsync.eq(R_hsync),
+            self.o_vga_vsync.eq(R_vsync),
+            self.o_vga_blank.eq(R_blank),
+            self.o_vga_de.eq(R_disp),
+        ]
+
+        return m
+
 # Generates a VGA Test Pattern
 class VGATestPattern(Elaboratable):
     def __init__(self, vga: VGADriver):
@@ -0,0 +1,205 @@
+import argparse
+import sys
+import time
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from amaranth import *
+from amaranth.sim import Simulator
+
+from .vga import VGADriver, PipelinedVGADriver, VGATestPattern, VGATiming, vga_timings
+
+__all__ = ["Frame", "frame_size", "test_pattern", "model_frame", "capture_frame", "diff_frames", "write_ppm"]
+
+# Golden model of VGADriver and VGATestPattern, and a simulator harness
+# that checks the HDL against it, so a change to either can be checked
+# without a board or monitor.
+#
+# A Frame holds one value per pixel clock of a whole frame, blanking
+# included, as (frame_y, frame_x) arrays indexed by the beam position
+# (o_beam_y, o_beam_x) in that cycle. The model is of the steady state,
+# with i_clk_en high: VGADriver shows nothing until it has counted through
+# its first frame, so the harness captures the second.
+
+# Small enough to simulate in seconds, with every segment different
+TINY = VGATiming(x=64, y=48, refresh_rate=60.0, pixel_freq=25_000_000,
+                 h_front_porch=4, h_sync_pulse=8, h_back_porch=6,
+                 v_front_porch=2, v_sync_pulse=3, v_back_porch=4)
+
+SIGNALS = ["r", "g", "b", "hsync", "vsync", "blank", "de", "fetch_next"]
+
+
+class Frame(NamedTuple):
+    r: np.ndarray
+    g: np.ndarray
+    b: np.ndarray
+    hsync: np.ndarray
+    vsync: np.ndarray
+    blank: np.ndarray
+    de: np.ndarray
+    fetch_next: np.ndarray
+
+    def image(self) -> np.ndarray:
+        """The visible pixels, in the cycles de is high, as a (y, x, 3) array."""
+        rows = self.de.any(axis=1)
+        cols = self.de.any(axis=0)
+        rgb = np.stack([self.r, self.g, self.b], axis=-1)
+        return rgb[rows][:, cols]
+
+
+def frame_size(timing: VGATiming):
+    frame_x = timing.x + timing.h_front_porch + timing.h_sync_pulse + timing.h_back_porch
+    frame_y = timing.y + timing.v_front_porch + timing.v_sync_pulse + timing.v_back_porch
+    return frame_x, frame_y
+
+
+def _hold(load, value):
+    """A register loaded with `value` in the cycles `load` is high, over a repeating frame."""
+    flat_load = load.ravel()
+    n = len(flat_load)
+    assert flat_load.any(), "register never loaded"
+    index = np.where(np.concatenate([flat_load, flat_load]), np.arange(2 * n), -1)
+    last = np.maximum.accumulate(index)[n - 1:2 * n - 1]
+    return np.concatenate([value.ravel(), value.ravel()])[last].reshape(load.shape)
+
+
+def _delay(value):
+    """A register following `value` a cycle later."""
+    return np.roll(value.ravel(), 1).reshape(value.shape)
+
+
+def test_pattern(beam_x, beam_y):
+    """VGATestPattern's red, green and blue for arrays of beam positions."""
+    x = beam_x.astype(np.uint32)
+    y = beam_y.astype(np.uint32)
+    A = np.where(((x >> 5) & 7 == 0b010) & ((y >> 5) & 7 == 0b010), 0xff, 0)
+    W = np.where((x & 0xff) == (y & 0xff), 0xff, 0)
+    Z = np.where((y >> 3) & 3 == ~(x >> 3) & 3, 0x3f, 0)
+    T = np.where((y >> 6) & 1, 0xff, 0)
+    # Cat(0b00, ...) in VGATestPattern is a one bit constant
+    r = (((x & 0x3f & Z) << 1) | W) & ~A
+    g = ((x & 0xff & T) | W) & ~A
+    b = (x & 0xff) | W | A
+    return tuple((c & 0xff).astype(np.uint8) for c in (r, g, b))
+
+
+def model_frame(timing: VGATiming, pattern=test_pattern) -> Frame:
+    """VGADriver's outputs over a frame, fed by `pattern` as VGATestPattern is."""
+    frame_x, frame_y = frame_size(timing)
+    beam_y, beam_x = np.indices((frame_y, frame_x))
+    h_end = lambda length: beam_x == length - 1
+    v_end = lambda length: beam_y == length - 1
+    t = timing
+
+    hblank_on = h_end(t.x)
+    hblank_off = h_end(frame_x)
+    hsync_on = h_end(t.x + t.h_front_porch)
+    hsync_off = h_end(t.x + t.h_front_porch + t.h_sync_pulse)
+    vblank_on = v_end(t.y)
+    vblank_off = v_end(frame_y)
+    vsync_on = v_end(t.y + t.v_front_porch)
+    vsync_off = v_end(t.y + t.v_front_porch + t.v_sync_pulse)
+
+    vblank = _hold(vblank_on | vblank_off, vblank_on)
+    vdisp = ~vblank
+    blank_early = _hold(hblank_on | hblank_off, hblank_on | vblank)
+    disp_early = _hold(hblank_on | hblank_off, ~hblank_on & vdisp)
+    blank = _delay(blank_early)
+
+    r, g, b = (np.where(blank, 0, c).astype(np.uint8) for c in pattern(beam_x, beam_y))
+    return Frame(
+        r=_delay(r), g=_delay(g), b=_delay(b),
+        hsync=_hold(hsync_on | hsync_off, hsync_on),
+        vsync=_hold(vsync_on | vsync_off, vsync_on),
+        blank=blank,
+        de=_delay(disp_early),
+        fetch_next=_delay(disp_early))
+
+
+def capture_frame(timing: VGATiming, driver=VGADriver, frame=1) -> Frame:
+    """Simulate `driver` with VGATestPattern and record frame number `frame`, counting from 0."""
+    frame_x, frame_y = frame_size(timing)
+    m = Module()
+    m.domains.pixel = ClockDomain("pixel")
+    m.submodules.vga = vga = driver(timing, bits_x=16, bits_y=16)
+    m.submodules.pattern = VGATestPattern(vga)
+    m.d.comb += vga.i_clk_en.eq(1)
+
+    outputs = dict(r=vga.o_vga_r, g=vga.o_vga_g, b=vga.o_vga_b, hsync=vga.o_vga_hsync,
+                   vsync=vga.o_vga_vsync, blank=vga.o_vga_blank, de=vga.o_vga_de,
+                   fetch_next=vga.o_fetch_next)
+    arrays = {name: np.zeros((frame_y, frame_x), np.uint8 if len(signal) > 1 else bool)
+              for name, signal in outputs.items()}
+
+    def process():
+        for _ in range(frame * frame_x * frame_y):
+            yield
+        for _ in range(frame_x * frame_y):
+            x = yield vga.o_beam_x
+            y = yield vga.o_beam_y
+            for name, signal in outputs.items():
+                arrays[name][y, x] = yield signal
+            yield
+
+    sim = Simulator(m)
+    sim.add_clock(1 / timing.pixel_freq, domain="pixel")
+    sim.add_sync_process(process, domain="pixel")
+    sim.run()
+    return Frame(**arrays)
+
+
+def diff_frames(expected: Frame, actual: Frame) -> Dict[str, Optional[tuple]]:
+    """Per signal, the number of mismatched cycles and the (y, x) of the first, or None if equal."""
+    result = {}
+    for name in SIGNALS:
+        mismatch = getattr(expected, name) != getattr(actual, name)
+        if mismatch.any():
+            first = tuple(int(i) for i in np.argwhere(mismatch)[0])
+            result[name] = (int(mismatch.sum()), first)
+        else:
+            result[name] = None
+    return result
+
+
+def write_ppm(f, image: np.ndarray):
+    """Write a (y, x, 3) uint8 image as a binary PPM, viewable without extra packages."""
+    height, width, _ = image.shape
+    f.write("P6\n{} {}\n255\n".format(width, height).encode("ascii"))
+    f.write(np.ascontiguousarray(image, np.uint8).tobytes())
+
+
+def main():
+    drivers = {"VGADriver": VGADriver, "PipelinedVGADriver": PipelinedVGADriver}
+    parser = argparse.ArgumentParser(description="Check VGADriver and VGATestPattern against the golden model")
+    parser.add_argument("--mode", choices=list(vga_timings),
+                        help="timing to simulate (default: a 64x48 test timing)")
+    parser.add_argument("--driver", choices=list(drivers), default="VGADriver")
+    parser.add_argument("--model-image", help="write the model's picture to this PPM file")
+    parser.add_argument("--sim-image", help="write the simulated picture to this PPM file")
+    args = parser.parse_args()
+    timing = TINY if args.mode is None else vga_timings[args.mode]
+
+    start = time.perf_counter()
+    expected = model_frame(timing)
+    model_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = capture_frame(timing, drivers[args.driver])
+    sim_seconds = time.perf_counter() - start
+    print("model {:.3f}s, simulation {:.1f}s".format(model_seconds, sim_seconds), file=sys.stderr)
+
+    for path, frame in [(args.model_image, expected), (args.sim_image, actual)]:
+        if path:
+            with open(path, "wb") as f:
+                write_ppm(f, frame.image())
+
+    diff = diff_frames(expected, actual)
+    for name, mismatch in diff.items():
+        if mismatch is None:
+            print("{:<10} ok".format(name))
+        else:
+            print("{:<10} {} cycles differ, first at y={} x={}".format(name, mismatch[0], *mismatch[1]))
+    sys.exit(0 if all(mismatch is None for mismatch in diff.values()) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+from amaranth import *
+from IceLogicDeck import *
+from HDL.Amaranth_Examples.Bus.qspimem import QspiMem
+from HDL.Amaranth_Examples.Bus.interconnect import QspiInterconnect
+from HDL.Amaranth_Examples.Bus.counters import PerfCounters
+from HDL.Amaranth_Examples.Bus.client import QspiClient
+from HDL.Amaranth_Examples.Tiles.AAVC_tile import tile_resources
+from HDL.Amaranth_Examples.Tiles.vga import VGADriver, VGATiming, vga_timings
+from HDL.Amaranth_Examples.Tiles.framebuffer import Framebuffer, rgb332, pack
+from HDL.Amaranth_Examples.Tiles.blitter import Blitter
+from HDL.Amaranth_Examples.Tiles.sprites import SpriteLayer
+from HDL.Amaranth_Examples.Tiles.pll import DualPLL
+
+
+TILE = 1
+
+
+# Shows an image sent over QSPI on the AV tile, by default 128x96 pixels
+# of 4 bpp scaled by 5 to fill 640x480, with two 16x16 sprites over it.
+# The framebuffer and its palette are at 0x00000, the sprites at 0x10000,
+# the blitter at 0x18000 and a performance counter of FIFO underruns at
+# 0x20000.
+# The sync clock runs at twice the pixel clock, from the same PLL.
+class FramebufferExample(Elaboratable):
+    def __init__(self, timing: VGATiming, width=128, height=96, bpp=4, scale=5):
+        self.timing = timing
+        self.width = width
+        self.height = height
+        self.bpp = bpp
+        self.scale = scale
+
+    def elaborate(self, platform):
+        m = Module()
+        clk_in = platform.request(platform.default_clk, dir='-')[0]
+        pixel_mhz = self.timing.pixel_freq / 1000000
+        m.submodules.pll = pll = DualPLL(freq_in_mhz=platform.default_clk_frequency / 1000000,
+                                         freq_a_mhz=2 * pixel_mhz,
+                                         freq_b_mhz=pixel_mhz)
+        m.domains.sync = cd_sync = pll.domain_a
+        m.domains.pixel = cd_pixel = pll.domain_b
+        m.d.comb += pll.clk_pin.eq(clk_in)
+        platform.add_clock_constraint(cd_sync.clk, pll.result.f_out_a * 1000000)
+        platform.add_clock_constraint(cd_pixel.clk, pll.result.f_out_b * 1000000)
+
+        # QSPI bus
+        m.submodules.qspimem = qspimem = QspiMem()
+        qd = [platform.request("qd{}".format(i)) for i in range(4)]
+        qdr = platform.request("qdr_o")
+        m.d.comb += [
+            qspimem.qss.eq(platform.request("qss").i),
+            qspimem.qck.eq(platform.request("qck").i),
+            qspimem.qd_i.eq(Cat(pin.i for pin in qd)),
+            qdr.eq(qspimem.qdr),
+        ]
+        for i, pin in enumerate(qd):
+            m.d.comb += [
+                pin.o.eq(qspimem.qd_o[i]),
+                pin.oe.eq(qspimem.qd_oe[i]),
+            ]
+
+        m.submodules.vga = vga = VGADriver(self.timing, bits_x=16, bits_y=16)
+        m.d.comb += vga.i_clk_en.eq(1)
+        m.submodules.fb = fb = Framebuffer(vga, self.width, self.height, bpp=self.bpp,
+                                           scale_x=self.scale, scale_y=self.scale, name="fb")
+        m.submodules.blitter = blitter = Blitter(fb, name="blitter")
+        m.submodules.sprites = sprites = SpriteLayer(vga, fb, count=2, name="sprites")
+        # For the host, once built
+        self.palette_base = fb.palette_base
+        self.sprite_regs = sprites.regs_base
+        m.submodules.perf = perf = PerfCounters(max_counters=3, name="perf")
+        m.d.comb += perf.counter("underruns", domain="pixel").eq(fb.underrun)
+
+        m.submodules.bus = bus = QspiInterconnect()
+        bus.add(fb.bus, 0x00000)
+        bus.add(sprites.bus, 0x10000)
+        bus.add(blitter.bus, 0x18000)
+        bus.add(perf.bus, 0x20000)
+        m.d.comb += bus.connect(qspimem)
+
+        av_tile = platform.request("av_tile")
+        m.d.comb += [
+            av_tile.red.eq(vga.o_vga_r[5:]),
+            av_tile.green.eq(vga.o_vga_g[5:]),
+            av_tile.blue.eq(vga.o_vga_b[6:]),
+            av_tile.hs.eq(vga.o_vga_hsync),
+            av_tile.vs.eq(vga.o_vga_vsync),
+        ]
+
+        return m
+
+
+# Colour bars, with a palette of 16 hues and greys
+PALETTE = [rgb332(r, g, b) for r, g, b in [
+    (0, 0, 0), (0, 0, 255), (0, 255, 0), (0, 255, 255),
+    (255, 0, 0), (255, 0, 255), (255, 255, 0), (255, 255, 255),
+    (64, 64, 64), (0, 0, 128), (0, 128, 0), (0, 128, 128),
+    (128, 0, 0), (128, 0, 128), (128, 128, 0), (160, 160, 160)]]
+
+
+def colour_bars(width, height, bpp) -> bytes:
+    colours = 1 << bpp
+    return pack([(x * colours // width + y * colours // height) % colours
+                  for y in range(height) for x in range(width)], bpp)
+
+
+if __name__ == "__main__":
+    platform = IceLogicDeckPlatform()
+    platform.add_resources(tile_resources(TILE))
+    example = FramebufferExample(timing=vga_timings['640x480@60Hz'])
+    platform.build(example, do_program=True)
+    with QspiClient() as bus, bus.batch() as batch:
+        batch.write(example.palette_base, bytes(PALETTE[:1 << example.bpp]))
+        batch.write(0x00000, colour_bars(example.width, example.height, example.bpp))
+        # A ball as sprite 0 at (100, 100), magenta being transparent
+        ball = bytes(0xff if (x - 7.5) ** 2 + (y - 7.5) ** 2 < 56 else 0xe3
+                     for y in range(16) for x in range(16))
+        batch.write(0x10000, ball)
+        batch.write(0x10000 + example.sprite_regs, bytes([0, 100, 0, 100, 1]))
@@ -0,0 +1,87 @@
+from amaranth import *
+from IceLogicDeck import *
+from HDL.Amaranth_Examples.Bus.qspimem import QspiMem
+from HDL.Amaranth_Examples.Bus.interconnect import QspiInterconnect
+from HDL.Amaranth_Examples.Bus.counters import PerfCounters
+from HDL.Amaranth_Examples.Bus.client import QspiClient
+from HDL.Amaranth_Examples.Tiles.AAVC_tile import tile_resources
+from HDL.Amaranth_Examples.Tiles.vga import VGADriver, VGATiming, vga_timings
+from HDL.Amaranth_Examples.Tiles.text import TextMode, cells
+from HDL.Amaranth_Examples.Tiles.pll import DualPLL
+
+
+TILE = 1
+
+
+# A text display on the AV tile, written over QSPI: 80x30 cells of 8x16
+# pixels at 640x480. The cells and palette are at 0x00000 and a
+# performance counter of FIFO underruns at 0x20000.
+class TextExample(Elaboratable):
+    def __init__(self, timing: VGATiming, scale_y=2):
+        self.timing = timing
+        self.scale_y = scale_y
+
+    def elaborate(self, platform):
+        m = Module()
+        clk_in = platform.request(platform.default_clk, dir='-')[0]
+        # The text is rendered in the pixel domain; sync only runs the bus
+        pixel_mhz = self.timing.pixel_freq / 1000000
+        m.submodules.pll = pll = DualPLL(freq_in_mhz=platform.default_clk_frequency / 1000000,
+                                         freq_a_mhz=2 * pixel_mhz,
+                                         freq_b_mhz=pixel_mhz)
+        m.domains.sync = cd_sync = pll.domain_a
+        m.domains.pixel = cd_pixel = pll.domain_b
+        m.d.comb += pll.clk_pin.eq(clk_in)
+        platform.add_clock_constraint(cd_sync.clk, pll.result.f_out_a * 1000000)
+        platform.add_clock_constraint(cd_pixel.clk, pll.result.f_out_b * 1000000)
+
+        # QSPI bus
+        m.submodules.qspimem = qspimem = QspiMem()
+        qd = [platform.request("qd{}".format(i)) for i in range(4)]
+        qdr = platform.request("qdr_o")
+        m.d.comb += [
+            qspimem.qss.eq(platform.request("qss").i),
+            qspimem.qck.eq(platform.request("qck").i),
+            qspimem.qd_i.eq(Cat(pin.i for pin in qd)),
+            qdr.eq(qspimem.qdr),
+        ]
+        for i, pin in enumerate(qd):
+            m.d.comb += [
+                pin.o.eq(qspimem.qd_o[i]),
+                pin.oe.eq(qspimem.qd_oe[i]),
+            ]
+
+        m.submodules.vga = vga = VGADriver(self.timing, bits_x=16, bits_y=16)
+        m.d.comb += vga.i_clk_en.eq(1)
+        m.submodules.text = text = TextMode(vga, scale_y=self.scale_y, name="text")
+        # For the host, once built
+        self.columns = text.columns
+        m.submodules.perf = perf = PerfCounters(max_counters=3, name="perf")
+        m.d.comb += perf.counter("underruns", domain="pixel").eq(text.underrun)
+
+        m.submodules.bus = bus = QspiInterconnect()
+        bus.add(text.bus, 0x00000)
+        bus.add(perf.bus, 0x20000)
+        m.d.comb += bus.connect(qspimem)
+
+        av_tile = platform.request("av_tile")
+        m.d.comb += [
+            av_tile.red.eq(vga.o_vga_r[5:]),
+            av_tile.green.eq(vga.o_vga_g[5:]),
+            av_tile.blue.eq(vga.o_vga_b[6:]),
+            av_tile.hs.eq(vga.o_vga_hsync),
+            av_tile.vs.eq(vga.o_vga_vsync),
+        ]
+
+        return m
+
+
+if __name__ == "__main__":
+    platform = IceLogicDeckPlatform()
+    platform.add_resources(tile_resources(TILE))
+    example = TextExample(timing=vga_timings['640x480@60Hz'])
+    platform.build(example, do_program=True)
+    with QspiClient() as bus, bus.batch() as batch:
+        batch.write(0x00000, cells("IceLogicDeck text mode", fg=15, bg=1))
+        # One character, with bit 7 set to show it inverted as a cursor
+        batch.write(2 * (2 * example.columns), bytes([ord("_") | 0x80, 0x07]))
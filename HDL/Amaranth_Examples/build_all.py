@@ -0,0 +1,166 @@
+import argparse
+import glob
+import importlib
+import inspect
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional
+
+from amaranth import Elaboratable
+from amaranth.build import Platform, Resource
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# qbus.py imports its tiles as HDL.Amaranth_Examples.Tiles
+sys.path.insert(0, os.path.dirname(os.path.dirname(HERE)))
+sys.path.insert(0, HERE)
+
+from Toolchain.nextpnr import parse_fmax, parse_utilisation
+from Toolchain.yosys import parse_cells
+from Tiles.vga import vga_timings
+
+# Constructor arguments for examples that need them
+EXAMPLE_ARGS = {
+    "AVExample": dict(timing=vga_timings["1024x768@60Hz"]),
+    "FramebufferExample": dict(timing=vga_timings["640x480@60Hz"]),
+    "TextExample": dict(timing=vga_timings["640x480@60Hz"]),
+}
+
+# Modules in this directory that are not examples
+NOT_EXAMPLES = {"IceLogicDeck", "build_all", "vga_fmax", "regress", "__init__"}
+
+
+class Example(NamedTuple):
+    module: str
+    name: str
+
+
+class BuildResult(NamedTuple):
+    example: Example
+    passed: bool
+    luts: Optional[int] = None
+    brams: Optional[int] = None
+    fmax: Dict[str, float] = {}
+    seconds: float = 0
+    error: Optional[str] = None
+
+
+def _is_top(module, cls) -> bool:
+    # Top level designs request their own pins; library modules like QspiMem
+    # that happen to live in an example file do not
+    return (issubclass(cls, Elaboratable) and cls is not Elaboratable and
+            cls.__module__ == module.__name__ and
+            "platform.request" in inspect.getsource(cls.elaborate))
+
+
+def find_examples(import_errors=None) -> List[Example]:
+    examples = []
+    for path in sorted(glob.glob(os.path.join(HERE, "*.py"))):
+        module_name = os.path.splitext(os.path.basename(path))[0]
+        if module_name in NOT_EXAMPLES:
+            continue
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            if import_errors is not None:
+                import_errors[module_name] = e
+            continue
+        for name, cls in inspect.getmembers(module, inspect.isclass):
+            if _is_top(module, cls):
+                examples.append(Example(module_name, name))
+    return examples
+
+
+def example_platform(module) -> Platform:
+    # Each example imports the platform it targets, plus its tile/pmod resources as
+    # module level lists, and selects a tile with TILE = n and tile_resources()
+    platforms = [value for value in vars(module).values()
+                 if inspect.isclass(value) and issubclass(value, Platform) and
+                 not inspect.isabstract(value)]
+    assert len(platforms) == 1, "{} imports {} platforms".format(module.__name__, len(platforms))
+    platform = platforms[0]()
+    for value in vars(module).values():
+        if isinstance(value, list) and value and all(isinstance(r, Resource) for r in value):
+            platform.add_resources(value)
+    if hasattr(module, "TILE") and hasattr(module, "tile_resources"):
+        platform.add_resources(module.tile_resources(module.TILE))
+    return platform
+
+
+def build_example(example: Example, build_root: str, args=None, build_name=None) -> BuildResult:
+    # args default to EXAMPLE_ARGS, and the build directory to the class name
+    start = time.perf_counter()
+    if args is None:
+        args = EXAMPLE_ARGS.get(example.name, {})
+    try:
+        module = importlib.import_module(example.module)
+        platform = example_platform(module)
+        design = getattr(module, example.name)(**args)
+        products = platform.build(design, build_dir=os.path.join(build_root, build_name or example.name),
+                                  do_program=False)
+        cells = parse_cells(products.get("top.rpt", "t"))
+        log = products.get("top.tim", "t")
+    except Exception as e:
+        message = str(e).strip().splitlines()
+        return BuildResult(example, False, seconds=time.perf_counter() - start,
+                           error="{}: {}".format(type(e).__name__, message[-1] if message else ""))
+    clocks = parse_fmax(log)
+    utilisation = parse_utilisation(log)
+    return BuildResult(
+        example,
+        passed=all(c.slack is None or c.slack >= 0 for c in clocks.values()),
+        luts=cells.get("SB_LUT4", 0),
+        brams=utilisation.get("ICESTORM_RAM", (cells.get("SB_RAM40_4K", 0), None))[0],
+        fmax={name: c.fmax for name, c in clocks.items()},
+        seconds=time.perf_counter() - start)
+
+
+def print_table(results: List[BuildResult]):
+    print("{:<32} {:<6} {:>6} {:>5} {:>8}  {}".format("Example", "Result", "LUTs", "BRAM", "Time", "Fmax (MHz)"))
+    for r in results:
+        name = "{}.{}".format(*r.example)
+        if r.error is not None:
+            print("{:<32} {:<6} {:>6} {:>5} {:>7.1f}s  {}".format(name, "ERROR", "-", "-", r.seconds, r.error))
+            continue
+        fmax = ", ".join("{} {:.1f}".format(clock, f) for clock, f in sorted(r.fmax.items()))
+        print("{:<32} {:<6} {:>6} {:>5} {:>7.1f}s  {}".format(
+            name, "PASS" if r.passed else "FAIL", r.luts, r.brams, r.seconds, fmax))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build every example design in parallel, without programming")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="parallel builds")
+    parser.add_argument("--build-dir", default="build", help="root of the per-example build directories")
+    parser.add_argument("--list", action="store_true", help="list the examples found and exit")
+    parser.add_argument("examples", nargs="*", help="only build these (class names)")
+    args = parser.parse_args()
+
+    import_errors = {}
+    examples = find_examples(import_errors)
+    if args.examples:
+        examples = [e for e in examples if e.name in args.examples]
+    if args.list:
+        for example in examples:
+            print("{}.{}".format(*example))
+        for module_name, e in import_errors.items():
+            print("{}: not importable ({})".format(module_name, e))
+        return
+
+    # Modules that cannot be imported (missing board or stdio packages) still get a row
+    results = [BuildResult(Example(module_name, "*"), False, error="{}: {}".format(type(e).__name__, e))
+               for module_name, e in import_errors.items() if not args.examples]
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(build_example, example, os.path.abspath(args.build_dir))
+                   for example in examples]
+        for future in as_completed(futures):
+            result = future.result()
+            print("{}.{} finished in {:.1f}s".format(*result.example, result.seconds))
+            results.append(result)
+    results.sort(key=lambda r: r.example)
+    print_table(results)
+    sys.exit(0 if all(r.error is None and r.passed for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
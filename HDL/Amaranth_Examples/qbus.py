@@ -9,6 +9,11 @@ from HDL.Amaranth_Examples.Tiles.seven_seg_tile import SevenSegController, tile_
 from amaranth.lib.cdc import FFSynchronizer
 
 from HDL.Amaranth_Examples.Tiles.pll import PLL
+from HDL.Amaranth_Examples.Bus.qspimem import QspiMem
+from HDL.Amaranth_Examples.Bus.interconnect import QspiInterconnect, MemoryTarget, CSRBank
+from HDL.Amaranth_Examples.Bus.counters import PerfCounters
+from HDL.Amaranth_Examples.Bus.analyzer import LogicAnalyzer
+from HDL.Amaranth_Examples.Bus.client import write_frame
 
 BLADE = 1
 TILE = 3
@@ -22,138 +27,6 @@ led_blade = [
              )
 ]
 
-PMOD = 5
-
-qspi_pmod = [
-    Resource("qspi_test", 0,
-             Subsignal("qss", Pins("10", dir="o", conn=("pmod", PMOD))),
-             Subsignal("qck", Pins("9", dir="o", conn=("pmod", PMOD))),
-             Subsignal("gnd", Pins("8", dir="o", conn=("pmod", PMOD))),
-             Subsignal("qd", Pins("1 2 3 4", dir="o", conn=("pmod", PMOD))),
-             Attrs(IO_STANDARD="SB_LVCMOS"))
-]
-
-class QspiMem(Elaboratable):
-    def __init__(self, addr_bits=23, data_bits=8):
-        # parameters
-        self.addr_bits    = addr_bits
-        self.data_bits    = data_bits
-        self.addr_nibbles = 4
-        self.data_nibbles = 2
-
-        # inputs
-        self.qd_i  = Signal(4)
-        self.qss   = Signal()
-        self.qck   = Signal()
-        self.din   = Signal(data_bits)
-
-        # outputs
-        self.addr  = Signal(addr_bits)
-        self.qd_o  = Signal(4)
-        self.qd_oe = Signal(4)
-        self.dout  = Signal(data_bits)
-        self.rd    = Signal()
-        self.wr    = Signal()
-
-    def elaborate(self, platform):
-        m = Module()
-
-        r_req_read     = Signal()
-        r_req_write    = Signal()
-        r_cmd          = Signal(self.data_bits)
-        r_data         = Signal(self.data_bits)
-        r_addr         = Signal(self.addr_bits)
-
-        r_nibble_count = Signal(5)
-
-        r_qd_i         = Signal(4)
-        r_qck          = Signal()
-        r_qss          = Signal()
-
-        # Ignore spurious QSPI data after programming
-        pwr_on_reset = Signal(10)
-        with m.If(~pwr_on_reset.all()):
-            m.d.sync += pwr_on_reset.eq(pwr_on_reset + 1)
-
-        new_nibble = ~r_qss & pwr_on_reset.all() & Rose(r_qck)
-
-        # Drive outputs
-        m.d.comb += [
-            self.rd.eq(r_req_read),
-            self.wr.eq(r_req_write),
-            self.dout.eq(r_data),
-            self.addr.eq(r_addr),
-        ]
-
-        # De-glitch
-        m.submodules += FFSynchronizer(self.qss, r_qss, reset=1)
-        m.submodules += FFSynchronizer(self.qck, r_qck, reset=1)
-        m.submodules += FFSynchronizer(self.qd_i, r_qd_i, reset=0)
-
-        # Reset signals when qss is high
-        with m.If(r_qss):
-            m.d.sync += [
-                r_req_read.eq(0),
-                r_req_write.eq(0),
-                r_nibble_count.eq(0),
-                self.qd_oe.eq(0),
-            ]
-        with m.Else():  # qss == 0
-            with m.If(new_nibble):
-                m.d.sync += r_nibble_count.eq(r_nibble_count + 1)
-
-        with m.FSM():
-            with m.State("COMMAND"):
-                with m.If(new_nibble):
-                    # Read in the byte with the command bit and the top 7 address bits
-                    m.d.sync += r_cmd.eq(Cat(r_qd_i, r_cmd[:-4]))
-                    with m.If(r_nibble_count == 1):
-                        m.next = "ADDRESS"
-            with m.State("ADDRESS"):
-                with m.If(new_nibble):
-                    with m.If(r_nibble_count == self.addr_nibbles+1):
-                        m.d.sync += r_addr.eq(Cat(r_qd_i, r_addr[:-11], r_cmd[:7]))
-                        with m.If(r_cmd[7]):
-                            m.d.sync += [
-                                self.qd_oe.eq(Repl(0b1, 4)),
-                                r_req_read.eq(1)
-                            ]
-                            m.next = "READ_DATA"
-                        with m.Else():
-                            m.next = "WRITE_DATA"
-                    with m.Else():
-                        m.d.sync += r_addr.eq(Cat(r_qd_i, r_addr[:-4])),
-            with m.State("WRITE_DATA"):
-                with m.If(new_nibble):
-                    # write data
-                    m.d.sync += r_data.eq(Cat(r_qd_i, r_data[:-4]))
-                    with m.If(r_nibble_count[0]):
-                        m.d.sync += [
-                            r_req_write.eq(1),
-                            r_addr.eq(r_addr + 1)
-                        ]
-                    with m.Else():
-                        m.d.sync += r_req_write.eq(0)
-                with m.If(Rose(r_qss)):
-                    m.next = "COMMAND"
-            with m.State("READ_DATA"):
-                with m.If(new_nibble):
-                    with m.If(r_nibble_count[0]):
-                        m.d.sync += [
-                            r_req_read.eq(1),
-                            r_addr.eq(r_addr + 1),
-                            self.qd_o.eq(self.din[:4])
-                        ]
-                    with m.Else():
-                        m.d.sync += [
-                            r_req_read.eq(0),
-                            self.qd_o.eq(self.din[4:]),
-                        ]
-                with m.If(Rose(r_qss)):
-                    m.next = "COMMAND"
-
-        return m
-
 
 class QbusTest(Elaboratable):
     def elaborate(self, platform):
@@ -165,13 +38,6 @@ class QbusTest(Elaboratable):
         qd_oe = qspi.data.oe
         leds6 = platform.request("leds6")
         led = platform.request("led")
-        qspi_test = platform.request("qspi_test")
-
-        rd    = Signal()
-        wr    = Signal()
-        addr  = Signal(23)
-        din   = Signal(8)
-        dout  = Signal(8)
 
         m = Module()
 
@@ -190,43 +56,35 @@ class QbusTest(Elaboratable):
         with m.If(~pwr_on_reset.all()):
             m.d.sync += pwr_on_reset.eq(pwr_on_reset + 1)
 
-        m.d.comb += [
-            qspi_test.qss.eq(qss),
-            qspi_test.qck.eq(qck),
-            qspi_test.qd.eq(qd_i),
-            qspi_test.gnd.eq(0)
-        ]
-
-        # Add QspiMem submodule
+        # Add QspiMem submodule. Without prefetch it answers reads within a
+        # nibble period, so qdr stays high and the host never waits on it:
+        # it is left unconnected
         m.submodules.qspimem = qspimem = QspiMem()
 
-        # Create memory to read and write
-        mem = Memory(width=8, depth=4 * 1024)
-        m.submodules.r = r = mem.read_port()
-        m.submodules.w = w = mem.write_port()
+        # Memory map: 4KB of BRAM at 0, registers at 0x10000, counters at 0x20000,
+        # logic analyzer at 0x30000
+        m.submodules.bus = bus = QspiInterconnect()
+        m.submodules.ram = ram = MemoryTarget(depth=4 * 1024, name="ram")
+        m.submodules.csr = csr = CSRBank(name="csr")
+        m.submodules.perf = perf = PerfCounters(name="perf")
+        bus.add(ram.bus, 0x00000)
+        bus.add(csr.bus, 0x10000)
+        bus.add(perf.bus, 0x20000)
+        display = csr.csr("display")
+        nibbles = csr.csr("nibbles", read_only=True)
 
         m.d.comb += [
             qspimem.qss.eq(qss),
             qspimem.qck.eq(qck),
             qspimem.qd_i.eq(qd_i),
-            qspimem.din.eq(din),
             qd_o.eq(qspimem.qd_o),
             qd_oe.eq(qspimem.qd_oe),
-            addr.eq(qspimem.addr),
-            dout.eq(qspimem.dout),
-            rd.eq(qspimem.rd),
-            wr.eq(qspimem.wr),
-            r.addr.eq(addr),
-            din.eq(r.data),
-            w.data.eq(dout),
-            w.addr.eq(addr),
-            w.en.eq(wr)
         ]
+        m.d.comb += bus.connect(qspimem)
 
         with m.If(qspimem.wr):
             m.d.sync += led.eq(1)
 
-        nibbles = Signal(8, reset=0)
         r_qss = Signal()
         r_qck = Signal()
         r_qd_i = Signal(4)
@@ -239,11 +97,25 @@ class QbusTest(Elaboratable):
             with m.If(Rose(r_qck)):
                 m.d.sync += nibbles.eq(nibbles + 1)
 
+        m.d.comb += [
+            perf.counter("transactions").eq(Rose(r_qss) & pwr_on_reset.all()),
+            perf.counter("words_written").eq(qspimem.wr),
+            perf.counter("words_read").eq(qspimem.word_sent),
+            perf.counter("frame_errors").eq(qspimem.frame_error),
+            perf.counter("stall_cycles").eq(qspimem.stall),
+        ]
+
         m.d.comb += leds6.eq(nibbles)
 
+        # Capture the bus itself, in place of probing it on a PMOD
+        m.submodules.la = la = LogicAnalyzer([
+            ("qss", r_qss), ("qck", r_qck), ("qd_i", r_qd_i), ("qd_o", qd_o),
+            ("qd_oe", qd_oe[0]), ("rd", qspimem.rd), ("wr", qspimem.wr)
+        ], name="la")
+        bus.add(la.bus, 0x30000)
+
         # Put Data on 7-segment display
         m.submodules.seven = seven = SevenSegController()
-        display = Signal(8)
 
         # Get pins
         seg_pins = platform.request("seven_seg_tile")
@@ -261,25 +133,22 @@ class QbusTest(Elaboratable):
             m.d.comb += seg_pins.ca[i].eq(timer[17:19] == i)
 
         with m.If(seg_pins.ca[2]):
-            m.d.comb += seven.val.eq(addr[:4])
+            m.d.comb += seven.val.eq(qspimem.addr[:4])
         with m.If(seg_pins.ca[1]):
             m.d.comb += seven.val.eq(display[-4:])
         with m.If(seg_pins.ca[0]):
             m.d.comb += seven.val.eq(display[:4])
 
-        with m.If(qspimem.wr):
-            m.d.sync += display.eq(dout)
-
         return m
 
 def synth():
     platform = IceLogicBusPlatform()
     platform.add_resources(tile_resources(TILE))
     platform.add_resources(led_blade)
-    platform.add_resources(qspi_pmod)
     platform.build(QbusTest(), do_program=True)
     print("Sending QSPI data")
-    platform.bus_send(bytearray(b'\x03\x00\x00\x00\x01\x00\x00\x00\x01\x42'))
+    # The display register of the CSR bank
+    platform.bus_send(bytearray(write_frame(0x10000, b'\x42')))
     print("Data sent")
 
 if __name__ == "__main__":
@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional
+
+from build_all import HERE, Example, build_example
+from Tiles.vga import PipelinedVGADriver, vga_timings
+
+# Builds a fixed suite of designs and appends their LUT, BRAM and Fmax
+# figures to a local database keyed by git commit, then compares them with
+# an earlier commit's and flags regressions beyond a threshold: more LUTs
+# or BRAMs, or a lower Fmax on any clock.
+#
+# The database is a JSON Lines file, one record per design per run, only
+# ever appended to, so results from every commit built stay comparable.
+
+
+class Design(NamedTuple):
+    label: str
+    example: Example
+    args: dict = {}
+
+
+SUITE = [
+    Design("Blink", Example("Blinky", "Blink")),
+    Design("SevenSegExample", Example("Seven_Segment", "SevenSegExample")),
+    *[Design("AVExample_{}".format(mode), Example("Audio_Video", "AVExample"), dict(timing=vga_timings[mode]))
+      for mode in ["640x480@60Hz", "800x600@60Hz", "1024x768@60Hz"]],
+    Design("AVExample_1280x1024@60Hz_pipelined", Example("Audio_Video", "AVExample"),
+           dict(timing=vga_timings["1280x1024@60Hz"], driver=PipelinedVGADriver)),
+    Design("Uart", Example("Uart", "Uart")),
+    Design("QbusTest", Example("qbus", "QbusTest")),
+]
+
+DEFAULT_DB = os.path.join(os.path.expanduser("~"), ".cache", "icelogicdeck", "regress.jsonl")
+
+
+class Regression(NamedTuple):
+    design: str
+    metric: str
+    baseline: float
+    value: float
+
+    def __str__(self):
+        text = "{}: {} {} -> {}".format(self.design, self.metric, self.baseline, self.value)
+        if not self.baseline:
+            # e.g. a first BRAM
+            return text
+        return "{} ({:+.1f}%)".format(text, (self.value - self.baseline) / self.baseline * 100)
+
+
+def git(*args) -> str:
+    return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True,
+                          check=True).stdout.strip()
+
+
+def git_commit() -> str:
+    """HEAD's hash, with -dirty appended if the tree has uncommitted changes."""
+    commit = git("rev-parse", "HEAD")
+    return commit + "-dirty" if git("status", "--porcelain", "--untracked-files=no") else commit
+
+
+def load(db: str) -> List[dict]:
+    records = []
+    if not os.path.exists(db):
+        return records
+    with open(db) as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def append(db: str, records: List[dict]):
+    os.makedirs(os.path.dirname(os.path.abspath(db)), exist_ok=True)
+    with open(db, "a") as f:
+        for record in records:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def latest(records: List[dict], commit: str) -> Dict[str, dict]:
+    """The last successful record of each design built at `commit`."""
+    return {r["design"]: r for r in records if r["commit"] == commit and r["error"] is None}
+
+
+def previous_commit(records: List[dict], commit: str) -> Optional[str]:
+    """
+    The nearest ancestor of `commit` with results in the database, which
+    for a -dirty commit is the commit itself. If this repository does not
+    have `commit`, the one recorded most recently before it instead.
+    """
+    recorded = {r["commit"] for r in records if r["commit"] != commit and r["error"] is None}
+    try:
+        if commit.endswith("-dirty"):
+            ancestors = git("rev-list", commit[:-len("-dirty")]).split()
+        else:
+            ancestors = git("rev-list", "--skip=1", commit).split()
+    except subprocess.CalledProcessError:
+        for record in reversed(records):
+            if record["commit"] in recorded:
+                return record["commit"]
+        return None
+    for ancestor in ancestors:
+        if ancestor in recorded:
+            return ancestor
+    return None
+
+
+def compare(baseline: Dict[str, dict], current: Dict[str, dict], threshold: float) -> List[Regression]:
+    """Regressions of more than `threshold` (a fraction) from baseline to current."""
+    regressions = []
+    for design, new in sorted(current.items()):
+        old = baseline.get(design)
+        if old is None:
+            continue
+        for metric in ["luts", "brams"]:
+            if old[metric] is not None and new[metric] is not None and \
+                    new[metric] > old[metric] * (1 + threshold):
+                regressions.append(Regression(design, metric, old[metric], new[metric]))
+        for clock, fmax in sorted(new["fmax"].items()):
+            old_fmax = old["fmax"].get(clock)
+            if old_fmax is not None and fmax < old_fmax * (1 - threshold):
+                regressions.append(Regression(design, "fmax {}".format(clock), old_fmax, fmax))
+    return regressions
+
+
+def run_suite(suite: List[Design], build_root: str, jobs: int, commit: str) -> List[dict]:
+    records = []
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(build_example, design.example, build_root, design.args, design.label): design
+                   for design in suite}
+        for future in as_completed(futures):
+            design = futures[future]
+            result = future.result()
+            print("{} finished in {:.1f}s".format(design.label, result.seconds), file=sys.stderr)
+            records.append(dict(
+                commit=commit,
+                time=time.time(),
+                design=design.label,
+                luts=result.luts,
+                brams=result.brams,
+                fmax=result.fmax,
+                passed=result.passed,
+                seconds=round(result.seconds, 1),
+                error=result.error,
+            ))
+    order = [design.label for design in suite]
+    return sorted(records, key=lambda record: order.index(record["design"]))
+
+
+def print_table(records: List[dict], baseline: Dict[str, dict]):
+    # Changes from the baseline in brackets
+    print("{:<36} {:>13} {:>5}  {}".format("Design", "LUTs", "BRAM", "Fmax (MHz)"))
+    for r in records:
+        if r["error"] is not None:
+            print("{:<36} {:>13} {:>5}  ERROR {}".format(r["design"], "-", "-", r["error"]))
+            continue
+        old = baseline.get(r["design"])
+        if r["luts"] is None:
+            luts = "-"
+        elif old is None or old["luts"] is None:
+            luts = str(r["luts"])
+        else:
+            luts = "{} ({:+d})".format(r["luts"], r["luts"] - old["luts"])
+        fmax = []
+        for clock, f in sorted(r["fmax"].items()):
+            old_fmax = None if old is None else old["fmax"].get(clock)
+            change = "" if old_fmax is None else " ({:+.1f})".format(f - old_fmax)
+            fmax.append("{} {:.1f}{}".format(clock, f, change))
+        print("{:<36} {:>13} {:>5}  {}".format(r["design"], luts, r["brams"], ", ".join(fmax)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track resources and Fmax of a fixed design suite across commits")
+    parser.add_argument("--db", default=DEFAULT_DB, help="JSON Lines database, appended to")
+    parser.add_argument("--threshold", type=float, default=2.0,
+                        help="percentage change flagged as a regression")
+    parser.add_argument("--baseline", help="commit to compare with (default: the nearest ancestor in the database)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="build the suite at the current commit, record and compare")
+    run.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    run.add_argument("--build-dir", default="build/regress")
+    run.add_argument("designs", nargs="*", help="only these (labels)")
+    show = sub.add_parser("compare", help="compare recorded results without building")
+    show.add_argument("commit", nargs="?", help="default: the newest commit in the database")
+    sub.add_parser("list", help="list the suite")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        for design in SUITE:
+            print(design.label)
+        return
+
+    records = load(args.db)
+    if args.cmd == "run":
+        suite = [design for design in SUITE if not args.designs or design.label in args.designs]
+        commit = git_commit()
+        new = run_suite(suite, os.path.abspath(args.build_dir), args.jobs, commit)
+        append(args.db, new)
+        records += new
+    else:
+        commit = args.commit or (records[-1]["commit"] if records else None)
+        if commit is None:
+            parser.error("the database is empty")
+        matches = {r["commit"] for r in records if r["commit"].startswith(commit)}
+        if len(matches) != 1:
+            parser.error("{} matches {} commits in the database".format(commit, len(matches)))
+        commit = matches.pop()
+        # The last run of each design at that commit
+        new = {r["design"]: r for r in records if r["commit"] == commit}
+        new = [new[design.label] for design in SUITE if design.label in new]
+
+    baseline_commit = args.baseline or previous_commit(records, commit)
+    baseline = {}
+    if baseline_commit is not None:
+        baseline_commits = {r["commit"] for r in records if r["commit"].startswith(baseline_commit)}
+        if len(baseline_commits) != 1:
+            parser.error("{} matches {} commits in the database".format(baseline_commit, len(baseline_commits)))
+        baseline_commit = baseline_commits.pop()
+        baseline = latest(records, baseline_commit)
+        print("Comparing {} with {}".format(commit[:12], baseline_commit[:12]))
+    print_table(new, baseline)
+
+    regressions = compare(baseline, latest(records, commit), args.threshold / 100)
+    for regression in regressions:
+        print("REGRESSION", regression)
+    sys.exit(1 if regressions or any(r["error"] is not None for r in new) else 0)
+
+
+if __name__ == "__main__":
+    main()
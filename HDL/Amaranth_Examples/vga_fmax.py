@@ -0,0 +1,100 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, NamedTuple, Optional
+
+from build_all import example_platform
+from Toolchain.nextpnr import parse_fmax
+from Tiles.vga import VGADriver, PipelinedVGADriver, vga_timings
+import Audio_Video
+
+# Builds AVExample, the test pattern on the AV tile, with each VGA timing
+# generator for each mode in vga_timings, and reports the Fmax nextpnr
+# finds for the pixel clock against the frequency the mode needs.
+DRIVERS = {
+    "VGADriver": VGADriver,
+    "PipelinedVGADriver": PipelinedVGADriver,
+}
+
+
+class FmaxResult(NamedTuple):
+    mode: str
+    driver: str
+    pixel_mhz: float
+    fmax: Optional[float] = None
+    seconds: float = 0
+    error: Optional[str] = None
+
+    @property
+    def passed(self) -> bool:
+        return self.fmax is not None and self.fmax >= self.pixel_mhz
+
+
+def build_mode(mode: str, driver: str, build_root: str) -> FmaxResult:
+    start = time.perf_counter()
+    timing = vga_timings[mode]
+    pixel_mhz = timing.pixel_freq / 1000000
+    try:
+        platform = example_platform(Audio_Video)
+        design = Audio_Video.AVExample(timing=timing, driver=DRIVERS[driver])
+        products = platform.build(design, build_dir=os.path.join(build_root, driver, mode),
+                                  do_program=False)
+        clocks = parse_fmax(products.get("top.tim", "t"))
+    except Exception as e:
+        message = str(e).strip().splitlines()
+        return FmaxResult(mode, driver, pixel_mhz, seconds=time.perf_counter() - start,
+                          error="{}: {}".format(type(e).__name__, message[-1] if message else ""))
+    # nextpnr names the clock after the net, which for the PLL output includes the domain
+    pixel = [c.fmax for name, c in clocks.items() if "pixel" in name]
+    return FmaxResult(mode, driver, pixel_mhz, fmax=min(pixel) if pixel else None,
+                      seconds=time.perf_counter() - start,
+                      error=None if pixel else "no pixel clock in the timing report")
+
+
+def print_table(results: List[FmaxResult]):
+    print("{:<20} {:<20} {:>9} {:>9}  {}".format("Mode", "Driver", "Need MHz", "Fmax MHz", "Result"))
+    for r in results:
+        if r.error is not None:
+            print("{:<20} {:<20} {:>9.2f} {:>9}  ERROR {}".format(r.mode, r.driver, r.pixel_mhz, "-", r.error))
+            continue
+        print("{:<20} {:<20} {:>9.2f} {:>9.2f}  {}".format(
+            r.mode, r.driver, r.pixel_mhz, r.fmax, "PASS" if r.passed else "FAIL"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Fmax of the VGA timing generators for each mode")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="parallel builds")
+    parser.add_argument("--build-dir", default="build/vga_fmax", help="root of the per-mode build directories")
+    parser.add_argument("--driver", action="append", choices=sorted(DRIVERS),
+                        help="only benchmark this generator (repeatable)")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("modes", nargs="*", help="only these modes, e.g. 1280x1024@60Hz")
+    args = parser.parse_args()
+
+    modes = args.modes or list(vga_timings)
+    unknown = [mode for mode in modes if mode not in vga_timings]
+    if unknown:
+        parser.error("unknown modes: {}".format(", ".join(unknown)))
+    drivers = args.driver or list(DRIVERS)
+
+    results = []
+    with ProcessPoolExecutor(args.jobs) as pool:
+        futures = [pool.submit(build_mode, mode, driver, os.path.abspath(args.build_dir))
+                   for mode in modes for driver in drivers]
+        for future in as_completed(futures):
+            result = future.result()
+            print("{} {} finished in {:.1f}s".format(result.mode, result.driver, result.seconds))
+            results.append(result)
+    order = {mode: i for i, mode in enumerate(vga_timings)}
+    results.sort(key=lambda r: (order[r.mode], drivers.index(r.driver)))
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump([dict(r._asdict(), passed=r.passed) for r in results], f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
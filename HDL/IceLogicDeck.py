@@ -1,10 +1,20 @@
+import contextlib
+import copy
 import os
-import subprocess
 
 from amaranth.build import *
 from amaranth_boards.resources import *
 from amaranth.vendor.lattice_ice40 import LatticeICE40Platform
 
+from amaranth.build.run import LocalBuildProducts
+from amaranth._toolchain import require_tool
+
+from Toolchain.cache import BuildCache
+from Toolchain.multiboot import MAX_IMAGES, pack_images
+from Toolchain.nextpnr import build_seeds, load_seed_results
+from Toolchain.profile import BuildProfiler
+from Toolchain.program import ProgramState, expand_devices, program_all, print_progress
+
 __all__ = ["IceLogicDeckPlatform"]
 
 # Pinout definitions
@@ -50,6 +60,8 @@ class IceLogicDeckPlatform(LatticeICE40Platform):
         Resource("qck", 0, Pins("H9", dir="i"), Attrs(IO_STANDARD="SB_LVCMOS")),
         Resource("qss", 0, Pins("L7", dir="i"), Attrs(IO_STANDARD="SB_LVCMOS")),
         Resource("qdr", 0, Pins("J7", dir="i"), Attrs(IO_STANDARD="SB_LVCMOS")),
+        # The same pin for designs that drive qdr to pace the host
+        Resource("qdr_o", 0, Pins("J7", dir="o"), Attrs(IO_STANDARD="SB_LVCMOS")),
         # Uart
         UARTResource(0,
                      rx="J2", tx="K2",
@@ -74,11 +86,131 @@ class IceLogicDeckPlatform(LatticeICE40Platform):
         Connector("mez", 1, MEZZB),  #
     ]
 
-    def toolchain_program(self, products, name, **kwargs):
-        device = os.environ.get("DEVICE", "/dev/ttyACM1")
-        print("Programming ", device)
-        with products.extract("{}.bin".format(name)) as bitstream_filename:
-            subprocess.check_call(["cp", bitstream_filename, device])
+    def build(self, elaboratable, name="top",
+              build_dir="build", do_build=True,
+              program_opts=None, do_program=False,
+              cache=None, seeds=None, seed_jobs=None, stop_on_pass=False, profile=None,
+              **kwargs):
+        # cache=None uses the default bitstream cache (see BUILD_CACHE), cache=False disables it.
+        # seeds=N (or a list of seeds) places and routes with every seed in parallel and keeps
+        # the best result; stop_on_pass=True keeps the first one that meets timing instead.
+        # profile=True (or BUILD_PROFILE=1) times each phase and writes a report (see
+        # BuildProfiler) to build_dir/name.profile.json, or to profile if it is a path.
+        if cache is None:
+            cache = BuildCache.from_env()
+        if isinstance(seeds, int):
+            seeds = range(1, seeds + 1)
+        seeds = list(seeds) if seeds else None
+        if profile is None:
+            profile = os.environ.get("BUILD_PROFILE", "") not in ("", "0", "off", "no")
+        profiler = BuildProfiler() if profile else None
+        if not cache and not seeds and not profiler:
+            return super().build(elaboratable, name, build_dir, do_build,
+                                 program_opts, do_program, **kwargs)
+        if do_build:
+            self.require_tools()
+
+        phase = profiler.phase if profiler else lambda phase_name: contextlib.nullcontext()
+        with phase("elaborate"):
+            plan = self.prepare(elaboratable, name, **kwargs)
+        if not do_build:
+            return plan
+
+        products = None
+        if cache:
+            with phase("cache_lookup"):
+                # A first passing seed and the best of a full sweep differ
+                key = cache.key(self, plan, seeds=seeds, stop_on_pass=stop_on_pass if seeds else None)
+                products = cache.lookup(key)
+            if products is not None:
+                print("Using cached bitstream", key[:16])
+                if seeds:
+                    self.seed_results = load_seed_results(products.get("{}.seeds.json".format(name), "t"),
+                                                          cache.path(key))
+                if profiler:
+                    profiler.cached = True
+        if products is None:
+            if seeds:
+                plan.execute_local(build_dir, run_script=False)
+                run_seeds = profiler.run_seeds if profiler else build_seeds
+                self.seed_results = run_seeds(build_dir, name, seeds, seed_jobs, stop_on_pass)[1]
+                products = LocalBuildProducts(os.path.abspath(build_dir))
+            elif profiler:
+                plan.execute_local(build_dir, run_script=False)
+                profiler.run_tools(build_dir, name)
+                products = LocalBuildProducts(os.path.abspath(build_dir))
+            else:
+                products = plan.execute_local(build_dir)
+            if cache:
+                products = cache.store(key, build_dir, name)
+        if do_program:
+            with phase("program"):
+                self.toolchain_program(products, name, **(program_opts or {}))
+        if profiler:
+            path = profile if isinstance(profile, str) else os.path.join(build_dir, "{}.profile.json".format(name))
+            self.build_profile = profiler.write(path, products, name)
+        if not do_program:
+            return products
+
+    def require_tools(self):
+        # The check Platform.build makes before building, so a missing yosys or
+        # nextpnr is reported by name rather than as a failing build script
+        if (self._deprecated_toolchain_env_var not in os.environ and
+                self._toolchain_env_var not in os.environ):
+            for tool in self.required_tools:
+                require_tool(tool)
+
+    def build_multiboot(self, designs, name="multiboot", build_dir="build", power_on=0,
+                        program_opts=None, do_program=False, align_bits=0, image_name="top", **kwargs):
+        # Builds up to four designs, each with a fresh copy of this platform, and packs
+        # them into one multi-image bitstream, build_dir/name.bin, which boots image
+        # `power_on`. Each design is built as image_name in build_dir/imageN. Designs
+        # switch between images with an SB_WARMBOOT, e.g. by wrapping each in a
+        # WarmbootImage. kwargs (cache, seeds...) go to build().
+        #
+        # SB_WARMBOOT reloads from the configuration flash, so the packed image has to
+        # be written there. In development mode the deck loads whatever is sent over
+        # USB CDC into configuration RAM, where the power on image runs but switching
+        # images fails; before do_program, press the mode button for advanced mode and
+        # select its flash sub-command, so the deck writes the image to flash instead.
+        assert 1 <= len(designs) <= MAX_IMAGES, "1 to {} designs".format(MAX_IMAGES)
+        images = []
+        for i, design in enumerate(designs):
+            products = copy.deepcopy(self).build(design, image_name,
+                                                 build_dir=os.path.join(build_dir, "image{}".format(i)), **kwargs)
+            images.append(products.get("{}.bin".format(image_name)))
+        os.makedirs(build_dir, exist_ok=True)
+        with open(os.path.join(build_dir, "{}.bin".format(name)), "wb") as f:
+            f.write(pack_images(images, power_on, align_bits))
+        products = LocalBuildProducts(os.path.abspath(build_dir))
+        if not do_program:
+            return products
+
+        print("Writing {} images to flash: the deck must be in advanced mode, flash sub-command"
+              .format(len(designs)))
+        # The state records what was last loaded, not what is in flash, so never skip
+        self.toolchain_program(products, name, **{"force": True, **(program_opts or {})})
+
+    def toolchain_program(self, products, name, device=None, force=False, jobs=None, retries=2, **kwargs):
+        # `device` (default: DEVICE, or /dev/ttyACM1) may list several decks, or
+        # glob them, e.g. DEVICE="/dev/ttyACM*", to program them all at once.
+        # Skips a device if it was last programmed with the same image (see
+        # ProgramState); force=True or PROGRAM_FORCE=1 programs it regardless
+        if device is None:
+            device = os.environ.get("DEVICE", "/dev/ttyACM1")
+        devices = expand_devices(device)
+        if not devices:
+            raise RuntimeError("no devices match {!r}".format(device))
+        force = force or os.environ.get("PROGRAM_FORCE", "") not in ("", "0", "off", "no")
+        print("Programming", ", ".join(devices))
+        results = program_all(devices, products.get("{}.bin".format(name)), ProgramState.from_env(), force,
+                              jobs, retries, progress=print_progress if len(devices) == 1 else None, **kwargs)
+        for result in results:
+            print(result)
+        failed = [result.device for result in results if result.error is not None]
+        if failed:
+            raise RuntimeError("programming failed for {}".format(", ".join(failed)))
+        return results
 
 
 if __name__ == "__main__":
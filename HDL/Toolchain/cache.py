@@ -0,0 +1,206 @@
+import argparse
+import functools
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from typing import List, NamedTuple, Optional
+
+from amaranth.build.run import LocalBuildProducts
+
+__all__ = ["BuildCache", "CacheEntry", "tool_version"]
+
+# Build products kept for each cached design, relative to the build directory
+PRODUCTS = ["{name}.bin", "{name}.rpt", "{name}.tim", "{name}.seeds.json"]
+
+# Arguments that make each tool print its version and exit
+VERSION_ARGS = {
+    "yosys": ["-V"],
+    "nextpnr-ice40": ["--version"],
+}
+
+
+class CacheEntry(NamedTuple):
+    key: str
+    name: str
+    size: int
+    created: float
+    last_used: float
+
+
+@functools.lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    # Honour the same environment overrides as the generated build script,
+    # e.g. NEXTPNR_ICE40=/opt/oss-cad-suite/bin/nextpnr-ice40
+    path = os.environ.get(tool.upper().replace("-", "_"), tool)
+    args = VERSION_ARGS.get(tool)
+    if args is not None:
+        try:
+            return subprocess.run([path, *args], capture_output=True, text=True).stdout.strip()
+        except OSError:
+            pass
+    # Tools without a version flag (icepack) are identified by their binary
+    resolved = shutil.which(path)
+    if resolved is None:
+        return "missing"
+    stat = os.stat(resolved)
+    return "{}:{}:{}".format(resolved, stat.st_size, int(stat.st_mtime))
+
+
+class BuildCache:
+    """
+    Content-addressed store of bitstreams.
+
+    Entries are keyed by a hash of every file in the build plan (the
+    elaborated RTLIL, the generated PCF and the yosys/nextpnr scripts),
+    the target device and package, and the versions of the tools that
+    would run. A hit means synthesis and place and route would produce
+    the same bitstream, so the cached products are returned instead.
+
+    The store is bounded to `max_bytes`; least recently used entries are
+    evicted first.
+    """
+
+    def __init__(self, root=None, max_bytes=256 * 1024 * 1024):
+        if root is None:
+            root = os.path.join(os.path.expanduser("~"), ".cache", "icelogicdeck")
+        self.root = root
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_env(cls) -> Optional["BuildCache"]:
+        # BUILD_CACHE=off disables caching, any other value is the cache directory
+        root = os.environ.get("BUILD_CACHE")
+        if root is not None and root.lower() in ("", "0", "off", "no"):
+            return None
+        return cls(root)
+
+    def key(self, platform, plan, **options) -> str:
+        # `options` covers build settings that change the result without
+        # appearing in the plan, such as the nextpnr seeds tried
+        hasher = hashlib.sha256()
+        hasher.update(plan.digest())
+        hasher.update("{} {}".format(platform.device, platform.package).encode("utf-8"))
+        for tool in platform.required_tools:
+            hasher.update(tool_version(tool).encode("utf-8"))
+        for option, value in sorted(options.items()):
+            if value is not None:
+                hasher.update("{}={!r}".format(option, value).encode("utf-8"))
+        return hasher.hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _meta(self, key: str) -> str:
+        return os.path.join(self.path(key), "entry.json")
+
+    def lookup(self, key: str) -> Optional[LocalBuildProducts]:
+        try:
+            with open(self._meta(key)) as f:
+                json.load(f)
+        except (OSError, ValueError):
+            return None
+        # The metadata mtime records when the entry was last used
+        os.utime(self._meta(key))
+        return LocalBuildProducts(self.path(key))
+
+    def store(self, key: str, build_dir: str, name: str) -> LocalBuildProducts:
+        # A concurrent build of the same design may store the same key
+        # first; its products are equivalent, so they are used instead
+        products = self.lookup(key)
+        if products is not None:
+            return products
+        path = self.path(key)
+        staging = path + ".tmp{}".format(os.getpid())
+        os.makedirs(staging, exist_ok=True)
+        files = []
+        for product in PRODUCTS:
+            filename = product.format(name=name)
+            src = os.path.join(build_dir, filename)
+            if os.path.exists(src):
+                shutil.copyfile(src, os.path.join(staging, filename))
+                files.append(filename)
+        with open(os.path.join(staging, "entry.json"), "w") as f:
+            json.dump({"name": name, "created": time.time(), "files": files}, f)
+        # Publish atomically so a concurrent build never sees a partial entry.
+        # Anything at path has no metadata, so is left over from a failed store
+        shutil.rmtree(path, ignore_errors=True)
+        try:
+            os.replace(staging, path)
+        except OSError:
+            # Another store published the entry since the lookup above
+            shutil.rmtree(staging, ignore_errors=True)
+            products = self.lookup(key)
+            if products is None:
+                raise
+            return products
+        self.evict(keep=key)
+        return LocalBuildProducts(path)
+
+    def entries(self) -> List[CacheEntry]:
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for key in os.listdir(self.root):
+            if "." in key:
+                # Entry still being staged by store()
+                continue
+            try:
+                with open(self._meta(key)) as f:
+                    meta = json.load(f)
+                last_used = os.stat(self._meta(key)).st_mtime
+            except (OSError, ValueError):
+                continue
+            path = self.path(key)
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append(CacheEntry(key, meta["name"], size, meta["created"], last_used))
+        return sorted(entries, key=lambda entry: entry.last_used, reverse=True)
+
+    def purge(self, key: Optional[str] = None):
+        if key is None:
+            shutil.rmtree(self.root, ignore_errors=True)
+        else:
+            shutil.rmtree(self.path(key), ignore_errors=True)
+
+    def evict(self, keep: Optional[str] = None):
+        # `keep`, the entry just stored, is never evicted, even if it alone
+        # is over max_bytes; its size counts against the others
+        entries = self.entries()
+        total = sum(entry.size for entry in entries if entry.key == keep)
+        for entry in entries:
+            if entry.key == keep:
+                continue
+            total += entry.size
+            if total > self.max_bytes:
+                self.purge(entry.key)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the IceLogicDeck bitstream cache")
+    parser.add_argument("--root", default=None, help="cache directory")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="list cached bitstreams, most recently used first")
+    purge = sub.add_parser("purge", help="remove one entry, or all of them")
+    purge.add_argument("key", nargs="?", default=None)
+    args = parser.parse_args()
+
+    cache = BuildCache(args.root)
+    if args.cmd == "list":
+        for entry in cache.entries():
+            print("{}  {:<16} {:>8} bytes  last used {}".format(
+                entry.key[:16], entry.name, entry.size,
+                time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry.last_used))))
+    elif args.cmd == "purge":
+        if args.key is not None:
+            # Allow the abbreviated keys printed by `list`
+            matches = [e.key for e in cache.entries() if e.key.startswith(args.key)]
+            for key in matches:
+                cache.purge(key)
+        else:
+            cache.purge()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import argparse
+from typing import List
+
+from Toolchain.program import trim_bitstream
+
+__all__ = ["pack_images", "HEADER_SIZE", "MAX_IMAGES"]
+
+# Packs up to four iCE40 bitstreams into one multi-image bitstream, laid
+# out as icestorm's icemulti does: five 32 byte headers, then the images.
+# Header 0 is the image loaded at power on, and headers 1-4 those an
+# SB_WARMBOOT selects with S1 S0 = 0-3; each points at its image's offset
+# and ends with a reboot command.
+
+HEADER_SIZE = 32
+MAX_IMAGES = 4
+PREAMBLE = bytes([0x7e, 0xaa, 0x99, 0x7e])
+
+
+def _header(offset: int, coldboot=False) -> bytes:
+    header = (PREAMBLE +
+              bytes([0x92, 0x00, 0x10 if coldboot else 0x00]) +       # boot mode
+              bytes([0x44, 0x03]) + offset.to_bytes(3, "big") +      # image address
+              bytes([0x82, 0x00, 0x00]) +                           # bank offset
+              bytes([0x01, 0x08]))                                  # reboot
+    return header.ljust(HEADER_SIZE, b"\x00")
+
+
+def pack_images(images: List[bytes], power_on=0, align_bits=0, coldboot=False) -> bytes:
+    """
+    One bitstream holding `images`, booting image `power_on` first. Each
+    image is trimmed of its padding and starts on a 2**align_bits byte
+    boundary (e.g. 12 for the flash's 4KB erase sectors). Unused warmboot
+    slots boot image 0. coldboot=True lets the CBSEL pins choose the
+    power on image instead.
+    """
+    assert 1 <= len(images) <= MAX_IMAGES, "1 to {} images".format(MAX_IMAGES)
+    assert 0 <= power_on < len(images)
+    align = 1 << align_bits
+    offsets = []
+    offset = (MAX_IMAGES + 1) * HEADER_SIZE
+    images = [trim_bitstream(image) for image in images]
+    for image in images:
+        offset = -(-offset // align) * align
+        offsets.append(offset)
+        offset += len(image)
+    assert offset < 1 << 24, "images too large for 24-bit addresses"
+
+    slots = offsets + [offsets[0]] * (MAX_IMAGES - len(images))
+    data = bytearray(_header(offsets[power_on], coldboot))
+    for slot in slots:
+        data += _header(slot)
+    for image, offset in zip(images, offsets):
+        data += bytes(offset - len(data)) + image
+    return bytes(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack iCE40 bitstreams into one multi-image bitstream")
+    parser.add_argument("images", nargs="+", help=".bin files, for warmboot images 0-3 in order")
+    parser.add_argument("-o", "--output", required=True)
+    parser.add_argument("-p", "--power-on", type=int, default=0, help="image loaded at power on")
+    parser.add_argument("-a", "--align-bits", type=int, default=0, help="align images to 2**N bytes")
+    parser.add_argument("-c", "--coldboot", action="store_true", help="power on image chosen by CBSEL pins")
+    args = parser.parse_args()
+
+    images = []
+    for path in args.images:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    data = pack_images(images, args.power_on, args.align_bits, args.coldboot)
+    with open(args.output, "wb") as f:
+        f.write(data)
+    print("{}: {} images, {} bytes".format(args.output, len(images), len(data)))
+
+
+if __name__ == "__main__":
+    main()
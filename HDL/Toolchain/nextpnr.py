@@ -0,0 +1,253 @@
+import json
+import os
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+__all__ = ["ClockFmax", "SeedResult", "ScriptRun", "parse_fmax", "parse_utilisation",
+           "run_script", "synthesize", "run_seeds", "build_seeds", "dump_seed_results", "load_seed_results"]
+
+FMAX_RE = re.compile(r"Max frequency for clock\s+'([^']+)':\s+([\d.]+) MHz"
+                     r"(?: \((PASS|FAIL) at ([\d.]+) MHz\))?")
+UTILISATION_RE = re.compile(r"^Info:\s+(\w+):\s+(\d+)/\s*(\d+)", re.MULTILINE)
+
+
+class ClockFmax(NamedTuple):
+    fmax: float
+    target: Optional[float]
+
+    @property
+    def slack(self) -> Optional[float]:
+        if self.target is None:
+            return None
+        return self.fmax - self.target
+
+
+class SeedResult(NamedTuple):
+    seed: int
+    clocks: Dict[str, ClockFmax]
+    build_dir: str
+    error: Optional[str] = None
+    # Wall time and peak RSS of the seed's nextpnr and icepack run
+    seconds: float = 0.0
+    peak_bytes: Optional[int] = None
+
+    @property
+    def slack(self) -> Optional[float]:
+        # Worst margin in MHz over the constrained clocks
+        slacks = [c.slack for c in self.clocks.values() if c.slack is not None]
+        return min(slacks) if slacks else None
+
+    @property
+    def passed(self) -> bool:
+        return self.error is None and (self.slack is None or self.slack >= 0)
+
+    def __str__(self):
+        if self.error is not None:
+            return "seed {:>3}: {}".format(self.seed, self.error)
+        clocks = ", ".join(
+            "{} {:.2f} MHz".format(name, c.fmax) +
+            ("" if c.target is None else " ({:+.2f})".format(c.slack))
+            for name, c in sorted(self.clocks.items()))
+        return "seed {:>3}: {} {}".format(self.seed, "PASS" if self.passed else "FAIL", clocks)
+
+
+def parse_fmax(log: str) -> Dict[str, ClockFmax]:
+    # nextpnr reports an estimate after placement and the final figure after
+    # routing; later reports for the same clock replace earlier ones
+    clocks = {}
+    for match in FMAX_RE.finditer(log):
+        name, fmax, _, target = match.groups()
+        clocks[name] = ClockFmax(float(fmax), None if target is None else float(target))
+    return clocks
+
+
+def dump_seed_results(results: List[SeedResult]) -> str:
+    return json.dumps([{
+        "seed": result.seed,
+        "clocks": {name: [c.fmax, c.target] for name, c in result.clocks.items()},
+        "error": result.error,
+        "seconds": result.seconds,
+        "peak_bytes": result.peak_bytes,
+    } for result in results], indent=2)
+
+
+def load_seed_results(text: str, build_dir: str) -> List[SeedResult]:
+    """Results written by dump_seed_results, with build_dir where their products now are."""
+    return [SeedResult(r["seed"], {name: ClockFmax(*c) for name, c in r["clocks"].items()}, build_dir,
+                       r["error"], r["seconds"], r["peak_bytes"])
+            for r in json.loads(text)]
+
+
+def parse_utilisation(log: str) -> Dict[str, Tuple[int, int]]:
+    # "Info:          ICESTORM_LC:   120/ 7680     1%" -> {"ICESTORM_LC": (120, 7680)}
+    return {name: (int(used), int(total)) for name, used, total in UTILISATION_RE.findall(log)}
+
+
+class ScriptRun(NamedTuple):
+    returncode: int
+    stderr: str
+    seconds: float
+    # The largest resident set in the script's process tree, which counts
+    # the process that started it until exec, so is never below the size of
+    # this Python process
+    peak_bytes: int
+
+
+def run_script(build_dir: str, name: str, env, proc_started=None) -> ScriptRun:
+    """
+    Run an extracted build plan's script, with tools skipped by setting
+    their variables in `env` to `true`. proc_started(proc) is called once
+    it has started.
+    """
+    # stderr goes to a file, as nothing drains a pipe while wait4() blocks
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        # In a session of its own, so _terminate reaches the tool the script runs
+        proc = subprocess.Popen(["sh", "build_{}.sh".format(name)], cwd=build_dir, env=env,
+                                stdout=subprocess.DEVNULL, stderr=stderr, start_new_session=True)
+        if proc_started is not None:
+            proc_started(proc)
+        # The script's rusage includes the tools it waited for
+        _, status, rusage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - start
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        stderr.seek(0)
+        message = stderr.read().decode(errors="replace")
+    # ru_maxrss is in kilobytes on Linux
+    return ScriptRun(proc.returncode, message, seconds, rusage.ru_maxrss * 1024)
+
+
+def _terminate(proc):
+    # Signal the whole process group: terminating the shell alone leaves
+    # nextpnr running
+    if proc.returncode is None:
+        try:
+            os.killpg(proc.pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+
+def synthesize(build_dir: str, name: str):
+    """Run only the yosys step of an extracted build plan, producing {name}.json."""
+    env = {**os.environ, "NEXTPNR_ICE40": "true", "ICEPACK": "true"}
+    run = run_script(build_dir, name, env)
+    if run.returncode != 0:
+        raise subprocess.CalledProcessError(run.returncode, "yosys", stderr=run.stderr)
+
+
+def _prepare_seed_dir(build_dir, name, seed):
+    seed_dir = os.path.join(build_dir, "seed_{}".format(seed))
+    os.makedirs(seed_dir, exist_ok=True)
+    for filename in os.listdir(build_dir):
+        path = os.path.join(build_dir, filename)
+        if os.path.isfile(path):
+            shutil.copyfile(path, os.path.join(seed_dir, filename))
+    script = os.path.join(seed_dir, "build_{}.sh".format(name))
+    with open(script) as f:
+        text = f.read()
+    with open(script, "w") as f:
+        f.write(text.replace('"$NEXTPNR_ICE40"', '"$NEXTPNR_ICE40" --seed {}'.format(seed)))
+    return seed_dir
+
+
+def run_seeds(build_dir: str, name: str, seeds, jobs=None, stop_on_pass=False) -> List[SeedResult]:
+    """
+    Place and route a synthesized design once per seed, `jobs` at a time
+    (default: one per core). Each seed runs in its own subdirectory of
+    `build_dir`. With `stop_on_pass`, the first seed to meet every clock
+    constraint wins and the remaining runs are cancelled.
+    """
+    jobs = jobs or os.cpu_count()
+    env = {**os.environ, "YOSYS": "true"}
+    stopping = threading.Event()
+    running = set()
+    lock = threading.Lock()
+
+    def run(seed):
+        if stopping.is_set():
+            return None
+        seed_dir = _prepare_seed_dir(build_dir, name, seed)
+        if stopping.is_set():
+            return None
+        procs = []
+
+        def started(proc):
+            with lock:
+                procs.append(proc)
+                running.add(proc)
+                # A seed passed while this one was starting
+                if stopping.is_set():
+                    _terminate(proc)
+
+        run = run_script(seed_dir, name, env, started)
+        with lock:
+            running.difference_update(procs)
+        if stopping.is_set() and run.returncode != 0:
+            return None
+        if run.returncode != 0:
+            lines = run.stderr.strip().splitlines()
+            return SeedResult(seed, {}, seed_dir, lines[-1] if lines else "exit code {}".format(run.returncode),
+                              run.seconds, run.peak_bytes)
+        with open(os.path.join(seed_dir, "{}.tim".format(name))) as f:
+            return SeedResult(seed, parse_fmax(f.read()), seed_dir, None, run.seconds, run.peak_bytes)
+
+    results = []
+    with ThreadPoolExecutor(jobs) as pool:
+        futures = [pool.submit(run, seed) for seed in seeds]
+        for future in as_completed(futures):
+            result = future.result()
+            if result is None:
+                continue
+            print(result)
+            results.append(result)
+            if stop_on_pass and result.passed and not stopping.is_set():
+                stopping.set()
+                with lock:
+                    for proc in running:
+                        _terminate(proc)
+    return sorted(results, key=lambda result: result.seed)
+
+
+def build_seeds(build_dir: str, name: str, seeds, jobs=None, stop_on_pass=False, synthesized=False):
+    """
+    Synthesize an extracted build plan once (unless `synthesized`), place
+    and route it with each of `seeds`, and copy the products of the best
+    seed (passing timing first, then largest worst-case slack) back into
+    `build_dir`, with every seed's result in {name}.seeds.json. Returns
+    the best result and the list of all results.
+    """
+    if isinstance(seeds, int):
+        seeds = range(1, seeds + 1)
+    if not synthesized:
+        synthesize(build_dir, name)
+    results = run_seeds(build_dir, name, seeds, jobs, stop_on_pass)
+    routed = [result for result in results if result.error is None]
+    if not routed:
+        raise RuntimeError("nextpnr failed for every seed: {}".format(
+            "; ".join(str(result) for result in results)))
+
+    def rank(result):
+        slack = result.slack
+        if slack is None:
+            slack = min((c.fmax for c in result.clocks.values()), default=0)
+        return result.passed, slack
+
+    best = max(routed, key=rank)
+    if not best.passed:
+        warnings.warn("nextpnr: no seed met timing, best was seed {} with {:.2f} MHz slack"
+                      .format(best.seed, best.slack), stacklevel=3)
+    for ext in ("asc", "tim", "bin"):
+        shutil.copyfile(os.path.join(best.build_dir, "{}.{}".format(name, ext)),
+                        os.path.join(build_dir, "{}.{}".format(name, ext)))
+    with open(os.path.join(build_dir, "{}.seeds.json".format(name)), "w") as f:
+        f.write(dump_seed_results(results))
+    print("Selected", best)
+    return best, results
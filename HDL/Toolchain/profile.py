@@ -0,0 +1,152 @@
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import subprocess
+import time
+import tracemalloc
+from typing import List, NamedTuple, Optional
+
+from Toolchain.nextpnr import build_seeds, parse_fmax, parse_utilisation, run_script
+from Toolchain.yosys import parse_cells
+
+__all__ = ["Phase", "BuildProfiler", "TOOLS"]
+
+# The tools a generated build script runs, in order; each can be skipped
+# by setting its environment variable (NEXTPNR_ICE40 for nextpnr-ice40...)
+# to `true`, which is how they are timed one at a time
+TOOLS = ["yosys", "nextpnr-ice40", "icepack"]
+
+# Functions listed per in-process phase, by cumulative time
+HOTSPOTS = 10
+
+
+class Phase(NamedTuple):
+    name: str
+    seconds: float
+    # Python heap peak for in-process phases; for tools, ScriptRun.peak_bytes
+    peak_bytes: Optional[int] = None
+    # (function, calls, cumulative seconds) for in-process phases
+    hotspots: List[tuple] = []
+    # (seed, seconds, peak bytes) of each nextpnr run, when several seeds
+    # ran concurrently within the phase
+    seeds: List[tuple] = []
+
+
+def _env_name(tool: str) -> str:
+    return tool.upper().replace("-", "_")
+
+
+class BuildProfiler:
+    """
+    Wall time and peak memory of each phase of a build, and the resources
+    and Fmax in its logs, written as one JSON report.
+
+    In-process phases (elaboration, programming) are traced with
+    tracemalloc and cProfile, which slows them down; tools are run one at a
+    time from the build script and their peak RSS taken from wait4(). With
+    several nextpnr seeds, each seed's run is listed in the nextpnr phase.
+    """
+
+    def __init__(self):
+        self.phases: List[Phase] = []
+        self.cached = False
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        tracing = tracemalloc.is_tracing()
+        if not tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            if not tracing:
+                tracemalloc.stop()
+            stats = pstats.Stats(profiler).sort_stats("cumulative")
+            hotspots = []
+            for func in stats.fcn_list[:HOTSPOTS]:
+                _, calls, _, cumulative, _ = stats.stats[func]
+                hotspots.append(("{}:{}({})".format(*func), calls, round(cumulative, 4)))
+            self.phases.append(Phase(name, seconds, peak, hotspots))
+
+    def run_tools(self, build_dir: str, name: str, tools=TOOLS):
+        """Run an extracted build plan's script once per tool, timing each."""
+        for tool in tools:
+            env = {**os.environ, **{_env_name(other): "true" for other in TOOLS if other != tool}}
+            run = run_script(build_dir, name, env)
+            self.record(tool, run.seconds, run.peak_bytes)
+            if run.returncode != 0:
+                raise subprocess.CalledProcessError(run.returncode, tool, stderr=run.stderr)
+
+    def run_seeds(self, build_dir: str, name: str, seeds, jobs=None, stop_on_pass=False):
+        """
+        build_seeds, with yosys timed on its own and the seeds (nextpnr and
+        icepack each) as one phase, listing every seed's time and peak RSS.
+        """
+        self.run_tools(build_dir, name, ["yosys"])
+        start = time.perf_counter()
+        best, results = build_seeds(build_dir, name, seeds, jobs, stop_on_pass, synthesized=True)
+        self.record("nextpnr-ice40", time.perf_counter() - start,
+                    max((result.peak_bytes for result in results if result.peak_bytes is not None), default=None),
+                    [(result.seed, result.seconds, result.peak_bytes) for result in results])
+        return best, results
+
+    def record(self, name: str, seconds: float, peak_bytes: Optional[int] = None, seeds=()):
+        """Add a phase timed elsewhere, such as a tool run."""
+        self.phases.append(Phase(name, seconds, peak_bytes, seeds=list(seeds)))
+
+    def report(self, products=None, name="top") -> dict:
+        report = {
+            "name": name,
+            "time": time.time(),
+            "cached": self.cached,
+            "total_seconds": round(sum(phase.seconds for phase in self.phases), 3),
+            "phases": [{
+                "name": phase.name,
+                "seconds": round(phase.seconds, 3),
+                "peak_mb": None if phase.peak_bytes is None else round(phase.peak_bytes / 2 ** 20, 1),
+                "hotspots": [{"function": function, "calls": calls, "cumulative_seconds": cumulative}
+                             for function, calls, cumulative in phase.hotspots],
+                **({"seeds": [{"seed": seed, "seconds": round(seconds, 3),
+                               "peak_mb": None if peak is None else round(peak / 2 ** 20, 1)}
+                              for seed, seconds, peak in phase.seeds]} if phase.seeds else {}),
+            } for phase in self.phases],
+        }
+        if products is None:
+            return report
+
+        def log(extension):
+            try:
+                return products.get("{}.{}".format(name, extension), "t")
+            except (OSError, KeyError):
+                return ""
+
+        cells = parse_cells(log("rpt"))
+        timing = log("tim")
+        utilisation = parse_utilisation(timing)
+        report["resources"] = {
+            "luts": cells.get("SB_LUT4", 0),
+            "ffs": sum(count for cell, count in cells.items() if cell.startswith("SB_DFF")),
+            "brams": cells.get("SB_RAM40_4K", 0),
+            "plls": sum(count for cell, count in cells.items() if cell.startswith("SB_PLL40")),
+            "cells": cells,
+            "utilisation": {cell: {"used": used, "total": total} for cell, (used, total) in utilisation.items()},
+        }
+        report["fmax"] = {clock: {"fmax": c.fmax, "target": c.target, "slack": c.slack}
+                          for clock, c in parse_fmax(timing).items()}
+        return report
+
+    def write(self, path: str, products=None, name="top") -> dict:
+        report = self.report(products, name)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
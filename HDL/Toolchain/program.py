@@ -0,0 +1,284 @@
+import argparse
+import glob
+import hashlib
+import json
+import os
+import stat
+import sys
+import termios
+import threading
+import time
+import tty
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, NamedTuple, Optional, Union
+
+__all__ = ["ProgramState", "ProgramResult", "trim_bitstream", "program", "program_all", "expand_devices"]
+
+# Bytes written to the device per write() call
+CHUNK_SIZE = 64 * 1024
+
+# Seconds between attempts at a device that failed, e.g. while it re-enumerates
+RETRY_DELAY = 1.0
+
+# Zero bytes kept after the end of the configuration data: the iCE40 needs
+# at least 49 more clocks after the wakeup command to start the design
+TAIL = 8
+
+
+class ProgramResult(NamedTuple):
+    device: str
+    size: int
+    sha256: str
+    skipped: bool
+    seconds: float
+    # The image was read back and matched; a tty write is only "written"
+    verified: bool
+    attempts: int = 1
+    error: Optional[str] = None
+
+    def __str__(self):
+        if self.error is not None:
+            return "{}: FAILED after {} attempts: {}".format(self.device, self.attempts, self.error)
+        if self.skipped:
+            return "{}: unchanged ({}), not reprogrammed".format(self.device, self.sha256[:16])
+        rate = self.size / self.seconds / 1024 if self.seconds else 0
+        return "{}: {} bytes in {:.2f}s ({:.0f} KB/s){}".format(
+            self.device, self.size, self.seconds, rate, ", verified" if self.verified else ", written")
+
+
+def trim_bitstream(bitstream: bytes) -> bytes:
+    """The bitstream without the zero padding after its last command, bar TAIL bytes of it."""
+    end = len(bitstream.rstrip(b"\x00"))
+    return bitstream[:min(len(bitstream), end + TAIL)]
+
+
+class ProgramState:
+    """
+    The hash of the image last programmed into each device, so programming
+    the same image again can be skipped. Devices are keyed by their real
+    path, as /dev/serial/by-id links name the same board across re-plugs.
+    Kept as JSON next to the bitstream cache; PROGRAM_STATE overrides the
+    file, and PROGRAM_STATE=off disables it.
+
+    The deck loses its image when power cycled, so each hash is kept with
+    the identity of the device node it was written through: its inode and
+    change and modification times. A re-plug or power cycle re-enumerates
+    the deck and makes a new node, and the hash no longer applies; so does
+    it once the node is gone, or written by anything else.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(os.path.expanduser("~"), ".cache", "icelogicdeck", "programmed.json")
+        self.path = path
+        # Devices programmed from a thread pool share the file
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ProgramState"]:
+        path = os.environ.get("PROGRAM_STATE")
+        if path is not None and path.lower() in ("", "0", "off", "no"):
+            return None
+        return cls(path)
+
+    def _load(self) -> Dict[str, dict]:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _node(device: str) -> Optional[List[int]]:
+        try:
+            st = os.stat(device)
+        except OSError:
+            return None
+        return [st.st_dev, st.st_ino, st.st_ctime_ns, st.st_mtime_ns]
+
+    def last(self, device: str) -> Optional[str]:
+        entry = self._load().get(os.path.realpath(device), {})
+        node = self._node(device)
+        if node is None or entry.get("node") != node:
+            return None
+        return entry.get("sha256")
+
+    def _save(self, state: Dict[str, dict]):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        staging = "{}.tmp{}".format(self.path, os.getpid())
+        with open(staging, "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(staging, self.path)
+
+    def record(self, device: str, sha256: str):
+        with self._lock:
+            state = self._load()
+            state[os.path.realpath(device)] = {"sha256": sha256, "node": self._node(device),
+                                               "time": time.time()}
+            self._save(state)
+
+    def forget(self, device: str):
+        with self._lock:
+            state = self._load()
+            if state.pop(os.path.realpath(device), None) is not None:
+                self._save(state)
+
+
+def program(device: str, bitstream: bytes, state: Optional[ProgramState] = None, force=False,
+            chunk_size=CHUNK_SIZE, progress: Optional[Callable[[int, int], None]] = None) -> ProgramResult:
+    """
+    Write a bitstream to the deck's USB CDC device node, or a pty or
+    existing file standing in for it, in chunk_size writes after trimming
+    its padding. Unless `force`, a device `state` records as already
+    holding the same image is skipped, and a device that fails to open or
+    be written is forgotten, as it may hold none. progress(done, total) is
+    called after each chunk.
+
+    A regular file is read back to verify the write. The deck cannot be
+    read back, so on a tty the result is only written, once the port has
+    drained. Failures, including those of the tty calls, raise OSError.
+    """
+    data = trim_bitstream(bitstream)
+    digest = hashlib.sha256(data).hexdigest()
+    if state is not None and not force and state.last(device) == digest:
+        return ProgramResult(device, len(data), digest, True, 0.0, False)
+
+    start = time.perf_counter()
+    try:
+        fd = os.open(device, os.O_WRONLY | getattr(os, "O_NOCTTY", 0))
+    except OSError:
+        if state is not None:
+            state.forget(device)
+        raise
+    try:
+        is_file = stat.S_ISREG(os.fstat(fd).st_mode)
+        if is_file:
+            os.ftruncate(fd, 0)
+        if os.isatty(fd):
+            # No newline translation of the image
+            tty.setraw(fd)
+        view = memoryview(data)
+        done = 0
+        while done < len(data):
+            written = os.write(fd, view[done:done + chunk_size])
+            if written <= 0:
+                raise OSError("{} accepted {} of {} bytes".format(device, done, len(data)))
+            done += written
+            if progress is not None:
+                progress(done, len(data))
+        if os.isatty(fd):
+            termios.tcdrain(fd)
+        elif is_file:
+            os.fsync(fd)
+    except (OSError, termios.error) as e:
+        if state is not None:
+            state.forget(device)
+        if isinstance(e, termios.error):
+            # Not an OSError, though it carries the same (errno, message)
+            raise OSError(*e.args) from e
+        raise
+    finally:
+        os.close(fd)
+
+    verified = False
+    if is_file:
+        with open(device, "rb") as f:
+            verified = hashlib.sha256(f.read()).hexdigest() == digest
+        if not verified:
+            if state is not None:
+                state.forget(device)
+            raise OSError("{} does not hold the image written to it".format(device))
+    seconds = time.perf_counter() - start
+    if state is not None:
+        state.record(device, digest)
+    return ProgramResult(device, len(data), digest, False, seconds, verified)
+
+
+def expand_devices(devices: Union[str, List[str]]) -> List[str]:
+    """
+    Device nodes from a list, or a string of them separated by commas or
+    spaces, with globs such as /dev/serial/by-id/*IceLogicDeck* expanded.
+    Nodes reached through several names are listed once.
+    """
+    if isinstance(devices, str):
+        devices = devices.replace(",", " ").split()
+    found = []
+    seen = set()
+    for pattern in devices:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        for device in matches:
+            if os.path.realpath(device) not in seen:
+                seen.add(os.path.realpath(device))
+                found.append(device)
+    return found
+
+
+def program_all(devices: List[str], bitstream: bytes, state: Optional[ProgramState] = None, force=False,
+                jobs=None, retries=2, chunk_size=CHUNK_SIZE,
+                progress: Optional[Callable[[str], Callable[[int, int], None]]] = None) -> List[ProgramResult]:
+    """
+    Program the same bitstream into every device concurrently, one thread
+    per device up to `jobs`, trying each up to 1 + `retries` times.
+    progress(device), if given, makes each device's progress callback.
+    Failures are returned as results with `error` set, in device order, so
+    one bad deck does not stop the others; only OSErrors are retried.
+    """
+    def one(device):
+        start = time.perf_counter()
+        for attempt in range(1, retries + 2):
+            try:
+                result = program(device, bitstream, state, force, chunk_size,
+                                 None if progress is None else progress(device))
+                return result._replace(attempts=attempt)
+            except (OSError, termios.error) as e:
+                error = str(e)
+                if attempt <= retries:
+                    time.sleep(RETRY_DELAY)
+            except Exception as e:
+                error = "{}: {}".format(type(e).__name__, e)
+                break
+        data = trim_bitstream(bitstream)
+        return ProgramResult(device, len(data), hashlib.sha256(data).hexdigest(), False,
+                             time.perf_counter() - start, False, attempt, error)
+
+    if not devices:
+        return []
+    with ThreadPoolExecutor(jobs or len(devices)) as pool:
+        return list(pool.map(one, devices))
+
+
+def print_progress(device: str) -> Callable[[int, int], None]:
+    """A progress callback printing a percentage to stderr when it is a terminal."""
+    def progress(done, total):
+        if sys.stderr.isatty():
+            print("\r{}: {:3d}%".format(device, done * 100 // total), end="\n" if done == total else "",
+                  file=sys.stderr, flush=True)
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Program an IceLogicDeck with a bitstream")
+    parser.add_argument("bitstream", help=".bin file from icepack")
+    parser.add_argument("--device", action="append",
+                        help="device node or glob, repeatable (default: DEVICE, or /dev/ttyACM1)")
+    parser.add_argument("--force", action="store_true", help="program even if the device holds this image")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="devices programmed at once")
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    devices = expand_devices(args.device or os.environ.get("DEVICE", "/dev/ttyACM1"))
+    if not devices:
+        parser.error("no devices match")
+    with open(args.bitstream, "rb") as f:
+        bitstream = f.read()
+    # Progress lines from several devices would overwrite each other
+    results = program_all(devices, bitstream, ProgramState.from_env(), args.force, args.jobs,
+                          args.retries, args.chunk_size, print_progress if len(devices) == 1 else None)
+    for result in results:
+        print(result)
+    sys.exit(0 if all(result.error is None for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
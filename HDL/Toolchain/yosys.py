@@ -0,0 +1,30 @@
+import re
+from typing import Dict
+
+__all__ = ["parse_cells"]
+
+# Older yosys prints "Number of cells: 40" then "SB_LUT4   31",
+# newer releases print "40 cells" then "31   SB_LUT4"
+CELLS_HEADER_RE = re.compile(r"Number of cells|^\s+\d+ cells$")
+CELL_RE = re.compile(r"^\s+(?:([$\w]+)\s+(\d+)|(\d+)\s+([$\w]+))\s*$")
+
+
+def parse_cells(report: str) -> Dict[str, int]:
+    # The last `stat` block in the report describes the final netlist
+    cells = {}
+    in_stat = False
+    for line in report.splitlines():
+        if CELLS_HEADER_RE.search(line):
+            cells = {}
+            in_stat = True
+            continue
+        if not in_stat:
+            continue
+        match = CELL_RE.match(line)
+        if match is None:
+            if cells:
+                in_stat = False
+            continue
+        name, count, rcount, rname = match.groups()
+        cells[name or rname] = int(count or rcount)
+    return cells
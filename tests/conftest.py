@@ -0,0 +1,9 @@
+import os
+import sys
+
+# The examples import each other through HDL.Amaranth_Examples, and the
+# toolchain as the top level Toolchain package, as when run from HDL/
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.join(ROOT, "HDL"), ROOT):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,19 @@
+import pytest
+
+from HDL.Amaranth_Examples.Bus.bench import EXPECTED, EXPECTED_SIZE, check, run
+
+
+@pytest.mark.parametrize("mode", list(EXPECTED))
+def test_expected_throughput(mode):
+    divider, _ = EXPECTED[mode]
+    result = run(mode, EXPECTED_SIZE, divider / 2)
+    assert result["errors"] == 0
+    assert check([result]) == []
+
+
+def test_check_reports_misses():
+    result = dict(mode="ddr", size=EXPECTED_SIZE, divider=EXPECTED["ddr"][0], errors=0,
+                  read_bytes_per_clk=0.01)
+    [failure] = check([result])
+    assert failure.startswith("ddr: read")
+    assert check([dict(result, errors=1, read_bytes_per_clk=1)]) == ["ddr: errors at divider 4"]
@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from amaranth import *
+from amaranth.sim import Simulator
+
+from HDL.Amaranth_Examples.Tiles.vga import VGADriver
+from HDL.Amaranth_Examples.Tiles.vga_model import TINY
+from HDL.Amaranth_Examples.Tiles.framebuffer import Framebuffer
+from HDL.Amaranth_Examples.Tiles.blitter import Blitter
+
+WIDTH, HEIGHT = 16, 8
+
+
+def blit(op, src, dst, width, height, value=0, seed=0):
+    """The framebuffer before and after running `op` on a random image."""
+    vga = VGADriver(TINY, bits_x=16, bits_y=16)
+    fb = Framebuffer(vga, WIDTH, HEIGHT, bpp=8, palette=False)
+    rng = random.Random(seed)
+    before = [rng.randrange(1, 256) for _ in range(fb.mem.depth)]
+    fb.mem.init = before
+    blitter = Blitter(fb)
+    m = Module()
+    m.domains.pixel = ClockDomain("pixel")
+    m.submodules += [vga, fb, blitter]
+    m.d.comb += vga.i_clk_en.eq(1)
+    after = []
+
+    def write(addr, data):
+        yield blitter.bus.addr.eq(addr)
+        yield blitter.bus.dout.eq(data)
+        yield blitter.bus.wr.eq(1)
+        yield
+        yield blitter.bus.wr.eq(0)
+
+    def process():
+        for addr, data in [(2, src >> 8), (3, src & 0xff), (4, dst >> 8), (5, dst & 0xff),
+                           (6, width >> 8), (7, width & 0xff), (8, height >> 8), (9, height & 0xff),
+                           (10, value), (0, op)]:
+            yield from write(addr, data)
+        yield
+        for _ in range(10 * fb.mem.depth):
+            if not (yield blitter.busy):
+                break
+            yield
+        else:
+            raise AssertionError("blitter still busy")
+        for i in range(fb.mem.depth):
+            after.append((yield fb.mem[i]))
+
+    sim = Simulator(m)
+    sim.add_clock(1e-8)
+    sim.add_clock(2e-8, domain="pixel")
+    sim.add_sync_process(process)
+    sim.run()
+    return before, after
+
+
+def rectangle(offset, width, height):
+    return [offset + row * WIDTH + col for row in range(height) for col in range(width)]
+
+
+def expected(op, before, src, dst, width, height, value):
+    result = list(before)
+    if op == Blitter.FILL:
+        for addr in rectangle(dst, width, height):
+            result[addr] = value
+        return result
+    for s, d in zip(rectangle(src, width, height), rectangle(dst, width, height)):
+        result[d] = before[s]
+    if op == Blitter.MOVE:
+        for addr in set(rectangle(src, width, height)) - set(rectangle(dst, width, height)):
+            result[addr] = value
+    return result
+
+
+CASES = [
+    (Blitter.FILL, 0, 2 * WIDTH + 3, 5, 3),
+    (Blitter.COPY, 0, WIDTH + 1, 4, 4),
+    (Blitter.COPY, WIDTH + 1, 0, 4, 4),
+    (Blitter.MOVE, 0, 0, 4, 4),
+    (Blitter.MOVE, 2, WIDTH + 3, 5, 3),
+    (Blitter.MOVE, 3 * WIDTH + 6, WIDTH + 5, 6, 4),
+    (Blitter.MOVE, 0, 3 * WIDTH + 8, 4, 3),
+]
+
+
+@pytest.mark.parametrize("op, src, dst, width, height", CASES)
+def test_blit(op, src, dst, width, height):
+    before, after = blit(op, src, dst, width, height, value=0x5a)
+    assert after == expected(op, before, src, dst, width, height, 0x5a)
+
+
+def test_random_moves():
+    rng = random.Random(1)
+    for seed in range(8):
+        width, height = rng.randint(1, 6), rng.randint(1, 4)
+        src, dst = [rng.randint(0, HEIGHT - height) * WIDTH + rng.randint(0, WIDTH - width) for _ in range(2)]
+        before, after = blit(Blitter.MOVE, src, dst, width, height, seed=seed)
+        assert after == expected(Blitter.MOVE, before, src, dst, width, height, 0), (src, dst, width, height)
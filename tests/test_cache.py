@@ -0,0 +1,95 @@
+import os
+import types
+
+import pytest
+
+from amaranth.build.run import BuildPlan
+
+from Toolchain.cache import BuildCache
+
+PLATFORM = types.SimpleNamespace(device="iCE40HX4K", package="TQ144", required_tools=[])
+
+
+def plan(rtlil="module top; endmodule"):
+    plan = BuildPlan(script="build_top")
+    plan.add_file("top.il", rtlil)
+    return plan
+
+
+def build_dir(tmp_path, name="top", contents=b"bitstream"):
+    path = tmp_path / "build"
+    path.mkdir(exist_ok=True)
+    (path / "{}.bin".format(name)).write_bytes(contents)
+    (path / "{}.rpt".format(name)).write_text("report")
+    return str(path)
+
+
+def test_key_covers_plan_and_options():
+    cache = BuildCache("unused")
+    key = cache.key(PLATFORM, plan())
+    assert key == cache.key(PLATFORM, plan())
+    assert key != cache.key(PLATFORM, plan("module other; endmodule"))
+    assert key != cache.key(types.SimpleNamespace(**dict(vars(PLATFORM), package="CT256")), plan())
+    seeds = cache.key(PLATFORM, plan(), seeds=[1, 2, 3])
+    assert seeds != key
+    assert cache.key(PLATFORM, plan(), seeds=[1, 2, 3], stop_on_pass=True) != seeds
+    # Options left at None do not change the key
+    assert cache.key(PLATFORM, plan(), seeds=None, stop_on_pass=None) == key
+
+
+def test_store_and_lookup(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"))
+    key = cache.key(PLATFORM, plan())
+    assert cache.lookup(key) is None
+    products = cache.store(key, build_dir(tmp_path), "top")
+    assert products.get("top.bin") == b"bitstream"
+    assert cache.lookup(key).get("top.rpt", "t") == "report"
+    [entry] = cache.entries()
+    assert (entry.key, entry.name) == (key, "top")
+    cache.purge(key)
+    assert cache.lookup(key) is None
+
+
+def test_store_of_existing_entry_is_a_hit(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"))
+    key = cache.key(PLATFORM, plan())
+    cache.store(key, build_dir(tmp_path, contents=b"first"), "top")
+    # A concurrent build storing the same key keeps the first entry
+    products = cache.store(key, build_dir(tmp_path, contents=b"second"), "top")
+    assert products.get("top.bin") == b"first"
+    assert [name for name in os.listdir(cache.root) if "." in name] == []
+
+
+def test_leftover_without_metadata_is_replaced(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"))
+    key = cache.key(PLATFORM, plan())
+    os.makedirs(os.path.join(cache.path(key), "partial"))
+    assert cache.lookup(key) is None
+    assert cache.store(key, build_dir(tmp_path), "top").get("top.bin") == b"bitstream"
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = BuildCache(str(tmp_path / "cache"), max_bytes=1 << 20)
+    keys = []
+    for i in range(4):
+        key = cache.key(PLATFORM, plan("module top{}; endmodule".format(i)))
+        cache.store(key, build_dir(tmp_path, contents=bytes(20)), "top")
+        os.utime(os.path.join(cache.path(key), "entry.json"), (i, i))
+        keys.append(key)
+    # Room for two entries, whose metadata differs in length by a few bytes:
+    # the one stored and the most recently used other
+    cache.max_bytes = 2 * cache.entries()[0].size + 16
+    key = cache.key(PLATFORM, plan("module last; endmodule"))
+    cache.store(key, build_dir(tmp_path, contents=bytes(20)), "top")
+    assert [entry.key for entry in cache.entries()] == [key, keys[3]]
+
+
+@pytest.mark.parametrize("value", ["off", "0", ""])
+def test_from_env_disabled(monkeypatch, value):
+    monkeypatch.setenv("BUILD_CACHE", value)
+    assert BuildCache.from_env() is None
+
+
+def test_from_env_root(monkeypatch, tmp_path):
+    monkeypatch.setenv("BUILD_CACHE", str(tmp_path))
+    assert BuildCache.from_env().root == str(tmp_path)
@@ -0,0 +1,119 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from amaranth import *
+from amaranth.sim import Simulator
+
+from HDL.Amaranth_Examples.Tiles.vga import VGADriver
+from HDL.Amaranth_Examples.Tiles.vga_model import TINY, frame_size
+from HDL.Amaranth_Examples.Tiles.framebuffer import Framebuffer, pack, rgb332
+from HDL.Amaranth_Examples.Tiles.text import TextMode, CGA_PALETTE, cells
+from HDL.Amaranth_Examples.Tiles.font8x8 import font_rom
+from HDL.Amaranth_Examples.Tiles.blitter import Blitter
+
+
+def show(background, ratio=2, frame=2):
+    """
+    The colours VGADriver shows over frame number `frame` of TINY, with
+    `background` driving it and the sync clock `ratio` times the pixel
+    clock, as a (y, x) array, and the number of underruns.
+    """
+    vga = background.vga
+    frame_x, frame_y = frame_size(TINY)
+    m = Module()
+    m.domains.sync = ClockDomain("sync")
+    m.domains.pixel = ClockDomain("pixel")
+    m.submodules.vga = vga
+    m.submodules.background = background
+    m.d.comb += vga.i_clk_en.eq(1)
+
+    colours = np.zeros((frame_y, frame_x), int)
+    de = np.zeros((frame_y, frame_x), bool)
+    underruns = 0
+
+    def process():
+        nonlocal underruns
+        for _ in range(frame * frame_x * frame_y):
+            yield
+        for _ in range(frame_x * frame_y):
+            x = yield vga.o_beam_x
+            y = yield vga.o_beam_y
+            r = yield vga.o_vga_r
+            g = yield vga.o_vga_g
+            b = yield vga.o_vga_b
+            colours[y, x] = rgb332(r, g, b)
+            de[y, x] = yield vga.o_vga_de
+            underruns += yield background.underrun
+            yield
+
+    sim = Simulator(m)
+    sim.add_clock(1e-8 * ratio, domain="pixel")
+    sim.add_clock(1e-8, domain="sync")
+    sim.add_sync_process(process, domain="pixel")
+    sim.run()
+    # Pixels are shown a cycle after the beam position, as in Frame.image()
+    return colours[de.any(axis=1)][:, de.any(axis=0)], underruns
+
+
+def test_pack():
+    assert pack([1, 0, 1, 1, 0, 0, 0, 1], 1) == bytes([0b10110001])
+    assert pack([0x1, 0x2, 0xf, 0x0], 4) == bytes([0x12, 0xf0])
+
+
+# pysim cannot compile a memory much over 1KB deep, so images are small
+@pytest.mark.parametrize("width, height, bpp, scale, ratio", [
+    (32, 24, 8, 2, 2),
+    (32, 24, 8, 2, 1),
+    (16, 12, 4, 4, 2),
+    (32, 24, 2, 2, 2),
+    (64, 48, 1, 1, 2),
+    (16, 12, 8, 3, 2),
+])
+def test_framebuffer_pixels(width, height, bpp, scale, ratio):
+    vga = VGADriver(TINY, bits_x=16, bits_y=16)
+    fb = Framebuffer(vga, width, height, bpp=bpp, scale_x=scale, scale_y=scale,
+                     palette=(bpp, scale) == (8, 3) or None)
+    pixels = np.random.RandomState(1).randint(0, 1 << bpp, size=(height, width))
+    fb.mem.init = list(pack(pixels.ravel().tolist(), bpp))
+    if fb.palette is not None:
+        colours = np.array(fb.palette.init)
+    else:
+        colours = np.arange(256)
+
+    image, underruns = show(fb, ratio)
+    expected = np.zeros((TINY.y, TINY.x), int)
+    expected[:height * scale, :width * scale] = np.kron(colours[pixels], np.ones((scale, scale), int))
+    assert underruns == 0
+    assert (image == expected).all()
+
+
+@pytest.mark.parametrize("scale_x, scale_y", [(1, 1), (2, 2), (1, 3)])
+def test_text_pixels(scale_x, scale_y):
+    vga = VGADriver(TINY, bits_x=16, bits_y=16)
+    text = TextMode(vga, scale_x=scale_x, scale_y=scale_y)
+    count = text.columns * text.rows
+    rng = random.Random(3)
+    chars = [rng.randrange(0x20, 0x7f) | (0x80 if rng.random() < 0.3 else 0) for _ in range(count)]
+    attributes = [rng.randrange(256) for _ in range(count)]
+    text.chars.init = chars
+    text.attributes.init = attributes
+
+    image, underruns = show(text)
+    rom = font_rom()
+    expected = np.zeros((TINY.y, TINY.x), int)
+    for y in range(text.rows * 8 * scale_y):
+        for x in range(text.columns * 8 * scale_x):
+            cell = y // scale_y // 8 * text.columns + x // scale_x // 8
+            lit = (rom[(chars[cell] & 0x7f) * 8 + y // scale_y % 8] >> (x // scale_x % 8)) & 1
+            lit ^= chars[cell] >> 7
+            attribute = attributes[cell]
+            expected[y, x] = CGA_PALETTE[attribute & 0xf if lit else attribute >> 4]
+    assert underruns == 0
+    assert (image == expected).all()
+
+
+def test_cells():
+    assert cells("Hi", fg=15, bg=1) == bytes([ord("H"), 0x1f, ord("i"), 0x1f])
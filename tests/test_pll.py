@@ -0,0 +1,67 @@
+# amaranth: UnusedElaboratable=no
+
+import pytest
+
+from HDL.Amaranth_Examples.Tiles.pll import PLL, DualPLL, dual_pll_candidates, filter_range, pll_candidates
+
+
+def icepll(f_in, f_req):
+    """The closest output over every DIVR, DIVF and DIVQ, searched as icepll does."""
+    best = None
+    for divr in range(16):
+        pfd = f_in / (divr + 1)
+        if not 10 <= pfd <= 133:
+            continue
+        for divf in range(128):
+            vco = pfd * (divf + 1)
+            if not 533 <= vco <= 1066:
+                continue
+            for divq in range(1, 7):
+                fout = vco * 2 ** -divq
+                if best is None or abs(fout - f_req) < abs(best - f_req):
+                    best = fout
+    return best
+
+
+@pytest.mark.parametrize("f_in", [16, 25, 100])
+@pytest.mark.parametrize("f_req", [16, 25.175, 30, 40, 50.35, 65, 100, 108, 148.5, 275])
+def test_matches_exhaustive_search(f_in, f_req):
+    best = pll_candidates(f_in, f_req)[0]
+    assert abs(best.f_out - f_req) == pytest.approx(abs(icepll(f_in, f_req) - f_req), abs=1e-9)
+
+
+def test_candidates_are_consistent():
+    for c in pll_candidates(16, 25.175):
+        assert c.f_pfd == 16 / (c.divr + 1)
+        assert c.f_vco == pytest.approx(c.f_pfd * (c.divf + 1))
+        assert c.f_out == pytest.approx(c.f_vco / 2 ** c.divq)
+        assert 533 <= c.f_vco <= 1066
+        assert c.filter_range == filter_range(c.f_pfd)
+
+
+def test_exact_output_has_no_warning(recwarn):
+    pll = PLL(16, 48)
+    assert pll.result.error_ppm == 0
+    assert pll.coeff == (pll.result.divr, pll.result.divf, pll.result.divq)
+    assert not recwarn.list
+
+
+def test_inexact_output_warns():
+    with pytest.warns(UserWarning):
+        PLL(16, 25.175)
+
+
+@pytest.mark.parametrize("f_a, f_b", [(50.35, 25.175), (50, 50), (80, 40)])
+def test_dual_outputs(f_a, f_b):
+    best = dual_pll_candidates(16, f_a, f_b)[0]
+    ratio = {"GENCLK": 1, "GENCLK_HALF": 0.5}[best.portb]
+    assert best.f_out_b == best.f_out_a * ratio
+    assert best.error_ppm == max(abs(best.error_ppm_a), abs(best.error_ppm_b))
+    assert best.error_ppm <= abs(pll_candidates(16, f_a)[0].error_ppm) + 1e-9
+
+
+def test_dual_pll_domains():
+    with pytest.warns(UserWarning):
+        pll = DualPLL(16, 50.35, 25.175)
+    assert pll.domain_a.name == "sync" and pll.domain_b.name == "pixel"
+    assert pll.result.portb == "GENCLK_HALF"
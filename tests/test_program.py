@@ -0,0 +1,138 @@
+import hashlib
+import os
+import pty
+
+import pytest
+
+from Toolchain.multiboot import HEADER_SIZE, MAX_IMAGES, PREAMBLE, pack_images
+from Toolchain.program import TAIL, ProgramState, expand_devices, program, program_all, trim_bitstream
+
+BITSTREAM = PREAMBLE + bytes(range(1, 100)) + bytes(200)
+
+
+def image(n):
+    return PREAMBLE + bytes([n]) * (10 + n) + bytes(50)
+
+
+def test_trim_bitstream():
+    assert trim_bitstream(BITSTREAM) == BITSTREAM[:len(PREAMBLE) + 99 + TAIL]
+    short = PREAMBLE + b"\x01" + bytes(3)
+    assert trim_bitstream(short) == short
+
+
+def header(data, slot):
+    return data[slot * HEADER_SIZE:(slot + 1) * HEADER_SIZE]
+
+
+def header_offset(data, slot):
+    h = header(data, slot)
+    assert h[:4] == PREAMBLE
+    assert h[7:9] == bytes([0x44, 0x03])
+    return int.from_bytes(h[9:12], "big")
+
+
+def test_multiboot_layout():
+    images = [image(n) for n in range(3)]
+    data = pack_images(images, power_on=1, align_bits=8)
+    offsets = [header_offset(data, slot) for slot in range(1, MAX_IMAGES + 1)]
+    # Unused warmboot slots boot image 0
+    assert offsets[3] == offsets[0]
+    assert header_offset(data, 0) == offsets[1]
+    for n, offset in enumerate(offsets[:3]):
+        assert offset % 256 == 0
+        trimmed = trim_bitstream(images[n])
+        assert data[offset:offset + len(trimmed)] == trimmed
+    assert offsets[0] >= (MAX_IMAGES + 1) * HEADER_SIZE
+
+
+def test_multiboot_boot_mode():
+    for coldboot, mode in [(False, 0x00), (True, 0x10)]:
+        data = pack_images([image(0)], coldboot=coldboot)
+        assert header(data, 0)[4:7] == bytes([0x92, 0x00, mode])
+        # Only the power on header lets CBSEL choose
+        assert header(data, 1)[4:7] == bytes([0x92, 0x00, 0x00])
+        assert header(data, 1)[15:17] == bytes([0x01, 0x08])
+
+
+def test_multiboot_limits():
+    with pytest.raises(AssertionError):
+        pack_images([image(0)] * (MAX_IMAGES + 1))
+    with pytest.raises(AssertionError):
+        pack_images([image(0)], power_on=1)
+
+
+def test_program_file_verifies_and_skips(tmp_path):
+    device = str(tmp_path / "deck")
+    open(device, "wb").close()
+    state = ProgramState(str(tmp_path / "state.json"))
+    result = program(device, BITSTREAM, state)
+    assert result.verified and not result.skipped
+    with open(device, "rb") as f:
+        assert f.read() == trim_bitstream(BITSTREAM)
+    assert result.sha256 == hashlib.sha256(trim_bitstream(BITSTREAM)).hexdigest()
+    assert program(device, BITSTREAM, state).skipped
+    assert not program(device, BITSTREAM, state, force=True).skipped
+
+
+def test_program_state_invalidated_by_new_node(tmp_path):
+    device = str(tmp_path / "deck")
+    open(device, "wb").close()
+    state = ProgramState(str(tmp_path / "state.json"))
+    program(device, BITSTREAM, state)
+    # A re-enumerated deck is a new node, its configuration blank
+    os.remove(device)
+    open(device, "wb").close()
+    assert state.last(device) is None
+    assert not program(device, BITSTREAM, state).skipped
+    os.utime(device, ns=(0, 0))
+    assert state.last(device) is None
+
+
+def test_program_open_failure_forgets(tmp_path):
+    device = str(tmp_path / "deck")
+    open(device, "wb").close()
+    state = ProgramState(str(tmp_path / "state.json"))
+    program(device, BITSTREAM, state)
+    os.chmod(device, 0)
+    if os.access(device, os.W_OK):
+        pytest.skip("running as a user that ignores permissions")
+    with pytest.raises(OSError):
+        program(device, BITSTREAM, state, force=True)
+    os.chmod(device, 0o644)
+    assert state.last(device) is None
+
+
+def test_program_tty():
+    controller, deck = pty.openpty()
+    try:
+        device = os.ttyname(deck)
+        data = trim_bitstream(BITSTREAM)
+        result = program(device, BITSTREAM, chunk_size=16)
+        assert not result.verified and result.size == len(data)
+        received = b""
+        while len(received) < len(data):
+            received += os.read(controller, len(data))
+        assert received == data
+    finally:
+        os.close(controller)
+        os.close(deck)
+
+
+def test_program_all_reports_failures(tmp_path, monkeypatch):
+    monkeypatch.setattr("Toolchain.program.RETRY_DELAY", 0)
+    good = str(tmp_path / "deck")
+    open(good, "wb").close()
+    missing = str(tmp_path / "missing" / "deck")
+    results = program_all([good, missing], BITSTREAM, retries=1)
+    assert [r.device for r in results] == [good, missing]
+    assert results[0].error is None and results[0].verified
+    assert results[1].error is not None and results[1].attempts == 2
+
+
+def test_expand_devices(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).touch()
+    os.symlink(str(tmp_path / "a"), str(tmp_path / "link"))
+    pattern = str(tmp_path / "[ab]")
+    assert expand_devices("{}, {}".format(pattern, tmp_path / "link")) == \
+        [str(tmp_path / "a"), str(tmp_path / "b")]
@@ -0,0 +1,30 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from HDL.Amaranth_Examples.Tiles.vga import VGADriver, PipelinedVGADriver
+from HDL.Amaranth_Examples.Tiles.vga_model import (TINY, capture_frame, diff_frames, frame_size,
+                                                   model_frame, write_ppm)
+
+
+@pytest.mark.parametrize("driver", [VGADriver, PipelinedVGADriver])
+def test_driver_matches_model(driver):
+    diff = diff_frames(model_frame(TINY), capture_frame(TINY, driver))
+    assert all(mismatch is None for mismatch in diff.values()), diff
+
+
+def test_model_frame_shape():
+    frame = model_frame(TINY)
+    frame_x, frame_y = frame_size(TINY)
+    assert frame.de.shape == (frame_y, frame_x)
+    assert frame.image().shape == (TINY.y, TINY.x, 3)
+    assert frame.de.sum() == TINY.x * TINY.y
+    assert not frame.r[frame.blank].any()
+
+
+def test_write_ppm():
+    import io
+    image = np.arange(2 * 3 * 3, dtype=np.uint8).reshape(2, 3, 3)
+    f = io.BytesIO()
+    write_ppm(f, image)
+    assert f.getvalue() == b"P6\n3 2\n255\n" + image.tobytes()